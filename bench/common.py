@@ -0,0 +1,102 @@
+import csv
+import json
+import time
+from contextlib import contextmanager
+
+from src.catalogue import ImageCatalogue
+
+SCALES = [10_000, 100_000, 1_000_000]
+METRO_SIZE = 300
+YEARS = ["1900", "1910", "1920", "1930", "1940"]
+ARK_ALPHABET = "0123456789BCDFGHJKLMNPQRSTVWXZ"
+
+
+def fake_ark(n):
+    chars = []
+    for _ in range(12):
+        n, r = divmod(n, len(ARK_ALPHABET))
+        chars.append(ARK_ALPHABET[r])
+
+    s = "".join(chars)
+    return f"3:1:{s[:4]}-{s[4:8]}-{s[8:]}"
+
+
+def synthetic_rows(count, metro_size=METRO_SIZE):
+    """Deterministic corpus shaped like buildImageList() output."""
+    for n in range(count):
+        metro, metro_index = divmod(n, metro_size)
+        yield (
+            YEARS[metro % len(YEARS)],
+            f"Metro{metro:05}",
+            fake_ark(n * 7919 + 1),
+            200 + metro_index,
+            metro_index,
+            metro_size - 1,
+            "1037259",
+        )
+
+
+def synthetic_images(count, metro_size=METRO_SIZE):
+    return ImageCatalogue.fromRows(synthetic_rows(count, metro_size))
+
+
+def write_scrape_tree(data_dir, count, metro_size=METRO_SIZE, metros_per_film=2):
+    """Write films/*.json and ed_descr_nums.csv describing `count` images."""
+    metros = [
+        (YEARS[metro % len(YEARS)], f"Metro{metro:05}", min(metro_size, count - start))
+        for metro, start in enumerate(range(0, count, metro_size))
+    ]
+    write_films(data_dir, metros, metros_per_film)
+
+
+def write_films(data_dir, metros, metros_per_film=2):
+    """Write films/*.json and ed_descr_nums.csv for `metros`, a list of
+    (year, utp_code, image count), packing `metros_per_film` onto each film."""
+    films_dir = data_dir / "films"
+    films_dir.mkdir(parents=True, exist_ok=True)
+    ark_base = 0
+
+    with open(data_dir / "ed_descr_nums.csv", "w", newline="") as csvf:
+        writer = csv.writer(csvf)
+        writer.writerow(
+            [
+                "year",
+                "utp_code",
+                "digital_film_no",
+                "start_index",
+                "stop_index",
+                "collection",
+            ]
+        )
+
+        for film in range(-(-len(metros) // metros_per_film)):
+            film_no = f"{7_000_000 + film:09}"
+            film_metros = metros[film * metros_per_film : (film + 1) * metros_per_film]
+            start = 50
+            rows = []
+
+            for year, utp_code, size in film_metros:
+                rows.append([year, utp_code, film_no, start, start + size - 1, "1037259"])
+                start += size
+
+            urls = [
+                f"https://www.familysearch.org/ark:/61903/{fake_ark(ark_base + i)}"
+                for i in range(start + 50)
+            ]
+            ark_base += len(urls)
+
+            with open(films_dir / f"{film_no}.json", "w") as jsonf:
+                json.dump({"images": urls}, jsonf)
+
+            writer.writerows(rows)
+
+
+@contextmanager
+def timer(label, results=None):
+    start = time.perf_counter()
+    yield
+    elapsed = time.perf_counter() - start
+    print(f"{label:40} {elapsed * 1000:10.1f} ms")
+
+    if results is not None:
+        results[label] = elapsed
@@ -0,0 +1,110 @@
+import random
+import sqlite3
+from pathlib import Path
+
+import typer
+from typing_extensions import Annotated
+
+from bench.common import timer, write_films
+from src.store import Store
+from src.utils import buildImageList
+
+app = typer.Typer()
+
+# Laid out like the real checkouts, so the annotator's default paths resolve
+# when run from <root>/work
+WORK_DIR = "work"
+DATA_DIR = "gannett-data/scrape_fs"
+CENSUS_YEARS = ["1880", "1900", "1910", "1920", "1930", "1940"]
+
+
+def corpus_metros(count, seed=0):
+    """(year, utp_code, image count) for metros totalling `count` images.
+
+    Sizes vary like real cities: mostly a few hundred images, a long tail
+    of large ones.
+    """
+    rng = random.Random(seed)
+    metros = []
+    total = 0
+
+    while total < count:
+        size = min(count - total, int(rng.lognormvariate(5.3, 0.7)) + 20)
+        metros.append((rng.choice(CENSUS_YEARS), f"Metro{len(metros):05}", size))
+        total += size
+
+    return metros
+
+
+def annotate(db_path, images, fraction, seed=0):
+    """Give the first `fraction` of the corpus EDs, as if that much had been done.
+
+    Every image gets one or two EDs which climb through its metro, with the
+    odd lettered suffix.
+    """
+    rng = random.Random(seed)
+    connection = sqlite3.connect(db_path)
+    store = Store(connection.cursor(), images)
+    store.populate_db()
+    rows = []
+    ed = 1
+
+    for index in range(int(len(images) * fraction)):
+        year = images.year(index)
+        utp_code = images.utpCode(index)
+
+        if images[index].metro_image_index == 0:
+            ed = 1
+
+        for _ in range(rng.choice((1, 1, 1, 2))):
+            suffix = "A" if rng.random() < 0.05 else ""
+            rows.append(
+                (images.db_ids[index], f"{ed}{suffix}", ed, suffix, int(year), utp_code)
+            )
+            ed += rng.random() < 0.3
+
+    connection.executemany(
+        """
+        INSERT INTO eds (image_id, name, ed_num, ed_suffix, year, utp_code)
+            VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT DO NOTHING
+        """,
+        rows,
+    )
+    connection.commit()
+    connection.close()
+
+    return len(rows)
+
+
+def generate_corpus(root, count, fraction=0.5, seed=0):
+    """Write a films/CSV tree and a pre-annotated annotated.db under `root`.
+
+    Returns the work directory, which holds annotated.db.
+    """
+    work_dir = root / WORK_DIR
+    data_dir = root / DATA_DIR
+    work_dir.mkdir(parents=True, exist_ok=True)
+
+    with timer(f"write films      {count:>9,}"):
+        write_films(data_dir, corpus_metros(count, seed))
+
+    with timer(f"annotate {fraction:4.0%}    {count:>9,}"):
+        images = buildImageList(data_dir, work_dir / ".cache/image_list.snapshot")
+        annotate(work_dir / "annotated.db", images, fraction, seed)
+
+    return work_dir
+
+
+@app.command()
+def bench_generate(
+    root: Annotated[Path, typer.Argument()],
+    count: Annotated[int, typer.Option("--count", "-c")] = 100_000,
+    annotated: Annotated[float, typer.Option("--annotated", "-a")] = 0.5,
+    seed: Annotated[int, typer.Option("--seed")] = 0,
+):
+    """Write a synthetic corpus under ROOT. Run the annotator from ROOT/work to use it."""
+    generate_corpus(root, count, annotated, seed)
+
+
+if __name__ == "__main__":
+    app()
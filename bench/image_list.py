@@ -0,0 +1,48 @@
+import tempfile
+from collections import deque
+from pathlib import Path
+from typing import List, Optional
+
+import typer
+from typing_extensions import Annotated
+
+from bench.common import SCALES, timer, write_scrape_tree
+from bench.memory import measure
+from src.utils import buildImageList, iterImages, parseCatalogue
+
+app = typer.Typer()
+
+
+@app.command()
+def bench_image_list(
+    scales: Annotated[Optional[List[int]], typer.Option("--scale", "-s")] = None,
+):
+    """Time buildImageList from scratch (cold) and from its snapshot (warm),
+    against the first image from iterImages, and compare their peak memory."""
+    for count in scales or SCALES:
+        with tempfile.TemporaryDirectory() as tmp:
+            data_dir = Path(tmp) / "scrape_fs"
+            snapshot_path = Path(tmp) / "image_list.snapshot"
+            write_scrape_tree(data_dir, count)
+
+            with timer(f"buildImageList cold  {count:>9,}"):
+                buildImageList(data_dir, snapshot_path)
+
+            with timer(f"buildImageList warm  {count:>9,}"):
+                buildImageList(data_dir, snapshot_path)
+
+            with timer(f"iterImages first     {count:>9,}"):
+                next(iterImages(data_dir))
+
+            measure(
+                f"parseCatalogue  {count:>9,}",
+                lambda: parseCatalogue(data_dir, workers=1),
+            )
+            measure(
+                f"iterImages      {count:>9,}",
+                lambda: deque(iterImages(data_dir), maxlen=0),
+            )
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,89 @@
+import sqlite3
+import tempfile
+import timeit
+from pathlib import Path
+
+import typer
+from typing_extensions import Annotated
+
+from bench.common import METRO_SIZE, synthetic_rows, timer
+from src.migrations import createBaseTables, migrate
+
+app = typer.Typer()
+
+LEGACY_QUERY = """
+    SELECT name
+    FROM eds AS e
+        JOIN images AS i ON i.id = e.image_id
+    WHERE i.utp_code = ?
+    ORDER BY e.name DESC
+    LIMIT 1
+"""
+
+QUERY = """
+    SELECT name
+    FROM eds
+    WHERE year = ? AND utp_code = ?
+    ORDER BY ed_num DESC, ed_suffix DESC
+    LIMIT 1
+"""
+
+
+@app.command()
+def bench_largest_ed(
+    eds: Annotated[int, typer.Option("--eds", "-e")] = 3_000_000,
+    per_image: Annotated[int, typer.Option("--per-image", "-p")] = 5,
+    repeat: Annotated[int, typer.Option("--repeat", "-r")] = 200,
+):
+    """Time largestEDForCurrentMetro's query before and after the ED migration."""
+    images = eds // per_image
+
+    with tempfile.TemporaryDirectory() as tmp:
+        connection = sqlite3.connect(Path(tmp) / "annotated.db")
+        db = connection.cursor()
+
+        with timer(f"build v1 DB with {eds:,} eds"):
+            db.execute("BEGIN")
+            createBaseTables(db)
+            db.execute("PRAGMA user_version = 1")
+            db.executemany(
+                "INSERT INTO images (year, utp_code, ark, image_index, cat) VALUES (?, ?, ?, ?, ?)",
+                (
+                    (int(year), utp_code, ark, i, cat)
+                    for year, utp_code, ark, i, _, _, cat in synthetic_rows(images)
+                ),
+            )
+            db.executemany(
+                "INSERT INTO eds (image_id, name) VALUES (?, ?)",
+                (
+                    (image_id, str(((image_id - 1) % METRO_SIZE) * per_image + n + 1))
+                    for image_id in range(1, images + 1)
+                    for n in range(per_image)
+                ),
+            )
+            connection.commit()
+
+        metros = db.execute(
+            "SELECT DISTINCT year, utp_code FROM images LIMIT ?", (repeat,)
+        ).fetchall()
+
+        def measure(label, fn):
+            per_call = timeit.timeit(fn, number=1) / len(metros)
+            print(f"{label:40} {per_call * 1e6:10.1f} µs/call")
+
+        measure(
+            "legacy largest ED",
+            lambda: [db.execute(LEGACY_QUERY, (utp,)).fetchone() for _, utp in metros],
+        )
+
+        with timer("migrate"):
+            migrate(db)
+
+        measure(
+            "largest ED",
+            lambda: [db.execute(QUERY, metro).fetchone() for metro in metros],
+        )
+
+
+if __name__ == "__main__":
+    app()
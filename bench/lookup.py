@@ -0,0 +1,77 @@
+import random
+import sqlite3
+import tempfile
+import timeit
+from pathlib import Path
+
+import typer
+from typing_extensions import Annotated
+
+from bench.common import METRO_SIZE, synthetic_rows, timer
+from src.lookup import Lookup
+from src.migrations import migrate
+
+app = typer.Typer()
+
+
+def edNumbers(image_id, per_image):
+    first = ((image_id - 1) % METRO_SIZE) * per_image + 1
+    return range(first, first + per_image)
+
+
+@app.command()
+def bench_lookup(
+    eds: Annotated[int, typer.Option("--eds", "-e")] = 3_000_000,
+    per_image: Annotated[int, typer.Option("--per-image", "-p")] = 5,
+    repeat: Annotated[int, typer.Option("--repeat", "-r")] = 5_000,
+):
+    """Time single ED lookups, and a batch of `repeat` of them in one pass."""
+    images = eds // per_image
+
+    with tempfile.TemporaryDirectory() as tmp:
+        connection = sqlite3.connect(Path(tmp) / "annotated.db")
+        db = connection.cursor()
+        migrate(db)
+
+        with timer(f"build DB with {eds:,} eds"):
+            db.execute("BEGIN")
+            db.executemany(
+                "INSERT INTO images (year, utp_code, ark, image_index, cat) VALUES (?, ?, ?, ?, ?)",
+                (
+                    (int(year), utp_code, ark, i, cat)
+                    for year, utp_code, ark, i, _, _, cat in synthetic_rows(images)
+                ),
+            )
+            db.executemany(
+                "INSERT INTO eds (image_id, name, ed_num, year, utp_code) VALUES (?, ?, ?, ?, ?)",
+                (
+                    (image_id, str(ed_num), ed_num, int(year), utp_code)
+                    for image_id, (year, utp_code, *_) in enumerate(
+                        synthetic_rows(images), start=1
+                    )
+                    for ed_num in edNumbers(image_id, per_image)
+                ),
+            )
+            connection.commit()
+
+        lookup = Lookup(db)
+        metros = db.execute("SELECT DISTINCT year, utp_code FROM images").fetchall()
+        rng = random.Random(0)
+        queries = [
+            (*rng.choice(metros), str(rng.randrange(1, METRO_SIZE * per_image + 1)))
+            for _ in range(repeat)
+        ]
+
+        per_call = timeit.timeit(
+            lambda: [lookup.find(*query) for query in queries], number=1
+        ) / len(queries)
+        print(f"{'single lookup':40} {per_call * 1e6:10.1f} µs/call")
+
+        with timer(f"batch lookup of {len(queries):,}"):
+            found = sum(m is not None for _, m in lookup.findAll(queries))
+
+        print(f"{'found':40} {found:10,}")
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,45 @@
+import gc
+import tracemalloc
+from typing import List, Optional
+
+import typer
+from typing_extensions import Annotated
+
+from bench.common import synthetic_rows
+from src.catalogue import Image, ImageCatalogue
+
+app = typer.Typer()
+
+
+def measure(label, build):
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:40} {current / 2**20:8.1f} MiB  (peak {peak / 2**20:8.1f} MiB)")
+
+    return result
+
+
+@app.command()
+def bench_memory(
+    scales: Annotated[Optional[List[int]], typer.Option("--scale", "-s")] = None,
+):
+    """Compare a list of Image objects with the columnar ImageCatalogue."""
+    for count in scales or [100_000, 500_000]:
+        rows = list(synthetic_rows(count))
+
+        images = measure(
+            f"list[Image]     {count:>9,}", lambda: [Image(*row) for row in rows]
+        )
+        del images
+
+        catalogue = measure(
+            f"ImageCatalogue  {count:>9,}", lambda: ImageCatalogue.fromRows(rows)
+        )
+        del catalogue
+
+
+if __name__ == "__main__":
+    app()
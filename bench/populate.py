@@ -0,0 +1,40 @@
+import sqlite3
+import tempfile
+from pathlib import Path
+from typing import List, Optional
+
+import typer
+from typing_extensions import Annotated
+
+from bench.common import SCALES, synthetic_images, timer
+from src.store import Store
+
+app = typer.Typer()
+
+
+@app.command()
+def bench_populate(
+    scales: Annotated[Optional[List[int]], typer.Option("--scale", "-s")] = None,
+):
+    """Time Store.populate_db on a fresh DB and again on an unchanged corpus."""
+    for count in scales or SCALES:
+        images = synthetic_images(count)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = Path(tmp) / "annotated.db"
+
+            with timer(f"populate_db cold  {count:>9,}"):
+                connection = sqlite3.connect(db_path)
+                Store(connection.cursor(), images).populate_db()
+                connection.close()
+
+            images = synthetic_images(count)
+
+            with timer(f"populate_db warm  {count:>9,}"):
+                connection = sqlite3.connect(db_path)
+                Store(connection.cursor(), images).populate_db()
+                connection.close()
+
+
+if __name__ == "__main__":
+    app()
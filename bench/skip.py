@@ -0,0 +1,51 @@
+import sqlite3
+import timeit
+
+import typer
+from typing_extensions import Annotated
+
+from bench.common import synthetic_images, timer
+from src.ed import Ed
+from src.store import Store
+
+app = typer.Typer()
+
+
+def legacySkipToLastEntered(store):
+    """The full-corpus scan Store.skipToLastEntered used to do."""
+    for index, img in reversed(list(enumerate(store.images))):
+        if img.year != "1880" and len(img.eds):
+            store.index = index
+            break
+
+
+@app.command()
+def bench_skip(
+    count: Annotated[int, typer.Option("--count", "-c")] = 500_000,
+    annotated: Annotated[int, typer.Option("--annotated", "-a")] = 100_000,
+    repeat: Annotated[int, typer.Option("--repeat", "-r")] = 20,
+):
+    """Time the s/S skip commands on a partially annotated corpus."""
+    connection = sqlite3.connect(":memory:")
+    store = Store(connection.cursor(), synthetic_images(count))
+
+    with timer(f"populate_db {count:>9,}"):
+        store.populate_db()
+
+    with timer(f"annotate {annotated:>9,}"):
+        for index in range(annotated):
+            store.index = index
+            store.addEDToCurrentImage(Ed(index % 40 + 1))
+
+    def measure(label, fn):
+        per_call = timeit.timeit(fn, number=repeat) / repeat
+        print(f"{label:40} {per_call * 1e6:10.1f} µs/call")
+
+    store.index = 0
+    measure("legacy skipToLastEntered", lambda: legacySkipToLastEntered(store))
+    measure("skipToLastEntered", store.skipToLastEntered)
+    measure("skipToLastEnteredWithinMetro", store.skipToLastEnteredWithinMetro)
+
+
+if __name__ == "__main__":
+    app()
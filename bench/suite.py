@@ -0,0 +1,191 @@
+import json
+import os
+import platform
+import sqlite3
+import tempfile
+import time
+from pathlib import Path
+from typing import List, Optional
+
+import typer
+from typing_extensions import Annotated
+
+from bench.common import SCALES, timer
+from bench.generate import DATA_DIR, generate_corpus
+from src.annotator import Annotator
+from src.driver import driver
+from src.store import Store
+from src.utils import buildImageList
+
+app = typer.Typer()
+
+BASELINE_PATH = Path(__file__).parent / "baseline.json"
+TOLERANCE = 1.5  # slower than baseline by more than this factor is a regression
+
+
+def per_call(label, fn, number, results):
+    start = time.perf_counter()
+    for _ in range(number):
+        fn()
+    elapsed = (time.perf_counter() - start) / number
+
+    print(f"{label:40} {elapsed * 1e6:10.1f} µs/call")
+    results[label] = elapsed
+
+
+def run_scale(count, repeat):
+    """Seconds taken by each hot path on a generated corpus of `count` images."""
+    results = {}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        work_dir = generate_corpus(root, count)
+        data_dir = root / DATA_DIR
+        snapshot_path = root / "bench.snapshot"
+
+        with timer("buildImageList cold", results):
+            buildImageList(data_dir, snapshot_path)
+
+        with timer("buildImageList warm", results):
+            images = buildImageList(data_dir, snapshot_path)
+
+        connection = sqlite3.connect(root / "fresh.db")
+        with timer("populate_db fresh", results):
+            Store(connection.cursor(), images).populate_db()
+        connection.close()
+
+        connection = sqlite3.connect(work_dir / "annotated.db")
+        with timer("populate_db annotated", results):
+            Store(connection.cursor(), buildImageList(data_dir, snapshot_path)).populate_db()
+        connection.close()
+
+        cwd = os.getcwd()
+        os.chdir(work_dir)
+        try:
+            with timer("Annotator startup", results):
+                annotator = Annotator(False, driver(True))
+                annotator.layout()
+
+            runKeys(annotator, count, repeat, results)
+            annotator.navigator.close()
+            annotator.leases.close()
+            annotator.writer.close()
+            annotator.store.db.connection.close()
+        finally:
+            os.chdir(cwd)
+
+    return results
+
+
+def runKeys(annotator, count, repeat, results):
+    """The annotator's key handlers, driven directly, from inside the annotated part."""
+    store = annotator.store
+    start = count // 4
+    repeat = min(repeat, count // 8)
+
+    store.index = start
+    per_call(">  nextImage", annotator.nextImage, repeat, results)
+    per_call("<  prevImage", annotator.prevImage, repeat, results)
+    per_call("}  nextMetro", annotator.nextMetro, repeat // 4, results)
+    per_call("{  prevMetro", annotator.prevMetro, repeat // 4, results)
+
+    def skim():
+        for _ in range(50):
+            annotator.nextImage()
+        annotator.navigator.wait()
+
+    store.index = start
+    per_call(">  nextImage x50, until shown", skim, max(1, repeat // 50), results)
+
+    def addAndUndo():
+        annotator.addNextED()
+        annotator.undoAddED()
+
+    store.index = start
+    per_call("n  addNextED, /  undoAddED", addAndUndo, repeat, results)
+
+    def skip(fn):
+        def run():
+            store.index = start
+            fn()
+
+        return run
+
+    per_call("S  skipToLastEntered", skip(annotator.skipToLastEntered), repeat, results)
+    per_call(
+        "s  skipToLastEnteredWithinMetro",
+        skip(annotator.skipToLastEnteredWithinMetro),
+        repeat,
+        results,
+    )
+
+
+def compare(results, baseline, tolerance):
+    """Print each result against its baseline, returning the keys which regressed."""
+    regressed = []
+    print(f"\n{'':52} {'baseline':>12} {'now':>12} {'ratio':>7}")
+
+    for key, seconds in results.items():
+        if (old := baseline.get(key)) is None:
+            continue
+
+        ratio = seconds / old if old else float("inf")
+        flag = "  REGRESSED" if ratio > tolerance else ""
+        print(f"{key:52} {old * 1e3:9.3f} ms {seconds * 1e3:9.3f} ms {ratio:6.2f}x{flag}")
+
+        if flag:
+            regressed.append(key)
+
+    return regressed
+
+
+def loadBaseline(path):
+    try:
+        with open(path) as f:
+            return json.load(f)["results"]
+    except (OSError, ValueError, KeyError):
+        return {}
+
+
+@app.command()
+def bench_suite(
+    scales: Annotated[Optional[List[int]], typer.Option("--scale", "-s")] = None,
+    baseline: Annotated[Path, typer.Option("--baseline", "-b")] = BASELINE_PATH,
+    save: Annotated[bool, typer.Option("--save-baseline")] = False,
+    tolerance: Annotated[float, typer.Option("--tolerance", "-t")] = TOLERANCE,
+    repeat: Annotated[int, typer.Option("--repeat", "-r")] = 200,
+):
+    """Time every hot path on generated corpora and compare with the baseline.
+
+    Exits non-zero if anything is more than TOLERANCE times slower.
+    """
+    results = {}
+
+    for count in scales or SCALES:
+        print(f"\n== {count:,} images")
+        for label, seconds in run_scale(count, repeat).items():
+            results[f"{label} @{count}"] = seconds
+
+    previous = loadBaseline(baseline)
+    regressed = compare(results, previous, tolerance)
+
+    if save:
+        # Keep other scales' entries, so the baseline can be refreshed piecemeal
+        with open(baseline, "w") as f:
+            json.dump(
+                {
+                    "machine": f"{platform.machine()} {platform.system()}",
+                    "python": platform.python_version(),
+                    "results": previous | results,
+                },
+                f,
+                indent=2,
+            )
+        print(f"\nSaved baseline to {baseline}")
+    elif regressed:
+        print(f"\n{len(regressed)} regressed by more than {tolerance}x")
+        raise typer.Exit(1)
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,32 @@
+import typer
+from typing_extensions import Annotated
+
+from src.throttle import CONTROLLERS, SimulatedServer, simulate
+
+app = typer.Typer()
+
+
+@app.command()
+def bench_throttle(
+    hours: Annotated[int, typer.Option("--hours", "-H")] = 72,
+    limits: Annotated[str, typer.Option("--limits", "-l")] = "300,650,1500",
+    status: Annotated[int, typer.Option("--status", "-s")] = None,
+):
+    """Images/hour and throttle signals for each policy against servers with
+    different hidden hourly limits, with and without a latency warning."""
+    print(f"{'limit':>6} {'warning':>8}", *(f"{name:>16}" for name in CONTROLLERS))
+
+    for limit in (int(limit) for limit in limits.split(",")):
+        for warning in (4, 0):
+            cells = []
+
+            for controller in CONTROLLERS.values():
+                server = SimulatedServer(limit=limit, warning=warning, status=status)
+                result = simulate(controller(), server, hours * 3600)
+                cells.append(f"{result.per_hour:7.0f}/h {result.throttled:5}x")
+
+            print(f"{limit:6} {warning:8}", *(f"{cell:>16}" for cell in cells))
+
+
+if __name__ == "__main__":
+    app()
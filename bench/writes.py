@@ -0,0 +1,55 @@
+import sqlite3
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+import typer
+from typing_extensions import Annotated
+
+from bench.common import synthetic_images, timer
+from src.ed import Ed
+from src.store import Store
+from src.writer import WriteBehindWriter
+
+app = typer.Typer()
+
+
+def run(label, db_path, ops, make_writer, wal=False):
+    connection = sqlite3.connect(db_path)
+    if wal:
+        connection.execute("PRAGMA journal_mode = WAL")
+    store = Store(connection.cursor(), synthetic_images(ops), make_writer(connection))
+    store.populate_db()
+    latencies = []
+
+    for index in range(ops):
+        store.index = index
+        start = time.perf_counter()
+        store.addEDToCurrentImage(Ed(index + 1))
+        latencies.append(time.perf_counter() - start)
+
+    with timer(f"{label} final flush"):
+        store.close()
+
+    latencies.sort()
+    print(
+        f"{label:20} mean {statistics.mean(latencies) * 1e6:9.1f} µs"
+        f"   p99 {latencies[int(len(latencies) * 0.99)] * 1e6:9.1f} µs"
+    )
+    connection.close()
+
+
+@app.command()
+def bench_writes(ops: Annotated[int, typer.Option("--ops", "-n")] = 2_000):
+    """Per-keystroke latency of addEDToCurrentImage with and without write-behind."""
+    with tempfile.TemporaryDirectory() as tmp:
+        run("commit per ED", Path(tmp) / "sync.db", ops, lambda c: None)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "behind.db"
+        run("write-behind", db_path, ops, lambda c: WriteBehindWriter(db_path), True)
+
+
+if __name__ == "__main__":
+    app()
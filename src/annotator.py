@@ -1,4 +1,4 @@
-import sqlite3
+import time
 from enum import Enum, auto
 from pathlib import Path
 
@@ -15,7 +15,7 @@ from prompt_toolkit.key_binding import (
     KeyBindings,
     merge_key_bindings,
 )
-from prompt_toolkit.layout import ConditionalContainer, DynamicContainer
+from prompt_toolkit.layout import ConditionalContainer
 from prompt_toolkit.layout.containers import HSplit, Window
 from prompt_toolkit.layout.controls import FormattedTextControl
 from prompt_toolkit.layout.layout import Layout
@@ -26,14 +26,24 @@ from selenium.webdriver.chrome.options import Options
 from typing_extensions import Annotated
 
 from src.driver import driver
+from src.db import connect
 from src.ed import Ed, ManualEDList
-from src.store import Image, Store, prev
+from src.latency import LatencyRecorder, Timed
+from src.leases import Leases
+from src.navigator import Navigator
+from src.predict import EDPredictor
+from src.store import ADD, Image, Store, prev
 from src.utils import buildImageList
+from src.viewer import LocalViewer
+from src.writer import WriteBehindWriter, flushOnExit
 
 # Turn on to get verbose Selenium logs
 # import logging
 # logging.basicConfig(level=10)
 
+DB_PATH = "annotated.db"
+LATENCY_PATH = "latency.json"
+
 SHOWING_ED_INPUT = False
 SHOWING_JUMP_INPUT = False
 SHOWING_REMOVE_LIST = False
@@ -77,7 +87,6 @@ def annotate_ed_desc_images(
 ):
     annotator = Annotator(debug, driver(headless))
     annotator.process()
-    # annotator.write(Path("../gannett-data/fs_eds.parquet"))
 
 
 @Condition
@@ -95,6 +104,37 @@ def showingRemoveList():
     return SHOWING_REMOVE_LIST
 
 
+@Condition
+def showingEDInput():
+    return SHOWING_ED_INPUT
+
+
+@Condition
+def showingJumpInput():
+    return SHOWING_JUMP_INPUT
+
+
+class CachedText:
+    """Formatted text which is only rebuilt after `invalidate()`.
+
+    Renders happen far more often than state changes, so the toolbars hand
+    back the same fragments until a key has actually been handled.
+    """
+
+    def __init__(self, build):
+        self.build = build
+        self.fragments = None
+
+    def invalidate(self):
+        self.fragments = None
+
+    def __call__(self):
+        if self.fragments is None:
+            self.fragments = [("", self.build())]
+
+        return self.fragments
+
+
 class DummyDriver:
     def get(self, url):
         pass
@@ -109,26 +149,50 @@ class Annotator:
         self.debug = debug
         self.ed_input_state = EDState.NONE
 
-        connection = sqlite3.connect("annotated.db")
+        connection = connect(DB_PATH)
         cursor = connection.cursor()
-        self.store = Store(cursor, buildImageList())
+        self.writer = WriteBehindWriter(DB_PATH)
+        flushOnExit(self.writer)
+        self.store = Store(cursor, buildImageList(), self.writer)
         self.store.populate_db()
         _ = next(self.store)  # Tee up correct curr() image
 
+        # Needs the leases table, which populate_db's migrations create
+        self.leases = Leases(DB_PATH)
+        self.store.leases = self.leases
+        self.lease_holder = None  # another session holding the current metro
+
+        # Charge the Store's SQL to the key being handled. Write-behind commits
+        # happen off-thread, so only queueing and flushes count against a key
+        self.latency = LatencyRecorder()
+        self.store.db = Timed(cursor, self.latency, "db", ("execute", "executemany"))
+        self.store.writer = Timed(self.writer, self.latency, "db", ("submit", "flush"))
+
+        self.predictor = EDPredictor(self.store)
+        self.store.on_changed = self.predictor.update
+
         self.counter = 100
         self.manual_eds = ManualEDList()
 
         self.curr_ed = Ed(1)
 
+        self.show_latency = None
+        self.toolbars = [CachedText(self.top_toolbar), CachedText(self.bottom_toolbar)]
+        self.viewer = LocalViewer(driver, self.store.images, on_shown=self.imageShown)
+        self.navigator = Navigator()
+        self.application = None
+
     def process(self):
-        self.driver.get(self.store.curr().local_url)  # ("https://apple.com")  #
+        self.navigator.submit(self.viewer.open)
+        self.showCurrent()
 
         bindings = self.setupBindings()
 
-        application = Application(
+        application = self.application = Application(
             key_bindings=bindings,
             full_screen=False,
             layout=self.layout(),
+            after_render=self.latency.rendered,
         )
         application.timeoutlen = 0
         application.ttimeoutlen = 0
@@ -155,24 +219,36 @@ class Annotator:
         self.remove_list = CheckboxList(values=[("a", "a"), ("b", "b"), ("c", "c")])
         self.remove_list.multiple_selection = True
 
-        def makeLayout():
-            return HSplit(
+        top, bottom = self.toolbars
+
+        return Layout(
+            HSplit(
                 [
-                    Window(FormattedTextControl(self.top_toolbar()), height=1),
-                    Window(FormattedTextControl(self.bottom_toolbar()), height=1),
-                    ConditionalContainer(
-                        content=self.ed_input, filter=SHOWING_ED_INPUT
-                    ),
+                    Window(FormattedTextControl(top), height=1),
+                    Window(FormattedTextControl(bottom), height=1),
+                    ConditionalContainer(content=self.ed_input, filter=showingEDInput),
                     ConditionalContainer(
-                        content=self.jump_input, filter=SHOWING_JUMP_INPUT
+                        content=self.jump_input, filter=showingJumpInput
                     ),
                     ConditionalContainer(
-                        content=self.remove_list, filter=SHOWING_REMOVE_LIST
+                        content=self.remove_list, filter=showingRemoveList
                     ),
                 ]
             )
+        )
+
+    def invalidateToolbars(self):
+        for toolbar in self.toolbars:
+            toolbar.invalidate()
+
+    def invalidating(self, handler):
+        def run(event):
+            try:
+                return handler(event)
+            finally:
+                self.invalidateToolbars()
 
-        return Layout(DynamicContainer(makeLayout))
+        return run
 
     def top_toolbar(self):
         now = self.store.curr()
@@ -180,7 +256,21 @@ class Annotator:
 
     def bottom_toolbar(self):
         now = self.store.curr()
-        return f"<{self.store.index:5}> Cur: {self.curr_ed} - Man: {self.manual_eds.currStr} - Img EDs: {list(now.eds)}"
+        toolbar = f"<{self.store.index:5}> Cur: {self.curr_ed} - Man: {self.manual_eds.currStr} - Img EDs: {list(now.eds)}"
+
+        if len(now.eds) == 0:
+            toolbar += f" - Pred: {self.predictor.predict(self.store.index or 0)}"
+
+        if self.lease_holder is not None:
+            toolbar += f" - Metro taken by {self.lease_holder}"
+
+        if self.debug and self.show_latency is not None:
+            toolbar += f" - Shown in {self.show_latency * 1000:.0f} ms"
+
+        if self.debug and self.latency.last is not None:
+            toolbar += f" - {self.latency.toolbarText()}"
+
+        return toolbar
 
     def current_image(self):
         now = self.store.curr()
@@ -196,10 +286,16 @@ class Annotator:
 
     def updateLastEntered(self):
         last = self.store.curr()
-        self.curr_ed = Ed.from_str(list(last.eds)[-1])
-        new = next(self.store)
 
-        self.driver.get(new.local_url)
+        if last.eds:
+            self.curr_ed = Ed.from_str(last.lastED())
+            _ = next(self.store)
+        else:
+            # Skipping past other sessions' metros can land where nothing's
+            # entered yet: the metro's first image, which starts again from 1
+            self.curr_ed = Ed(1)
+
+        self.showCurrent()
 
     def addNextED(self):
         curr = self.store.curr()
@@ -225,29 +321,50 @@ class Annotator:
         self.store.addEDToCurrentImage(self.curr_ed)
 
     def undoAddED(self):
-        if removedED := self.store.removeLastED():
-            ed = Ed.from_str(removedED)
-            is_first_ed = len(self.store.curr().eds) == 0
-            should_decrement = True
-
-            if is_first_ed:
-                # Check prev last ED
-                prev_img = self.store.images[self.store.index - 1]
-                prev_ed = prev_img.lastED()
-                if prev_ed and Ed.from_str(prev_ed) == ed:
-                    should_decrement = False
-
-            if ed == self.curr_ed:
-                if should_decrement:
-                    self.curr_ed -= 1
-
-            else:  # Look through manual EDs
-                if should_decrement:
-                    for i, slot in enumerate(self.manual_eds.slots()):
-                        if slot == ed:
-                            self.manual_eds.index = i
-                            self.manual_eds.decrementCurr()
-                            break
+        old_index = self.store.index
+
+        if (op := self.store.undo()) is None:
+            return
+
+        if self.store.index != old_index:
+            self.showCurrent()
+
+        # Only an undone addition moves the slots back
+        if op.kind != ADD:
+            return
+
+        ed = op.ed
+        should_decrement = True
+
+        if len(self.store.curr().eds) == 0 and op.index > 0:
+            # Don't decrement if the previous image ends on the same ED
+            prev_ed = self.store.images[op.index - 1].lastED()
+            if prev_ed and Ed.from_str(prev_ed) == ed:
+                should_decrement = False
+
+        if ed == self.curr_ed:
+            if should_decrement:
+                self.curr_ed -= 1
+
+        else:  # Look through manual EDs
+            if should_decrement:
+                for i, slot in enumerate(self.manual_eds.slots()):
+                    if slot == ed:
+                        self.manual_eds.index = i
+                        self.manual_eds.decrementCurr()
+                        break
+
+    def redoAddED(self):
+        old_index = self.store.index
+
+        if (op := self.store.redo()) is None:
+            return
+
+        if self.store.index != old_index:
+            self.showCurrent()
+
+        if op.kind == ADD and op.ed is not None and self.curr_ed + 1 == op.ed:
+            self.curr_ed = op.ed
 
     def increaseED(self):
         self.curr_ed += 1
@@ -279,9 +396,9 @@ class Annotator:
 
         if new_index >= 0 and new_index < len(self.store.images):
             self.store.index = new_index
-            new = self.store.curr()
-            self.driver.get(new.local_url)
+            self.showCurrent()
 
+        self.invalidateToolbars()
         return False  # reset the buffer
 
     def dismissInput(self):
@@ -324,7 +441,7 @@ class Annotator:
     def nextImage(self):
         old = self.store.curr()
         new = next(self.store)
-        self.driver.get(new.local_url)
+        self.showCurrent()
 
         if old.utp_code != new.utp_code:
             self.curr_ed = Ed(1)
@@ -333,20 +450,20 @@ class Annotator:
     def prevImage(self):
         old = self.store.curr()
         new = prev(self.store)
-        self.driver.get(new.local_url)
+        self.showCurrent()
 
         if old.utp_code != new.utp_code:
             self.curr_ed = Ed.from_str(self.store.largestEDForCurrentMetro())
             self.ed_input.text = ""
 
     def nextMetro(self):
-        new = self.store.nextMetro()
-        self.driver.get(new.local_url)
+        self.store.nextMetro()
+        self.showCurrent()
         self.curr_ed = Ed(1)
 
     def prevMetro(self):
-        new = self.store.prevMetro()
-        self.driver.get(new.local_url)
+        self.store.prevMetro()
+        self.showCurrent()
         self.curr_ed = Ed.from_str(self.store.largestEDForCurrentMetro())
 
     def clickSpanWithClass(self, name):
@@ -359,8 +476,36 @@ class Annotator:
         )
 
     def syncImageWithDriver(self):
-        cur = self.store.curr()
-        self.driver.get(cur.local_url)
+        with self.latency.phase("browser"):
+            self.navigator.submit(self.viewer.open)
+        self.showCurrent()
+
+    def showCurrent(self):
+        index = self.store.index or 0
+        started = time.perf_counter()
+        self.claimCurrentMetro()
+
+        # Only the newest of several queued shows is ever loaded
+        with self.latency.phase("browser"):
+            self.navigator.submit(lambda: self.viewer.show(index, started), key="show")
+
+    def claimCurrentMetro(self):
+        img = self.store.curr()
+
+        with self.latency.phase("db"):
+            if self.leases.claim(img.year, img.utp_code):
+                self.lease_holder = None
+            else:
+                self.lease_holder = self.leases.holderOf(img.year, img.utp_code)
+
+    def imageShown(self, index, seconds):
+        # Called on the navigator's thread
+        self.show_latency = seconds
+
+        if self.debug:
+            self.invalidateToolbars()
+            if self.application is not None:
+                self.application.invalidate()
 
     def display_ed_input(self, ed_input_state):
         global SHOWING_ED_INPUT
@@ -401,6 +546,7 @@ class Annotator:
             self.store.addEDToCurrentImage(new)
 
         self.ed_input_state = EDState.NONE
+        self.invalidateToolbars()
         return False  # reset the buffer
 
     def prevManualEDSlot(self):
@@ -418,8 +564,12 @@ class Annotator:
     def loadRemoteURL(self):
         curr = self.store.curr()
 
-        self.driver.switch_to.new_window()
-        self.driver.get(curr.url)
+        def load():
+            self.driver.switch_to.new_window()
+            self.driver.get(curr.url)
+
+        with self.latency.phase("browser"):
+            self.navigator.submit(load)
 
     def fillToED(self, new_ed_string):
         new_ed = Ed.from_str(new_ed_string)
@@ -428,6 +578,19 @@ class Annotator:
             while self.curr_ed < new_ed:
                 self.addNextED()
 
+    def acceptPrediction(self):
+        if len(self.store.curr().eds):
+            return
+
+        prediction = self.predictor.predict(self.store.index or 0)
+        count = prediction.count
+
+        if prediction.continues:
+            self.addCurrED()
+            count -= 1
+
+        self.fillByCount(count)
+
     def fillByCount(self, count_string):
         try:
             count = int(count_string)
@@ -505,6 +668,10 @@ class Annotator:
         def _(event):
             self.fillByCount(9)
 
+        @kb.add("p")
+        def _(event):
+            self.acceptPrediction()
+
         @kb.add("N")
         def _(event):
             self.addNextCustomED()
@@ -592,10 +759,18 @@ class Annotator:
         def _(event):
             self.undoAddED()
 
+        @kb.add("c-y")
+        def _(event):
+            self.redoAddED()
+
         @kb.add("c-c")
         @kb.add("q")
         def _(event):
+            self.store.close()
+            self.leases.close()
+            self.navigator.close()
             self.driver.quit()
+            self.latency.dump(LATENCY_PATH)
             event.app.exit(result=True)
 
         inputKB = KeyBindings()
@@ -611,6 +786,12 @@ class Annotator:
         def _(event):
             self.dismiss_remove_list()
 
+        # Every handler may change what the toolbars show
+        for bindings in (kb, inputKB, removeListKB):
+            for binding in bindings.bindings:
+                binding.handler = self.invalidating(binding.handler)
+            self.latency.instrument(bindings)
+
         return merge_key_bindings(
             [
                 ConditionalKeyBindings(kb, notShowingInput),
@@ -0,0 +1,323 @@
+import hashlib
+from array import array
+from functools import cache
+from pathlib import Path
+
+from ordered_set import StableSet
+
+FS_IMG_URL = "https://www.familysearch.org/ark:/61903/{ark}?i={i}&cat={cat}"
+IMAGE_DIR = Path("../ed-desc-img")
+DERIVED_DIR_NAME = ".derived"
+
+
+@cache
+def imageRoot():
+    """IMAGE_DIR resolved once, rather than on every local_url."""
+    return IMAGE_DIR.resolve()
+
+
+class Image:
+    __slots__ = (
+        "year",
+        "utp_code",
+        "ark",
+        "image_index",
+        "metro_image_index",
+        "metro_image_count",
+        "cat",
+        "eds",
+        "db_id",
+    )
+
+    def __init__(
+        self,
+        year,
+        utp_code,
+        ark,
+        i,
+        metro_index,
+        metro_image_count,
+        cat,
+        eds=None,
+        db_id=None,
+    ):
+        self.year = year
+        self.utp_code = utp_code
+        self.ark = ark
+        self.image_index = i
+        self.metro_image_index = metro_index
+        self.metro_image_count = metro_image_count
+        self.cat = cat
+        self.eds = StableSet([]) if eds is None else eds
+        self.db_id = db_id
+
+    def __eq__(self, other):
+        return self.ark == other.ark
+
+    def __repr__(self):
+        return f"{self.year} {self.utp_code:15} {self.image_index:4} {self.ark} [{self.metro_image_index:4}/{self.metro_image_count}]"
+
+    def addED(self, ed):
+        self.eds.add(str(ed).upper())
+
+    def removeED(self, ed):
+        self.eds.remove(str(ed).upper())
+
+    def lastED(self):
+        if len(self.eds) > 0:
+            return self.eds[len(self.eds) - 1]
+
+        return None
+
+    @property
+    def url(self):
+        return FS_IMG_URL.format_map(
+            {"ark": self.ark, "i": self.image_index, "cat": self.cat}
+        )
+
+    @property
+    def local_url(self):
+        return self.localURL("screen")
+
+    def localURL(self, level=None):
+        """file:// URL of a derived level (see src.derive), else the downloaded original."""
+        return localFileURL(self.year, self.utp_code, self.ark, level)
+
+
+@cache
+def localFileURL(year, utp_code, ark, level):
+    """Looks on disk once per image, not on every keypress which shows it.
+
+    Images derived while this process runs are picked up once it restarts.
+    """
+    rel_path = Path(year) / utp_code / f"{ark[4:]}.png"
+
+    if level is not None:
+        derived = derivedPath(imageRoot(), level, rel_path)
+        if derived.is_file():
+            return derived.as_uri()
+
+    return (imageRoot() / rel_path).as_uri()
+
+
+def derivedPath(image_dir, level, rel_path):
+    return image_dir / DERIVED_DIR_NAME / level / rel_path.with_suffix(".jpg")
+
+
+class SparseEDs(StableSet):
+    """ED set for an image view which only joins the catalogue once it is written to."""
+
+    __slots__ = ("catalogue_eds", "index")
+
+    def __init__(self, catalogue_eds, index):
+        super().__init__()
+        self.catalogue_eds = catalogue_eds
+        self.index = index
+
+    def add(self, key):
+        target = self.catalogue_eds.setdefault(self.index, self)
+        StableSet.add(target, key)
+
+        if target is not self:
+            StableSet.add(self, key)
+
+    def update(self, *sets):
+        for items in sets:
+            for key in items:
+                self.add(key)
+
+    def remove(self, key):
+        if key not in self.catalogue_eds.get(self.index, self):
+            raise KeyError(key)
+
+        self.discard(key)
+
+    def discard(self, key):
+        target = self.catalogue_eds.get(self.index, self)
+        StableSet.discard(target, key)
+
+        if target is not self:
+            StableSet.discard(self, key)
+
+
+class CodeTable:
+    """Interns repeated strings as small integer codes."""
+
+    def __init__(self):
+        self.values = []
+        self.codes = {}
+
+    def code(self, value):
+        if (code := self.codes.get(value)) is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+
+        return code
+
+    def __getitem__(self, code):
+        return self.values[code]
+
+    def __getstate__(self):
+        return self.values
+
+    def __setstate__(self, values):
+        self.values = values
+        self.codes = {value: code for code, value in enumerate(values)}
+
+
+class ImageCatalogue:
+    """Columnar store of every image. Indexing returns a lightweight Image view.
+
+    Years, metros and collections are interned; arks are packed into one ASCII
+    buffer. EDs live in a sparse dict keyed by image index, so only images
+    which have been annotated carry a StableSet.
+    """
+
+    def __init__(self):
+        self.years = CodeTable()
+        self.utp_codes = CodeTable()
+        self.cats = CodeTable()
+
+        self.year_codes = array("H")
+        self.utp_code_codes = array("I")
+        self.cat_codes = array("H")
+        self.image_indices = array("I")
+        self.metro_indices = array("I")
+        self.metro_counts = array("I")
+        self.ark_offsets = array("I", [0])
+        self.arks = bytearray()
+
+        self.db_ids = array("q")
+        self.eds = {}
+
+    @classmethod
+    def fromRows(cls, rows):
+        catalogue = cls()
+        for row in rows:
+            catalogue.append(*row)
+
+        return catalogue
+
+    @classmethod
+    def fromImages(cls, images):
+        """Wrap existing Image objects, sharing their ED sets."""
+        catalogue = cls()
+        for index, img in enumerate(images):
+            catalogue.append(
+                img.year,
+                img.utp_code,
+                img.ark,
+                img.image_index,
+                img.metro_image_index,
+                img.metro_image_count,
+                img.cat,
+            )
+            catalogue.eds[index] = img.eds
+            catalogue.db_ids[index] = img.db_id or 0
+
+        return catalogue
+
+    def append(self, year, utp_code, ark, i, metro_index, metro_image_count, cat):
+        self.year_codes.append(self.years.code(year))
+        self.utp_code_codes.append(self.utp_codes.code(utp_code))
+        self.cat_codes.append(self.cats.code(cat))
+        self.image_indices.append(i)
+        self.metro_indices.append(metro_index)
+        self.metro_counts.append(metro_image_count)
+        self.arks += ark.encode("ascii")
+        self.ark_offsets.append(len(self.arks))
+        self.db_ids.append(0)
+
+    def __len__(self):
+        return len(self.year_codes)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("image index out of range")
+
+        if (eds := self.eds.get(index)) is None:
+            eds = SparseEDs(self.eds, index)
+
+        return Image(
+            self.years[self.year_codes[index]],
+            self.utp_codes[self.utp_code_codes[index]],
+            self.ark(index),
+            self.image_indices[index],
+            self.metro_indices[index],
+            self.metro_counts[index],
+            self.cats[self.cat_codes[index]],
+            eds=eds,
+            db_id=self.db_ids[index] or None,
+        )
+
+    def __iter__(self):
+        return (self[index] for index in range(len(self)))
+
+    def ark(self, index):
+        return self.arks[self.ark_offsets[index] : self.ark_offsets[index + 1]].decode(
+            "ascii"
+        )
+
+    def arkList(self):
+        """Every ark, decoding the packed buffer once."""
+        arks = self.arks.decode("ascii")
+        offsets = self.ark_offsets
+        return [arks[offsets[i] : offsets[i + 1]] for i in range(len(self))]
+
+    def year(self, index):
+        return self.years[self.year_codes[index]]
+
+    def utpCode(self, index):
+        return self.utp_codes[self.utp_code_codes[index]]
+
+    def edCount(self, index):
+        eds = self.eds.get(index)
+        return len(eds) if eds is not None else 0
+
+    def fingerprint(self):
+        """Hash of every column stored in the images table."""
+        digest = hashlib.sha1()
+        for table in (self.years, self.utp_codes, self.cats):
+            digest.update("\x1f".join(table.values).encode() + b"\x1e")
+        for column in (
+            self.year_codes,
+            self.utp_code_codes,
+            self.cat_codes,
+            self.image_indices,
+            self.ark_offsets,
+            self.arks,
+        ):
+            digest.update(column)
+
+        return digest.hexdigest()
+
+    def rows(self):
+        """(year, utp_code, ark, image_index, cat) for every image, as stored in the DB."""
+        years = self.years.values
+        utp_codes = self.utp_codes.values
+        cats = self.cats.values
+
+        for index, ark in enumerate(self.arkList()):
+            yield (
+                years[self.year_codes[index]],
+                utp_codes[self.utp_code_codes[index]],
+                ark,
+                self.image_indices[index],
+                cats[self.cat_codes[index]],
+            )
+
+    def __getstate__(self):
+        # EDs and DB ids come from the database, not the snapshot
+        state = self.__dict__.copy()
+        del state["db_ids"], state["eds"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.db_ids = array("q", bytes(8 * len(self)))
+        self.eds = {}
@@ -0,0 +1,47 @@
+"""Connections to annotated.db which several annotators can share.
+
+WAL lets everyone read while one writes, and the busy timeout makes a writer
+wait its turn for the lock instead of failing. Anything still refused after
+that is retried with backoff.
+"""
+
+import random
+import sqlite3
+import time
+
+BUSY_TIMEOUT = 30  # seconds to wait for another session's write lock
+RETRIES = 5
+
+
+def connect(path, **kwargs):
+    connection = sqlite3.connect(path, timeout=BUSY_TIMEOUT, **kwargs)
+
+    try:
+        connection.execute("PRAGMA journal_mode = WAL")
+    except sqlite3.OperationalError:
+        # Another connection holds a lock; WAL is persistent, so it's usually set already
+        pass
+
+    connection.execute("PRAGMA synchronous = NORMAL")
+    connection.execute("PRAGMA foreign_keys = 1")
+
+    return connection
+
+
+def isBusy(e):
+    message = str(e)
+    return isinstance(e, sqlite3.OperationalError) and (
+        "locked" in message or "busy" in message
+    )
+
+
+def retryBusy(fn, retries=RETRIES, sleep=time.sleep):
+    """Call `fn`, retrying with jittered exponential backoff while the DB is locked."""
+    for attempt in range(retries + 1):
+        try:
+            return fn()
+        except sqlite3.OperationalError as e:
+            if not isBusy(e) or attempt == retries:
+                raise
+
+            sleep(min(0.1 * 2**attempt, 2.0) * random.uniform(0.5, 1.5))
@@ -0,0 +1,135 @@
+import hashlib
+import io
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import typer
+from typing_extensions import Annotated
+
+from src.catalogue import DERIVED_DIR_NAME, IMAGE_DIR, derivedPath
+from src.log import get_logger
+
+MANIFEST_NAME = "manifest.json"
+
+# Bounding boxes for each level. "screen" matches the annotator's browser window.
+LEVELS = {
+    "screen": (1504, 1573),
+}
+JPEG_QUALITY = 85
+
+app = typer.Typer()
+
+
+@app.command()
+def derive_images(
+    workers: Annotated[int, typer.Option("--workers", "-w")] = os.cpu_count() or 1,
+    force: Annotated[bool, typer.Option("--force", "-f")] = False,
+):
+    deriveTree(IMAGE_DIR, workers=workers, force=force)
+
+
+def deriveTree(image_dir, workers=None, force=False):
+    """Write every level for each source image whose content has changed.
+
+    Returns the number of sources (re)derived.
+    """
+    log = get_logger()
+    manifest_path = image_dir / DERIVED_DIR_NAME / MANIFEST_NAME
+    manifest = loadManifest(manifest_path)
+    jobs = []
+
+    for src_path in sorted(image_dir.glob("*/*/*.png")):
+        rel = src_path.relative_to(image_dir)
+        stat = src_path.stat()
+        known = manifest.get(str(rel))
+        outputs = [derivedPath(image_dir, level, rel) for level in LEVELS]
+
+        if (
+            not force
+            and known is not None
+            and known["size"] == stat.st_size
+            and known["mtime_ns"] == stat.st_mtime_ns
+            and all(path.is_file() for path in outputs)
+        ):
+            continue
+
+        jobs.append((src_path, outputs, None if force else known))
+
+    if workers == 1 or len(jobs) < 2:
+        results = [deriveImage(*job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(deriveImage, *zip(*jobs), chunksize=8))
+
+    derived = 0
+    for (src_path, _, _), result in zip(jobs, results):
+        rel = str(src_path.relative_to(image_dir))
+
+        if "error" in result:
+            log.warning(f"Failed to derive {rel}: {result['error']}")
+            continue
+
+        derived += result.pop("derived")
+        manifest[rel] = result
+
+    saveManifest(manifest_path, manifest)
+    log.info(f"Derived {derived} of {len(jobs)} changed images ({len(manifest)} total)")
+
+    return derived
+
+
+def deriveImage(src_path, outputs, known):
+    """Resize one source into each level. Runs in a worker process."""
+    from PIL import Image as PILImage
+
+    try:
+        stat = src_path.stat()
+        data = src_path.read_bytes()
+        digest = hashlib.sha1(data).hexdigest()
+        entry = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha1": digest}
+
+        # Touched but unchanged: nothing to redo
+        if (
+            known is not None
+            and known.get("sha1") == digest
+            and all(path.is_file() for path in outputs)
+        ):
+            return entry | {"derived": 0}
+
+        with PILImage.open(io.BytesIO(data)) as source:
+            source = source.convert("RGB")
+
+            for (level, box), out_path in zip(LEVELS.items(), outputs):
+                resized = source.copy()
+                resized.thumbnail(box, PILImage.LANCZOS)
+                out_path.parent.mkdir(parents=True, exist_ok=True)
+                tmp_path = out_path.with_suffix(".tmp")
+                resized.save(tmp_path, "JPEG", quality=JPEG_QUALITY)
+                os.replace(tmp_path, out_path)
+
+        return entry | {"derived": 1}
+    except Exception as e:
+        return {"error": str(e)}
+
+
+def loadManifest(manifest_path):
+    try:
+        with open(manifest_path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def saveManifest(manifest_path, manifest):
+    manifest_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = manifest_path.with_suffix(".tmp")
+
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f)
+
+    os.replace(tmp_path, manifest_path)
+
+
+if __name__ == "__main__":
+    app()
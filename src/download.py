@@ -0,0 +1,246 @@
+import base64
+import hashlib
+import os
+import re
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import NamedTuple
+from urllib.parse import quote
+
+from requests.adapters import HTTPAdapter
+from requests_cache import DO_NOT_CACHE
+from urllib3.util import Retry
+
+from src.be_nice import CachedLimiterSession
+from src.throttle import Observation
+
+ED_DESC_URL = "https://www.familysearch.org/search/image/download?uri=https%3A%2F%2Fsg30p0.familysearch.org%2Fservice%2Frecords%2Fstorage%2Fdascloud%2Fdas%2Fv2%2F{}"
+CHUNK_SIZE = 64 * 1024
+MIN_IMAGE_SIZE = 20_000
+CONTENT_RANGE_RE = re.compile(r"bytes (\d+)-(\d+)/(\d+|\*)")
+
+
+class DownloadError(Exception):
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+class DownloadResult(NamedTuple):
+    image: object
+    path: object
+    size: int = 0
+    sha256: str = None
+    error: str = None
+    status: int = None
+
+
+def sessionFromDriver(driver, per_minute, workers=4):
+    """A keep-alive session carrying the signed-in browser's cookies and user agent."""
+    session = CachedLimiterSession(
+        backend="memory",
+        expire_after=DO_NOT_CACHE,  # image bodies are streamed to disk, never cached
+        per_minute=per_minute,
+        bucket_name="familysearch",
+    )
+    session.headers["User-Agent"] = driver.execute_script("return navigator.userAgent")
+
+    for cookie in driver.get_cookies():
+        session.cookies.set(
+            cookie["name"],
+            cookie["value"],
+            domain=cookie.get("domain"),
+            path=cookie.get("path", "/"),
+        )
+
+    mountPool(session, workers)
+    return session
+
+
+def mountPool(session, workers):
+    # One pooled connection per worker; retry transient server errors only, since
+    # 429s are the rate limiter's business
+    retry = Retry(total=3, backoff_factor=2, status_forcelist=(500, 502, 503, 504))
+    adapter = HTTPAdapter(
+        pool_connections=1, pool_maxsize=workers, max_retries=retry
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+
+
+class Downloader:
+    """Fetches full-size images over HTTP, without rendering the viewer.
+
+    Each image streams into `<name>.part` beside its destination, so an
+    interrupted download resumes with a Range request. It's only renamed into
+    place once its size, checksum and JPEG markers check out.
+    """
+
+    def __init__(
+        self,
+        session,
+        url_template=ED_DESC_URL,
+        workers=4,
+        timeout=60,
+        min_size=MIN_IMAGE_SIZE,
+        throttle=None,
+    ):
+        self.session = session
+        self.url_template = url_template
+        self.workers = workers
+        self.timeout = timeout
+        self.min_size = min_size
+        self.throttle = throttle
+
+    def url(self, img):
+        return self.url_template.format(quote(f"{img.ark}/dist.jpg", safe=""))
+
+    def downloadAll(self, jobs):
+        """Download each (image, path) in `jobs`, yielding DownloadResults as they finish.
+
+        At most twice as many jobs as workers are in flight, so `jobs` may be a
+        lazy generator over the whole catalogue.
+        """
+        jobs = iter(jobs)
+        pending = set()
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            while True:
+                while len(pending) < self.workers * 2:
+                    if (job := next(jobs, None)) is None:
+                        break
+                    pending.add(executor.submit(self.download, *job))
+
+                if not pending:
+                    return
+
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                yield from (future.result() for future in done)
+
+    def download(self, img, path):
+        if self.throttle is None:
+            return self.attempt(img, path)
+
+        self.throttle.wait()
+        started = time.monotonic()
+        result = self.attempt(img, path)
+
+        # No response at all looks the same as the viewer timing out
+        latency = time.monotonic() - started
+        if result.error is not None and result.status is None:
+            latency = None
+
+        self.throttle.observe(
+            Observation(result.error is None, latency, result.status, result.size)
+        )
+        return result
+
+    def attempt(self, img, path):
+        part = path.with_name(path.name + ".part")
+        status = None
+
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            status = self.fetch(img, part)
+            size, sha256 = self.verify(part)
+            os.replace(part, path)
+            return DownloadResult(img, path, size, sha256, status=status)
+        except DownloadError as e:
+            # The partial data is wrong, not just short: start over next time
+            part.unlink(missing_ok=True)
+            return DownloadResult(img, path, error=str(e), status=e.status or status)
+        except Exception as e:
+            response = getattr(e, "response", None)
+            status = getattr(response, "status_code", None)
+            return DownloadResult(img, path, error=str(e), status=status)
+
+    def fetch(self, img, part):
+        offset = part.stat().st_size if part.is_file() else 0
+        headers = {"Range": f"bytes={offset}-"} if offset else {}
+
+        with self.session.get(
+            self.url(img), headers=headers, stream=True, timeout=self.timeout
+        ) as res:
+            if res.status_code == 416:
+                raise DownloadError(
+                    f"Partial download of {offset} bytes is too long", res.status_code
+                )
+
+            res.raise_for_status()
+
+            if res.status_code != 206:
+                offset = 0  # the server ignored the Range header
+            elif rangeStart(res) != offset:
+                raise DownloadError(
+                    f"Unexpected Content-Range for offset {offset}", res.status_code
+                )
+
+            expected = expectedSize(res)
+            # Keep what arrived before a dropped connection, and check the length ourselves
+            res.raw.enforce_content_length = False
+            md5 = hashlib.md5() if res.status_code == 200 else None
+
+            with open(part, "ab" if offset else "wb") as f:
+                for chunk in res.iter_content(CHUNK_SIZE):
+                    f.write(chunk)
+                    if md5 is not None:
+                        md5.update(chunk)
+
+                f.flush()
+                os.fsync(f.fileno())
+
+            size = part.stat().st_size
+
+            # Short: keep the part for the next attempt to resume
+            if expected is not None and size < expected:
+                raise OSError(f"Connection closed after {size} of {expected} bytes")
+            if expected is not None and size > expected:
+                raise DownloadError(
+                    f"Got {size} bytes, expected {expected}", res.status_code
+                )
+
+            if md5 is not None and (digest := res.headers.get("Content-MD5")):
+                if base64.b64decode(digest) != md5.digest():
+                    raise DownloadError("Content-MD5 mismatch", res.status_code)
+
+            return res.status_code
+
+    def verify(self, part):
+        """Size and SHA-256 of a complete download, checked for a whole JPEG."""
+        sha256 = hashlib.sha256()
+        size = 0
+        tail = b""
+
+        with open(part, "rb") as f:
+            head = f.read(2)
+            f.seek(0)
+
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                sha256.update(chunk)
+                size += len(chunk)
+                tail = (tail + chunk[-2:])[-2:]
+
+        if size < self.min_size:
+            raise DownloadError(f"Only {size} bytes, not an image")
+        if head != b"\xff\xd8" or tail != b"\xff\xd9":
+            raise DownloadError("Not a complete JPEG")
+
+        return size, sha256.hexdigest()
+
+
+def rangeStart(res):
+    match = CONTENT_RANGE_RE.fullmatch(res.headers.get("Content-Range", ""))
+    return int(match[1]) if match else None
+
+
+def expectedSize(res):
+    """Total size of the resource, if the response says."""
+    match = CONTENT_RANGE_RE.fullmatch(res.headers.get("Content-Range", ""))
+    if match and match[3] != "*":
+        return int(match[3])
+
+    # Content-Length counts encoded bytes; iter_content yields decoded ones
+    if "Content-Length" in res.headers and "Content-Encoding" not in res.headers:
+        return int(res.headers["Content-Length"])
+
+    return None
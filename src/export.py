@@ -0,0 +1,204 @@
+import json
+import os
+import shutil
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+import typer
+from typing_extensions import Annotated
+
+from src.db import connect
+from src.log import get_logger
+from src.migrations import migrate
+
+DB_PATH = Path("annotated.db")
+EXPORT_PATH = Path("../gannett-data/fs_eds")
+STATE_NAME = "_export_state.json"
+PART_NAME = "part-0.parquet"
+BATCH_SIZE = 50_000
+
+# year and utp_code are in each partition's path, hive-style
+SCHEMA = pa.schema(
+    [
+        ("image_id", pa.int64()),
+        ("ark", pa.string()),
+        ("image_index", pa.int32()),
+        ("cat", pa.int64()),
+        ("ed_id", pa.int64()),
+        ("name", pa.string()),
+        ("ed_num", pa.int32()),
+        ("ed_suffix", pa.string()),
+        ("created_at", pa.timestamp("s")),
+    ]
+)
+
+app = typer.Typer()
+
+
+@app.command()
+def export_eds(
+    db_path: Annotated[Path, typer.Option("--db")] = DB_PATH,
+    out_path: Annotated[Path, typer.Option("--out", "-o")] = EXPORT_PATH,
+    full: Annotated[bool, typer.Option("--full", "-f")] = False,
+):
+    """Write every image and its EDs as Parquet, partitioned by year and metro.
+
+    Only metros whose EDs have changed since the last export are rewritten.
+    """
+    log = get_logger()
+    connection = connect(db_path)
+
+    try:
+        written = Exporter(connection.cursor(), out_path).export(full=full)
+    finally:
+        connection.close()
+
+    log.info(f"Exported {len(written)} metros to {out_path}")
+
+
+class Exporter:
+    """Exports annotated.db to a Parquet dataset, a metro per file.
+
+    The state file records how far the last export got: the highest image,
+    ED and tombstone ids, and the newest ED's created_at. Anything beyond
+    those marks names the metros to rewrite; the rest are left alone.
+    """
+
+    def __init__(self, db, out_path, batch_size=BATCH_SIZE):
+        self.db = db
+        self.out_path = Path(out_path)
+        self.batch_size = batch_size
+        migrate(self.db)
+
+    def export(self, full=False):
+        """Rewrite each changed metro's partition. Returns the (year, utp_code)s written."""
+        state_path = self.out_path / STATE_NAME
+        since = None if full else loadState(state_path)
+
+        # Taken first: anything committed while exporting is picked up next time
+        mark = self.watermark()
+        metros = self.changedMetros(since)
+
+        for year, utp_code in metros:
+            self.writePartition(year, utp_code)
+
+        saveState(state_path, mark)
+
+        return metros
+
+    def watermark(self):
+        images_id, = self.db.execute("SELECT MAX(id) FROM images").fetchone()
+        eds_id, created_at = self.db.execute(
+            "SELECT MAX(id), MAX(created_at) FROM eds"
+        ).fetchone()
+        deleted_id, = self.db.execute("SELECT MAX(id) FROM eds_deleted").fetchone()
+
+        return {
+            "images_id": images_id or 0,
+            "eds_id": eds_id or 0,
+            "created_at": created_at or "",
+            "deleted_id": deleted_id or 0,
+        }
+
+    def changedMetros(self, since):
+        if since is None:
+            query, params = "SELECT DISTINCT year, utp_code FROM images", ()
+        else:
+            # Deleting the newest ED frees its id for reuse, so new EDs are also
+            # found by created_at and by the ids of recent tombstones. Each arm is
+            # an index range scan.
+            query = """
+                SELECT year, utp_code FROM images WHERE id > :images_id
+                UNION
+                SELECT year, utp_code FROM eds WHERE id > :eds_id
+                UNION
+                SELECT year, utp_code FROM eds WHERE created_at > :created_at
+                UNION
+                SELECT year, utp_code FROM eds_deleted WHERE id > :deleted_id
+                UNION
+                SELECT e.year, e.utp_code FROM eds_deleted AS d
+                    JOIN eds AS e ON e.id = d.ed_id
+                    WHERE d.id > :deleted_id
+            """
+            params = since
+
+        return sorted(
+            (year, utp_code)
+            for year, utp_code in self.db.execute(query, params).fetchall()
+            if year is not None
+        )
+
+    def partitionPath(self, year, utp_code):
+        return self.out_path / f"year={year}" / f"utp_code={utp_code}" / PART_NAME
+
+    def writePartition(self, year, utp_code):
+        """Stream one metro's images and EDs into its file, a batch at a time."""
+        path = self.partitionPath(year, utp_code)
+        res = self.db.execute(
+            """
+            SELECT i.id, i.ark, i.image_index, i.cat,
+                e.id, e.name, e.ed_num, e.ed_suffix, e.created_at
+            FROM images AS i
+            LEFT JOIN eds AS e ON e.image_id = i.id
+            WHERE i.year = ? AND i.utp_code = ?
+            ORDER BY i.id, e.id
+            """,
+            (year, utp_code),
+        )
+
+        rows = res.fetchmany(self.batch_size)
+        if not rows:
+            # The metro's images are gone
+            shutil.rmtree(path.parent, ignore_errors=True)
+            return 0
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(".tmp")
+        count = 0
+
+        with pq.ParquetWriter(tmp_path, SCHEMA) as writer:
+            while rows:
+                writer.write_batch(recordBatch(rows))
+                count += len(rows)
+                rows = res.fetchmany(self.batch_size)
+
+        os.replace(tmp_path, path)
+
+        return count
+
+
+def recordBatch(rows):
+    columns = list(zip(*rows))
+    arrays = [
+        pa.array(values, type=field.type)
+        for values, field in zip(columns[:-1], SCHEMA)
+    ]
+    created_at = pc.strptime(
+        pa.array(columns[-1], pa.string()), format="%Y-%m-%d %H:%M:%S", unit="s"
+    )
+
+    return pa.RecordBatch.from_arrays(arrays + [created_at], schema=SCHEMA)
+
+
+def loadState(state_path):
+    try:
+        with open(state_path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def saveState(state_path, state):
+    state_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = state_path.with_suffix(".tmp")
+
+    with open(tmp_path, "w") as f:
+        json.dump(state, f)
+
+    os.replace(tmp_path, state_path)
+
+
+if __name__ == "__main__":
+    app()
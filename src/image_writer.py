@@ -0,0 +1,170 @@
+import base64
+import hashlib
+import itertools
+import os
+import queue
+import threading
+from typing import NamedTuple
+
+from src.download import MIN_IMAGE_SIZE
+
+CHUNK_SIZE = 256 * 1024
+END = object()
+STOP = object()
+
+
+class WriteResult(NamedTuple):
+    image: object
+    path: object
+    size: int = 0
+    sha256: str = None
+    error: str = None
+
+
+class BodyReader:
+    """Reads response bodies over CDP as a series of chunks, on the driver's thread.
+
+    Chrome only streams a body (`Fetch.takeResponseBodyAsStream`) while the
+    request is paused by the Fetch domain, and the driver's CDP events come
+    from ChromeDriver's performance log, which never carries
+    `Fetch.requestPaused`. So each body arrives whole from
+    `Network.getResponseBody`, and is decoded a chunk at a time, never all
+    at once.
+    """
+
+    def __init__(self, driver, chunk_size=CHUNK_SIZE):
+        self.driver = driver
+        self.chunk_size = chunk_size
+
+    def chunks(self, req_id):
+        body = self.driver.execute_cdp_cmd("Network.getResponseBody", {"requestId": req_id})
+        encoded = body.get("base64Encoded", True)
+        yield from decodeChunks(body["body"], encoded, self.chunk_size)
+
+
+def decodeChunks(data, base64_encoded, chunk_size):
+    if not base64_encoded:
+        data = data.encode()
+        for start in range(0, len(data), chunk_size):
+            yield data[start : start + chunk_size]
+        return
+
+    # Whole 4-character groups decode independently
+    step = chunk_size // 3 * 4
+    for start in range(0, len(data), step):
+        yield base64.b64decode(data[start : start + step])
+
+
+class ImageWriter:
+    """Writes images on background threads, so the driver thread only reads.
+
+    Each thread has a bounded queue of chunks, which caps memory however large
+    the scans and makes a slow disk push back on the reader. Files are written
+    under a temporary name, fsynced and renamed, so a crash never leaves a
+    partial image where a complete one is expected. Outcomes are queued as
+    WriteResults for the driver thread to record.
+    """
+
+    def __init__(self, threads=2, max_chunks=16, min_size=MIN_IMAGE_SIZE):
+        self.min_size = min_size
+        self.queues = [queue.Queue(maxsize=max_chunks) for _ in range(threads)]
+        self.turn = itertools.cycle(self.queues)
+        self.finished = queue.Queue()
+        self.threads = [
+            threading.Thread(target=self.run, args=(q,), name="image-writer", daemon=True)
+            for q in self.queues
+        ]
+
+        for thread in self.threads:
+            thread.start()
+
+    def write(self, img, path, chunks):
+        """Hand each chunk of `img` to a writer thread, then finish the file.
+
+        Errors from `chunks` abandon the file and are reported as a result.
+        """
+        q = next(self.turn)
+        q.put((img, path))
+
+        try:
+            for chunk in chunks:
+                q.put(chunk)
+        except Exception as e:
+            q.put(e)
+        else:
+            q.put(END)
+
+    def completed(self):
+        """Every WriteResult queued so far, without blocking."""
+        while True:
+            try:
+                yield self.finished.get_nowait()
+            except queue.Empty:
+                return
+
+    def close(self):
+        for q in self.queues:
+            q.put(STOP)
+
+        for thread in self.threads:
+            thread.join()
+
+    def run(self, q):
+        while (job := q.get()) is not STOP:
+            img, path = job
+            tmp_path = path.with_name(path.name + ".tmp")
+            sha256 = hashlib.sha256()
+            size = 0
+            error = None
+            file = None
+
+            # Always consume up to the end marker, so the next job starts in step
+            while (chunk := q.get()) is not END:
+                if isinstance(chunk, Exception):
+                    error = str(chunk)
+                    break
+                if error is not None:
+                    continue
+
+                try:
+                    if file is None:
+                        path.parent.mkdir(parents=True, exist_ok=True)
+                        file = open(tmp_path, "wb")
+                    file.write(chunk)
+                    sha256.update(chunk)
+                    size += len(chunk)
+                except OSError as e:
+                    error = str(e)
+
+            try:
+                if file is not None:
+                    if error is None:
+                        file.flush()
+                        os.fsync(file.fileno())
+                    file.close()
+
+                if error is None and size < self.min_size:
+                    error = f"Only {size} bytes"
+
+                if error is None:
+                    os.replace(tmp_path, path)
+                    fsyncDir(path.parent)
+                else:
+                    tmp_path.unlink(missing_ok=True)
+            except OSError as e:
+                error = str(e)
+                tmp_path.unlink(missing_ok=True)
+
+            if error is None:
+                self.finished.put(WriteResult(img, path, size, sha256.hexdigest()))
+            else:
+                self.finished.put(WriteResult(img, path, size, error=error))
+
+
+def fsyncDir(path):
+    # Makes the rename itself durable
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
@@ -0,0 +1,199 @@
+"""Where the time goes between a keystroke and its effect on screen.
+
+Every key binding is wrapped so the handler's time is split into phases:
+DB work and browser commands are charged as they happen, the Store gets the
+rest of the handler, and redraw runs from the handler's end to the next
+render. Each (key, phase) pair keeps a histogram.
+"""
+
+import json
+import os
+import time
+from contextlib import contextmanager
+
+PHASES = ("store", "db", "browser", "redraw", "total")
+
+BUCKETS = 25  # powers of two from 1 µs, up to ~17 s
+
+
+class Histogram:
+    """Durations counted in power-of-two microsecond buckets."""
+
+    def __init__(self):
+        self.buckets = [0] * BUCKETS
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        micros = int(seconds * 1e6)
+        self.buckets[min(BUCKETS - 1, micros.bit_length())] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, p):
+        """Upper bound, in seconds, of the bucket holding the p-th percentile."""
+        if not self.count:
+            return 0.0
+
+        rank = p / 100 * self.count
+        seen = 0
+        for bucket, count in enumerate(self.buckets):
+            seen += count
+            if seen >= rank:
+                return min(self.max, 2**bucket / 1e6)
+
+        return self.max
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "mean_ms": self.mean * 1e3,
+            "p50_ms": self.percentile(50) * 1e3,
+            "p90_ms": self.percentile(90) * 1e3,
+            "p99_ms": self.percentile(99) * 1e3,
+            "max_ms": self.max * 1e3,
+            "buckets": self.buckets,
+        }
+
+
+class Sample:
+    __slots__ = ("action", "started", "handled", "phases")
+
+    def __init__(self, action, started):
+        self.action = action
+        self.started = started
+        self.handled = None
+        self.phases = dict.fromkeys(PHASES, 0.0)
+
+
+class LatencyRecorder:
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.histograms = {}
+        self.current = None  # inside a key handler
+        self.pending = None  # handled, waiting to be drawn
+        self.last = None
+
+    def instrument(self, key_bindings):
+        """Wrap every handler in `key_bindings`, named by its keys."""
+        for binding in key_bindings.bindings:
+            binding.handler = self.wrap(keyName(binding.keys), binding.handler)
+
+    def wrap(self, action, handler):
+        def timed(event):
+            self.begin(action)
+            try:
+                return handler(event)
+            finally:
+                self.end()
+
+        return timed
+
+    def begin(self, action):
+        # Keys can arrive faster than renders; the earlier one never got its own
+        if self.pending is not None:
+            self.finish(self.pending, self.clock())
+
+        self.current = Sample(action, self.clock())
+
+    def end(self):
+        sample = self.current
+        self.current = None
+        sample.handled = self.clock()
+        phases = sample.phases
+        phases["store"] = (
+            sample.handled - sample.started - phases["db"] - phases["browser"]
+        )
+        self.pending = sample
+
+    @contextmanager
+    def phase(self, name):
+        """Charge the enclosed time to `name`, if it's inside a key handler."""
+        if self.current is None:
+            yield
+            return
+
+        sample = self.current
+        start = self.clock()
+        try:
+            yield
+        finally:
+            sample.phases[name] += self.clock() - start
+
+    def rendered(self, app=None):
+        """after_render handler: completes the sample the render has just shown."""
+        if self.pending is not None:
+            self.finish(self.pending, self.clock())
+
+    def finish(self, sample, drawn):
+        self.pending = None
+        sample.phases["redraw"] = drawn - sample.handled
+        sample.phases["total"] = drawn - sample.started
+
+        histograms = self.histograms.get(sample.action)
+        if histograms is None:
+            histograms = self.histograms[sample.action] = {
+                phase: Histogram() for phase in PHASES
+            }
+
+        for phase, seconds in sample.phases.items():
+            histograms[phase].add(seconds)
+
+        self.last = sample
+
+    def toolbarText(self):
+        if (sample := self.last) is None:
+            return ""
+
+        phases = sample.phases
+        total = self.histograms[sample.action]["total"]
+        parts = " ".join(f"{phase[0]}{phases[phase] * 1e3:.1f}" for phase in PHASES[:-1])
+
+        return (
+            f"{sample.action}: {phases['total'] * 1e3:.1f} ms ({parts})"
+            f" p99 {total.percentile(99) * 1e3:.1f} ms"
+        )
+
+    def dump(self, path):
+        report = {
+            action: {phase: h.summary() for phase, h in histograms.items()}
+            for action, histograms in sorted(self.histograms.items())
+        }
+        tmp_path = f"{path}.tmp"
+
+        with open(tmp_path, "w") as f:
+            json.dump(report, f, indent=2)
+
+        os.replace(tmp_path, path)
+
+
+class Timed:
+    """Proxy which charges calls to some of `target`'s methods to a phase."""
+
+    def __init__(self, target, recorder, phase, methods):
+        self.target = target
+        self.recorder = recorder
+        self.phase = phase
+        self.methods = frozenset(methods)
+
+    def __getattr__(self, name):
+        attr = getattr(self.target, name)
+
+        if name not in self.methods:
+            return attr
+
+        def timed(*args, **kwargs):
+            with self.recorder.phase(self.phase):
+                return attr(*args, **kwargs)
+
+        return timed
+
+
+def keyName(keys):
+    return " ".join(getattr(key, "value", key) for key in keys)
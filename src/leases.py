@@ -0,0 +1,193 @@
+import getpass
+import os
+import socket
+import sqlite3
+import threading
+import time
+
+from src.db import connect, retryBusy
+
+LEASE_TTL = 15 * 60  # seconds; renewed while its holder keeps working in the metro
+REFRESH_INTERVAL = 5  # seconds between re-reading everyone else's leases
+
+
+def sessionName():
+    return f"{getpass.getuser()}@{socket.gethostname()}:{os.getpid()}"
+
+
+class Leases:
+    """A session's claim on the metro it's annotating, in annotated.db's leases table.
+
+    Each session holds at most one metro, taken when it arrives there and
+    renewed every `renew_every` seconds on a background thread for as long as
+    it stays; a crashed session's lease just expires. Other sessions' leases
+    are cached and re-read every REFRESH_INTERVAL, so asking whether a metro
+    is taken costs nothing on the keystroke path.
+    """
+
+    def __init__(
+        self, db_path, holder=None, ttl=LEASE_TTL, clock=time.time, renew_every=None
+    ):
+        self.db_path = db_path
+        self.connection = connect(db_path, isolation_level=None)
+        self.holder = holder or sessionName()
+        self.ttl = ttl
+        self.clock = clock
+
+        self.lock = threading.Lock()  # held and expires_at are shared with the renewer
+        self.held = None  # (year, utp_code)
+        self.expires_at = 0.0
+        self.others = {}  # (year, utp_code) -> holder
+        self.refreshed_at = None
+
+        self.stopped = threading.Event()
+        self.renewer = threading.Thread(
+            target=self.renewWhileOpen,
+            args=(renew_every or ttl / 3,),
+            name="lease-renewer",
+            daemon=True,
+        )
+        self.renewer.start()
+
+    def claim(self, year, utp_code):
+        """Take (or renew) the lease on a metro, letting go of any other.
+
+        Returns False if another session holds it.
+        """
+        key = (int(year), utp_code)
+        now = self.clock()
+
+        # Renew once a third of the lease has run, not on every call
+        with self.lock:
+            if key == self.held and self.expires_at - now > self.ttl * 2 / 3:
+                return True
+
+        # Taken when last read: wait for the next refresh rather than asking again
+        self.refresh()
+
+        if key in self.others:
+            self.release()
+            return False
+
+        def take():
+            # One transaction, so moving between metros is a single commit
+            self.connection.execute("BEGIN IMMEDIATE")
+
+            try:
+                if self.held is not None and key != self.held:
+                    self.connection.execute(
+                        "DELETE FROM leases WHERE year = ? AND utp_code = ? AND holder = ?",
+                        (*self.held, self.holder),
+                    )
+
+                self.connection.execute(
+                    """
+                    INSERT INTO leases (year, utp_code, holder, expires_at)
+                        VALUES (?, ?, ?, ?)
+                    ON CONFLICT (year, utp_code) DO UPDATE
+                        SET holder = excluded.holder, expires_at = excluded.expires_at
+                        WHERE leases.holder = excluded.holder OR leases.expires_at < ?
+                    """,
+                    (*key, self.holder, now + self.ttl, now),
+                )
+                holder = self.connection.execute(
+                    "SELECT holder FROM leases WHERE year = ? AND utp_code = ?", key
+                ).fetchone()[0]
+                self.connection.execute("COMMIT")
+            except sqlite3.Error:
+                self.connection.execute("ROLLBACK")
+                raise
+
+            return holder
+
+        holder = retryBusy(take)
+
+        with self.lock:
+            self.held = None
+
+            if holder == self.holder:
+                self.held = key
+                self.expires_at = now + self.ttl
+                self.others.pop(key, None)
+                return True
+
+        self.others[key] = holder
+        return False
+
+    def release(self):
+        with self.lock:
+            held, self.held = self.held, None
+
+        if held is None:
+            return
+
+        retryBusy(
+            lambda: self.connection.execute(
+                "DELETE FROM leases WHERE year = ? AND utp_code = ? AND holder = ?",
+                (*held, self.holder),
+            )
+        )
+
+    def close(self):
+        self.stopped.set()
+        self.renewer.join()
+        self.release()
+        self.connection.close()
+
+    def renewWhileOpen(self, interval):
+        # SQLite connections belong to one thread, so the renewer has its own
+        connection = connect(self.db_path, isolation_level=None)
+
+        try:
+            while not self.stopped.wait(interval):
+                self.renew(connection)
+        finally:
+            connection.close()
+
+    def renew(self, connection):
+        """Extend the held lease, so reading one image for a long time doesn't lose it."""
+        with self.lock:
+            held = self.held
+
+        if held is None:
+            return
+
+        now = self.clock()
+        renewed = retryBusy(
+            lambda: connection.execute(
+                """
+                UPDATE leases SET expires_at = ?
+                WHERE year = ? AND utp_code = ? AND holder = ?
+                """,
+                (now + self.ttl, *held, self.holder),
+            ).rowcount
+        )
+
+        with self.lock:
+            # The metro may have been left, or lost after a stall, in the meantime
+            if held == self.held:
+                if renewed:
+                    self.expires_at = now + self.ttl
+                else:
+                    self.held = None
+
+    def holderOf(self, year, utp_code):
+        """The other session holding a metro, or None if it's free or ours."""
+        self.refresh()
+        return self.others.get((int(year), utp_code))
+
+    def heldByOthers(self, year, utp_code):
+        return self.holderOf(year, utp_code) is not None
+
+    def refresh(self):
+        now = self.clock()
+
+        if self.refreshed_at is not None and now - self.refreshed_at < REFRESH_INTERVAL:
+            return
+
+        rows = self.connection.execute(
+            "SELECT year, utp_code, holder FROM leases WHERE holder != ? AND expires_at > ?",
+            (self.holder, now),
+        ).fetchall()
+        self.others = {(year, utp_code): holder for year, utp_code, holder in rows}
+        self.refreshed_at = now
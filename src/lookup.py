@@ -0,0 +1,214 @@
+import csv
+import sys
+from pathlib import Path
+from typing import NamedTuple, Optional
+
+import typer
+from typing_extensions import Annotated
+
+from src.catalogue import Image
+from src.db import connect
+from src.ed import Ed
+from src.log import get_logger
+from src.migrations import migrate
+
+DB_PATH = Path("annotated.db")
+CSV_FIELDS = ["year", "utp_code", "ed", "name", "ark", "image_index", "url", "local_url"]
+
+# Both are seeks on eds_metro_ed, (year, utp_code, ed_num, ed_suffix, name),
+# then on the images primary key
+QUERY = """
+    SELECT e.name, i.ark, i.image_index, i.cat
+    FROM eds AS e
+        JOIN images AS i ON i.id = e.image_id
+    WHERE e.year = ? AND e.utp_code = ? AND e.ed_num = ? AND e.ed_suffix = ?
+    ORDER BY i.id
+"""
+
+BATCH_QUERY = """
+    SELECT q.id, e.name, i.ark, i.image_index, i.cat
+    FROM temp.lookup_queries AS q
+        JOIN eds AS e
+            ON e.year = q.year AND e.utp_code = q.utp_code
+            AND e.ed_num = q.ed_num AND e.ed_suffix = q.ed_suffix
+        JOIN images AS i ON i.id = e.image_id
+    ORDER BY q.id, i.id
+"""
+
+app = typer.Typer()
+
+
+@app.command()
+def lookup(
+    year: Annotated[Optional[int], typer.Argument()] = None,
+    utp_code: Annotated[Optional[str], typer.Argument()] = None,
+    ed: Annotated[Optional[str], typer.Argument()] = None,
+    csv_path: Annotated[Optional[Path], typer.Option("--csv", "-c")] = None,
+    db_path: Annotated[Path, typer.Option("--db")] = DB_PATH,
+):
+    """Find the images which describe an ED.
+
+    Either give YEAR UTP_CODE ED, or --csv a file with year, utp_code and ed
+    columns to look them all up at once, writing CSV to stdout.
+    """
+    if csv_path is None and ed is None:
+        raise typer.BadParameter("Give YEAR UTP_CODE ED, or --csv")
+
+    connection = connect(db_path)
+
+    try:
+        lookups = Lookup(connection.cursor())
+
+        if csv_path is not None:
+            rows = readQueries(csv_path, get_logger())
+            writer = csv.DictWriter(sys.stdout, CSV_FIELDS)
+            writer.writeheader()
+
+            for (row_year, row_utp_code, row_ed), match in lookups.findAll(rows):
+                fields = {"year": row_year, "utp_code": row_utp_code, "ed": row_ed}
+                if match is not None:
+                    fields.update(
+                        name=match.name,
+                        ark=match.ark,
+                        image_index=match.image_index,
+                        url=match.url,
+                        local_url=match.local_url,
+                    )
+
+                writer.writerow(fields)
+
+            return
+
+        matches = lookups.find(year, utp_code, ed)
+    finally:
+        connection.close()
+
+    if not matches:
+        print(f"ED {ed} of {year} {utp_code} isn't on any annotated image")
+        raise typer.Exit(1)
+
+    for match in matches:
+        print(
+            f"{match.year} {match.utp_code} ED {match.name}: "
+            f"image {match.image_index} {match.ark}"
+        )
+        print(f"  {match.url}")
+        print(f"  {match.local_url}")
+
+
+class Match(NamedTuple):
+    year: int
+    utp_code: str
+    name: str  # the ED as annotated, which may be written differently to the query
+    ark: str
+    image_index: int
+    cat: int
+
+    # URLs are only built when asked for: local_url looks on disk
+    @property
+    def image(self):
+        return Image(
+            str(self.year), self.utp_code, self.ark, self.image_index, None, None, self.cat
+        )
+
+    @property
+    def url(self):
+        return self.image.url
+
+    @property
+    def local_url(self):
+        return self.image.local_url
+
+
+class Lookup:
+    """Finds the images describing an ED, the reverse of Store's image → EDs.
+
+    EDs are matched by number and suffix, so "0123a" finds "123A".
+    """
+
+    def __init__(self, db):
+        self.db = db
+        migrate(self.db)
+
+    def find(self, year, utp_code, ed):
+        """Every image annotated with `ed` in the metro, in catalogue order."""
+        if (parsed := parseED(ed)) is None:
+            return []
+
+        rows = self.db.execute(QUERY, (int(year), utp_code, *parsed)).fetchall()
+
+        return [Match(int(year), utp_code, *row) for row in rows]
+
+    def findAll(self, queries):
+        """(query, Match or None) for each (year, utp_code, ed) in `queries`.
+
+        Queries keep their order, and one with several images comes back once
+        for each. Everything is looked up in a single join against a temporary
+        table, rather than a query apiece.
+        """
+        queries = list(queries)
+        parsed = [parseED(ed) for _, _, ed in queries]
+
+        self.db.execute(
+            """
+            CREATE TEMP TABLE IF NOT EXISTS lookup_queries (
+                id INTEGER PRIMARY KEY,
+                year INTEGER NOT NULL,
+                utp_code VARCHAR NOT NULL,
+                ed_num INTEGER NOT NULL,
+                ed_suffix VARCHAR NOT NULL);
+            """
+        )
+        self.db.execute("DELETE FROM temp.lookup_queries")
+        self.db.executemany(
+            "INSERT INTO temp.lookup_queries VALUES (?, ?, ?, ?, ?)",
+            (
+                (i, int(year), utp_code, *ed)
+                for i, ((year, utp_code, _), ed) in enumerate(zip(queries, parsed))
+                if ed is not None
+            ),
+        )
+
+        found = {}
+        for i, *row in self.db.execute(BATCH_QUERY):
+            year, utp_code, _ = queries[i]
+            found.setdefault(i, []).append(Match(int(year), utp_code, *row))
+
+        self.db.execute("DELETE FROM temp.lookup_queries")
+        self.db.connection.commit()
+
+        for i, query in enumerate(queries):
+            for result in found.get(i, [None]):
+                yield query, result
+
+
+def readQueries(csv_path, log):
+    """(year, utp_code, ed) from each row of the CSV, skipping malformed ones."""
+    queries = []
+
+    with open(csv_path, newline="") as csvf:
+        reader = csv.DictReader(csvf)
+
+        for row in reader:
+            year, utp_code, ed = (
+                (row.get(key) or "").strip() for key in ("year", "utp_code", "ed")
+            )
+
+            if not (year.isdigit() and utp_code and ed):
+                log.warning(f"Skipping line {reader.line_num} of {csv_path}: {row}")
+                continue
+
+            queries.append((year, utp_code, ed))
+
+    return queries
+
+
+def parseED(ed):
+    """(ed_num, ed_suffix) as stored by Store.insertED, or None."""
+    parsed = Ed.from_str(str(ed).strip())
+
+    return (parsed.num, parsed.suff) if parsed is not None else None
+
+
+if __name__ == "__main__":
+    app()
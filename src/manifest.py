@@ -0,0 +1,271 @@
+import sqlite3
+import time
+
+from src.migrations import migrate
+
+MANIFEST_NAME = "manifest.db"
+COMMIT_EVERY = 1000  # arks recorded by pending() between commits
+
+PENDING = "pending"
+DONE = "done"
+FAILED = "failed"
+
+
+def createDownloadsTable(db):
+    # position is the image's index in the current catalogue, NULL once it's dropped
+    db.execute(
+        """
+        CREATE TABLE downloads (
+            ark VARCHAR PRIMARY KEY,
+            position INTEGER,
+            year INTEGER NOT NULL,
+            utp_code VARCHAR NOT NULL,
+            status VARCHAR NOT NULL DEFAULT 'pending',
+            size INTEGER,
+            sha256 VARCHAR,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            last_error VARCHAR,
+            updated_at REAL);
+        """
+    )
+    db.execute("CREATE INDEX downloads_updated ON downloads (status, updated_at)")
+    db.execute(
+        """
+        CREATE TABLE meta (
+            key VARCHAR PRIMARY KEY,
+            value VARCHAR);
+        """
+    )
+
+
+def indexDownloadsByMetro(db):
+    db.execute("CREATE INDEX downloads_metro ON downloads (year, utp_code)")
+
+
+MIGRATIONS = [
+    createDownloadsTable,
+    indexDownloadsByMetro,
+]
+
+
+class Manifest:
+    """What the scraper has fetched, kept beside the images in its own DB.
+
+    Every outcome is committed as it happens, so a restart knows exactly what
+    is left without touching the image tree.
+    """
+
+    def __init__(self, path):
+        self.connection = sqlite3.connect(path)
+        self.db = self.connection.cursor()
+        migrate(self.db, MIGRATIONS)
+
+    def close(self):
+        self.connection.close()
+
+    def sync(self, images, existing_size=None):
+        """Bring the manifest in line with the catalogue.
+
+        `existing_size(img)` gives the size of an image already on disk, or
+        None. It's only asked about arks the manifest hasn't seen, so the tree
+        is scanned once, when the manifest is first created.
+        """
+        fingerprint = images.fingerprint()
+
+        if self.metadata("images_fingerprint") == fingerprint:
+            return
+
+        known = {ark for ark, in self.db.execute("SELECT ark FROM downloads")}
+        rows = []
+
+        for position, (year, utp_code, ark, _, _) in enumerate(images.rows()):
+            size = None
+            if ark not in known and existing_size is not None:
+                size = existing_size(images[position])
+
+            status = DONE if size is not None else PENDING
+            rows.append((ark, position, int(year), utp_code, status, size))
+
+        self.db.execute("BEGIN")
+        self.db.execute("UPDATE downloads SET position = NULL")
+        self.db.executemany(
+            """
+            INSERT INTO downloads (ark, position, year, utp_code, status, size)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (ark) DO UPDATE SET
+                    position = excluded.position,
+                    year = excluded.year,
+                    utp_code = excluded.utp_code
+            """,
+            rows,
+        )
+        self.setMetadata("images_fingerprint", fingerprint)
+        self.connection.commit()
+
+    def metroFinished(self):
+        """A `finished(year, utp_code, size)` check for iterImages, from one
+        query: a metro is finished once the manifest holds at least `size` of
+        its arks and every one is done."""
+        progress = {
+            (year, utp_code): (known, left)
+            for year, utp_code, known, left in self.db.execute(
+                """
+                SELECT year, utp_code, COUNT(*), SUM(status != 'done')
+                FROM downloads GROUP BY year, utp_code
+                """
+            )
+        }
+
+        def finished(year, utp_code, size):
+            known, left = progress.get((int(year), utp_code), (0, 1))
+            return not left and known >= size
+
+        return finished
+
+    def pending(self, images, existing_size=None):
+        """Each image in the `images` stream which isn't downloaded yet.
+
+        Unlike sync this never needs the whole catalogue: each metro's arks
+        are read as the stream reaches it, and arks not seen before are
+        recorded as they pass, asking `existing_size` about them just the same.
+        They get a position at the next sync.
+        """
+        metro = None
+        statuses = {}
+        recorded = 0
+
+        try:
+            for img in images:
+                year = int(img.year)
+
+                if (year, img.utp_code) != metro:
+                    metro = (year, img.utp_code)
+                    statuses = dict(
+                        self.db.execute(
+                            "SELECT ark, status FROM downloads WHERE year = ? AND utp_code = ?",
+                            metro,
+                        )
+                    )
+
+                if (status := statuses.get(img.ark)) is None:
+                    status = self.recordNew(img, existing_size)
+                    statuses[img.ark] = status
+                    recorded += 1
+
+                if recorded >= COMMIT_EVERY:
+                    self.connection.commit()
+                    recorded = 0
+
+                if status != DONE:
+                    yield img
+        finally:
+            # Whatever's been recorded, even if the stream is abandoned part way
+            self.connection.commit()
+
+    def recordNew(self, img, existing_size=None):
+        """Record an ark not yet seen in its metro, returning its status."""
+        year = int(img.year)
+        row = self.db.execute(
+            "SELECT status FROM downloads WHERE ark = ?", (img.ark,)
+        ).fetchone()
+
+        if row is not None:
+            # Moved from another metro
+            self.db.execute(
+                "UPDATE downloads SET year = ?, utp_code = ? WHERE ark = ?",
+                (year, img.utp_code, img.ark),
+            )
+            return row[0]
+
+        size = existing_size(img) if existing_size is not None else None
+        status = DONE if size is not None else PENDING
+        self.db.execute(
+            """
+            INSERT INTO downloads (ark, year, utp_code, status, size)
+                VALUES (?, ?, ?, ?, ?)
+            """,
+            (img.ark, year, img.utp_code, status, size),
+        )
+
+        return status
+
+    def recordWritten(self, ark, size, sha256=None):
+        self.db.execute(
+            """
+            UPDATE downloads
+            SET status = 'done', size = ?, sha256 = ?, attempts = attempts + 1,
+                last_error = NULL, updated_at = ?
+            WHERE ark = ?
+            """,
+            (size, sha256, time.time(), ark),
+        )
+        self.connection.commit()
+
+    def recordFailed(self, ark, error):
+        # Never demotes a done image: a small or missed response can still
+        # arrive for one whose full-size body was already written
+        self.db.execute(
+            """
+            UPDATE downloads
+            SET status = 'failed', attempts = attempts + 1, last_error = ?, updated_at = ?
+            WHERE ark = ? AND status != 'done'
+            """,
+            (str(error), time.time(), ark),
+        )
+        self.connection.commit()
+
+    def status(self, ark):
+        return self.db.execute(
+            "SELECT status, size, sha256, attempts, last_error FROM downloads WHERE ark = ?",
+            (ark,),
+        ).fetchone()
+
+    def summary(self):
+        """(year, utp_code, done, failed, pending) for each metro in the catalogue."""
+        return self.db.execute(
+            """
+            SELECT year, utp_code,
+                   SUM(status = 'done'), SUM(status = 'failed'), SUM(status = 'pending')
+            FROM downloads
+            WHERE position IS NOT NULL
+            GROUP BY year, utp_code
+            ORDER BY MIN(position)
+            """
+        ).fetchall()
+
+    def throughput(self, window=500):
+        """Images written per second over the last `window` downloads, or None.
+
+        Breaks and failures fall inside the window, so this is the real pace,
+        not the best case.
+        """
+        times = [
+            updated_at
+            for updated_at, in self.db.execute(
+                """
+                SELECT updated_at FROM downloads
+                WHERE status = 'done' AND updated_at IS NOT NULL
+                ORDER BY updated_at DESC LIMIT ?
+                """,
+                (window,),
+            )
+        ]
+
+        if len(times) < 2 or times[0] == times[-1]:
+            return None
+
+        return (len(times) - 1) / (times[0] - times[-1])
+
+    def metadata(self, key):
+        res = self.db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+
+        return res[0] if res is not None else None
+
+    def setMetadata(self, key, value):
+        self.db.execute(
+            """
+            INSERT INTO meta (key, value) VALUES (?, ?)
+                ON CONFLICT (key) DO UPDATE SET value = excluded.value
+            """,
+            (key, value),
+        )
@@ -0,0 +1,145 @@
+"""Versioned schema for annotated.db.
+
+Each migration moves the schema up one version, recorded in
+`PRAGMA user_version`. Append new migrations to MIGRATIONS; never edit one
+which has already shipped.
+"""
+
+
+def createBaseTables(db):
+    # IF NOT EXISTS, because databases created before versioning already have these
+    db.execute(
+        """
+        CREATE TABLE IF NOT EXISTS images (
+            id INTEGER PRIMARY KEY,
+            year INTEGER NOT NULL,
+            utp_code VARCHAR NOT NULL,
+            ark VARCHAR NOT NULL,
+            image_index INTEGER NOT NULL,
+            cat INTEGER NOT NULL,
+            UNIQUE(ark));
+        """
+    )
+    db.execute(
+        """
+        CREATE TABLE IF NOT EXISTS eds (
+            id INTEGER PRIMARY KEY,
+            image_id INTEGER NOT NULL,
+            name VARCHAR,
+            created_at INTEGER DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (image_id) REFERENCES images (id),
+            UNIQUE(image_id, name));
+        """
+    )
+    db.execute(
+        """
+        CREATE TABLE IF NOT EXISTS meta (
+            key VARCHAR PRIMARY KEY,
+            value VARCHAR);
+        """
+    )
+
+
+def addParsedEDColumns(db):
+    """Numeric ED columns, plus the image's metro, so EDs sort as numbers
+    and the largest ED in a metro is a single index seek."""
+    db.execute("ALTER TABLE eds ADD COLUMN ed_num INTEGER")
+    db.execute("ALTER TABLE eds ADD COLUMN ed_suffix VARCHAR NOT NULL DEFAULT ''")
+    db.execute("ALTER TABLE eds ADD COLUMN year INTEGER")
+    db.execute("ALTER TABLE eds ADD COLUMN utp_code VARCHAR")
+    db.execute(
+        """
+        UPDATE eds
+        SET ed_num = CAST(name AS INTEGER),
+            ed_suffix = ltrim(name, '0123456789'),
+            (year, utp_code) = (
+                SELECT year, utp_code FROM images WHERE images.id = eds.image_id
+            )
+        """
+    )
+    db.execute(
+        """
+        CREATE INDEX eds_metro_ed
+            ON eds (year, utp_code, ed_num, ed_suffix, name)
+        """
+    )
+    db.execute("CREATE INDEX images_metro ON images (year, utp_code)")
+
+
+def recordEDDeletions(db):
+    """Tombstones for deleted EDs, so an incremental export can tell which
+    metros lost EDs, and an index to find EDs created since a given time."""
+    db.execute(
+        """
+        CREATE TABLE eds_deleted (
+            id INTEGER PRIMARY KEY,
+            ed_id INTEGER NOT NULL,
+            image_id INTEGER NOT NULL,
+            year INTEGER,
+            utp_code VARCHAR,
+            deleted_at INTEGER DEFAULT CURRENT_TIMESTAMP);
+        """
+    )
+    db.execute(
+        """
+        CREATE TRIGGER eds_record_deletion AFTER DELETE ON eds
+        BEGIN
+            INSERT INTO eds_deleted (ed_id, image_id, year, utp_code)
+                VALUES (OLD.id, OLD.image_id, OLD.year, OLD.utp_code);
+        END
+        """
+    )
+    db.execute("CREATE INDEX eds_created_at ON eds (created_at)")
+
+
+def createLeasesTable(db):
+    """Which annotator session is working on each metro, until when (epoch seconds)."""
+    db.execute(
+        """
+        CREATE TABLE leases (
+            year INTEGER NOT NULL,
+            utp_code VARCHAR NOT NULL,
+            holder VARCHAR NOT NULL,
+            expires_at REAL NOT NULL,
+            PRIMARY KEY (year, utp_code));
+        """
+    )
+
+
+def clearUnparsedEDNumbers(db):
+    """Names which don't start with a number get no ed_num and an empty
+    suffix, as Store.insertED stores them. addParsedEDColumns's backfill
+    gives them 0 and the whole name, and is left as it shipped."""
+    db.execute(
+        "UPDATE eds SET ed_num = NULL, ed_suffix = '' WHERE name NOT GLOB '[0-9]*'"
+    )
+
+
+MIGRATIONS = [
+    createBaseTables,
+    addParsedEDColumns,
+    recordEDDeletions,
+    createLeasesTable,
+    clearUnparsedEDNumbers,
+]
+
+
+def schemaVersion(db):
+    return db.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(db, migrations=MIGRATIONS):
+    """Apply every migration newer than the database, each in its own transaction."""
+    version = schemaVersion(db)
+
+    for target, migration in enumerate(migrations[version:], start=version + 1):
+        db.execute("BEGIN")
+        try:
+            migration(db)
+            db.execute(f"PRAGMA user_version = {target}")
+            db.connection.commit()
+        except Exception:
+            db.connection.rollback()
+            raise
+
+    return schemaVersion(db)
@@ -0,0 +1,68 @@
+import threading
+from collections import deque
+
+from src.log import get_logger
+
+
+class Navigator:
+    """Runs browser commands on a background thread, so keys never wait on Chrome.
+
+    Commands run in the order they were submitted. A command submitted with a
+    `key` replaces a not-yet-started command with the same key at the back of
+    the queue, so holding a navigation key only loads wherever it stops: at
+    most the image being loaded now and the latest target.
+    """
+
+    def __init__(self):
+        self.pending = deque()  # (key, command)
+        self.changed = threading.Condition()
+        self.busy = False
+        self.closed = False
+        self.log = get_logger()
+
+        self.thread = threading.Thread(target=self.run, name="navigator", daemon=True)
+        self.thread.start()
+
+    def submit(self, command, key=None):
+        with self.changed:
+            if self.closed:
+                return
+
+            if key is not None and self.pending and self.pending[-1][0] == key:
+                self.pending[-1] = (key, command)
+            else:
+                self.pending.append((key, command))
+
+            self.changed.notify_all()
+
+    def wait(self):
+        """Block until every command submitted so far has run."""
+        with self.changed:
+            self.changed.wait_for(lambda: not (self.pending or self.busy))
+
+    def close(self):
+        """Drop anything not yet started and stop once the current command is done."""
+        with self.changed:
+            self.closed = True
+            self.pending.clear()
+            self.changed.notify_all()
+
+        self.thread.join()
+
+    def run(self):
+        while True:
+            with self.changed:
+                self.busy = False
+                self.changed.notify_all()
+                self.changed.wait_for(lambda: self.pending or self.closed)
+
+                if self.closed:
+                    return
+
+                _, command = self.pending.popleft()
+                self.busy = True
+
+            try:
+                command()
+            except Exception as e:
+                self.log.warning(f"Browser command failed: {e}")
@@ -0,0 +1,192 @@
+from bisect import bisect_right
+from itertools import chain
+from typing import NamedTuple
+
+import numpy as np
+
+from src.ed import Ed
+
+MAX_EDS = 9  # the most a fill key adds; busier images count as this
+MIN_SAMPLES = 5  # annotated images a metro needs before its own pattern is used
+
+# How an image's lowest ED follows the previous image's highest
+CONTINUES, NEW, OTHER = range(3)
+
+
+class Prediction(NamedTuple):
+    count: int
+    continues: bool  # the first ED is the one the previous image ended on
+    source: str  # "metro", "year" or "default"
+
+    def __str__(self):
+        return f"{self.count}{' cont' if self.continues else ''} ({self.source})"
+
+
+def edRange(eds):
+    """(count, lowest, highest) ED number in `eds`, -1 for numbers if none parse."""
+    nums = [ed.num for name in eds if (ed := Ed.from_str(name)) is not None]
+
+    if not nums:
+        return len(eds), -1, -1
+
+    return len(eds), min(nums), max(nums)
+
+
+def gapKind(gap):
+    return CONTINUES if gap == 0 else NEW if gap == 1 else OTHER
+
+
+def gapKinds(gaps):
+    return np.select([gaps == 0, gaps == 1], [CONTINUES, NEW], OTHER)
+
+
+def histogram(rows, columns, shape):
+    """How many times each (row, column) pair occurs, as a `shape` array."""
+    cells = np.bincount(rows * shape[1] + columns, minlength=shape[0] * shape[1])
+    return cells.reshape(shape).astype(np.int32)
+
+
+class EDPredictor:
+    """Predicts how many EDs an image holds from what's been annotated so far.
+
+    Every image's ED count and lowest and highest ED number are loaded from
+    the DB into arrays, from which histograms of EDs per image and of the gap
+    between pages are built per metro and per year in one pass. After that each change to an
+    image only adjusts the few histogram cells it touches, so predicting is
+    a lookup.
+    """
+
+    def __init__(self, store):
+        images = store.images
+        size = len(images)
+
+        self.images = images
+        self.metro_starts = store.metro_starts
+        starts = np.asarray(self.metro_starts, dtype=np.intp)
+        year_codes = np.frombuffer(images.year_codes, dtype=np.uint16)
+        self.metro_years = year_codes[starts].astype(np.intp)
+
+        rows = store.edNumbers()
+        flat = np.fromiter(chain.from_iterable(rows), dtype=np.int64, count=2 * len(rows))
+        image_ids, nums = flat.reshape(-1, 2).T
+
+        # DB ids to catalogue indices, dropping EDs of images no longer in the
+        # catalogue, as populate_db does
+        db_ids = np.frombuffer(images.db_ids, dtype=np.int64)
+        order = np.argsort(db_ids)
+        pos = np.searchsorted(db_ids, image_ids, sorter=order)
+        pos = np.minimum(pos, max(size - 1, 0))
+        known = db_ids[order][pos] == image_ids if size else np.zeros(len(pos), bool)
+        indices, nums = order[pos[known]], nums[known]
+
+        # Group each image's EDs together, then reduce every group at once
+        by_image = np.argsort(indices, kind="stable")
+        indices, nums = indices[by_image], nums[by_image]
+        groups = np.flatnonzero(np.diff(indices, prepend=-1))
+        annotated = indices[groups]
+
+        self.counts = np.zeros(size, dtype=np.int32)
+        self.lows = np.full(size, -1, dtype=np.int32)
+        self.highs = np.full(size, -1, dtype=np.int32)
+
+        if len(groups):
+            unnumbered = np.iinfo(np.int64).max
+            lows = np.minimum.reduceat(np.where(nums < 0, unnumbered, nums), groups)
+            self.counts[annotated] = np.diff(groups, append=len(indices))
+            self.lows[annotated] = np.where(lows == unnumbered, -1, lows)
+            self.highs[annotated] = np.maximum.reduceat(nums, groups)
+
+        self.metro_counts = np.zeros((len(starts), MAX_EDS + 1), dtype=np.int32)
+        self.metro_gaps = np.zeros((len(starts), 3), dtype=np.int32)
+
+        metros = np.searchsorted(starts, annotated, side="right") - 1
+        self.metro_counts += histogram(
+            metros, np.minimum(self.counts[annotated], MAX_EDS), self.metro_counts.shape
+        )
+
+        # Gaps between an image and the one before it, when both have numbered EDs
+        followers = annotated[annotated != starts[metros]]
+        previous = followers - 1
+        numbered = (self.highs[previous] >= 0) & (self.lows[followers] >= 0)
+        followers, previous = followers[numbered], previous[numbered]
+        kinds = gapKinds(self.lows[followers] - self.highs[previous])
+        follower_metros = np.searchsorted(starts, followers, side="right") - 1
+        self.metro_gaps += histogram(follower_metros, kinds, self.metro_gaps.shape)
+
+        years = len(images.years.values)
+        self.year_counts = np.zeros((years, MAX_EDS + 1), dtype=np.int32)
+        self.year_gaps = np.zeros((years, 3), dtype=np.int32)
+        np.add.at(self.year_counts, self.metro_years, self.metro_counts)
+        np.add.at(self.year_gaps, self.metro_years, self.metro_gaps)
+        self.metro_years = self.metro_years.tolist()  # read per update; plain ints are quicker
+
+    def metroOf(self, index):
+        return bisect_right(self.metro_starts, index) - 1
+
+    def update(self, index):
+        """Re-count image `index` after its EDs changed."""
+        metro = self.metroOf(index)
+        following = index + 1 < len(self.images) and self.metroOf(index + 1) == metro
+        before = self.cells(index, metro, following)
+
+        count, low, high = edRange(self.images.eds.get(index, ()))
+        self.counts[index] = count
+        self.lows[index] = low
+        self.highs[index] = high
+
+        # Only touch the histogram cells which actually moved
+        after = self.cells(index, metro, following)
+        if before != after:
+            self.adjust(metro, before, -1)
+            self.adjust(metro, after, 1)
+
+    def cells(self, index, metro, following):
+        """The count column of image `index`, and the gap kinds into and out of it.
+
+        Any may be None when there's nothing to count.
+        """
+        count = int(self.counts[index])
+        low = int(self.lows[index])
+        high = int(self.highs[index])
+        gap_in = gap_out = None
+
+        if index != self.metro_starts[metro] and low >= 0:
+            if (previous := int(self.highs[index - 1])) >= 0:
+                gap_in = gapKind(low - previous)
+
+        if following and high >= 0:
+            if (next_low := int(self.lows[index + 1])) >= 0:
+                gap_out = gapKind(next_low - high)
+
+        return (min(count, MAX_EDS) if count else None, gap_in, gap_out)
+
+    def adjust(self, metro, cells, sign):
+        year = self.metro_years[metro]
+        column, *gaps = cells
+
+        if column is not None:
+            self.metro_counts[metro, column] += sign
+            self.year_counts[year, column] += sign
+
+        for kind in gaps:
+            if kind is not None:
+                self.metro_gaps[metro, kind] += sign
+                self.year_gaps[year, kind] += sign
+
+    def predict(self, index):
+        metro = self.metroOf(index)
+        counts, gaps, source = self.metro_counts[metro], self.metro_gaps[metro], "metro"
+
+        if counts.sum() < MIN_SAMPLES:
+            year = self.metro_years[metro]
+            counts, gaps, source = self.year_counts[year], self.year_gaps[year], "year"
+
+        if counts.sum() < MIN_SAMPLES:
+            return Prediction(1, False, "default")
+
+        # The first image of a metro has nothing to continue from
+        continues = (
+            index != self.metro_starts[metro] and gaps[CONTINUES] > gaps[NEW]
+        )
+
+        return Prediction(int(counts.argmax()), bool(continues), source)
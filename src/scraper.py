@@ -3,9 +3,9 @@ import csv
 import json
 import logging
 import os
+import queue
 import random
 import re
-import sqlite3
 import textwrap
 import time
 import datetime as dt
@@ -14,22 +14,33 @@ from pprint import pformat
 
 import typer
 from dotenv import load_dotenv
-from pyrate_limiter import Duration, Limiter, RequestRate
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.wait import WebDriverWait
 from typing_extensions import Annotated
 
-from src.be_nice import CachedLimiterSession
+from src.download import MIN_IMAGE_SIZE, Downloader, sessionFromDriver
 from src.driver import driver
 from src.ed import Ed
-from src.store import Store
-from src.utils import buildImageList
+from src.image_writer import BodyReader, ImageWriter
+from src.manifest import MANIFEST_NAME, Manifest
+from src.tabs import TabPool
+from src.throttle import (
+    CONTROLLERS,
+    MAX_RATE,
+    THROTTLE_STATUSES,
+    Observation,
+    Throttle,
+)
+from src.utils import buildImageList, iterImages
 
 # Enable logging for Requests, etc
 # logging.basicConfig(level=logging.DEBUG)
 
-ED_DESC_URL = "https://www.familysearch.org/search/image/download?uri=https%3A%2F%2Fsg30p0.familysearch.org%2Fservice%2Frecords%2Fstorage%2Fdascloud%2Fdas%2Fv2%2F{}"
-LOAD_LIMIT = 650
+MIN_LOAD_INTERVAL = 15  # seconds between loads, until the throttle learns better
+LOAD_JITTER = 5
+IMAGE_TIMEOUT = 90  # seconds a tab may wait for its image before counting as a miss
+OUT_PATH = Path("../ed-desc-img/")  # TODO: make this dynamic
+THROTTLE_NAME = "throttle.json"
 
 load_dotenv()
 
@@ -40,59 +51,152 @@ app = typer.Typer()
 def scrape_ed_desc_images(
     debug: Annotated[bool, typer.Option("--debug", "-v")] = False,
     headless: Annotated[bool, typer.Option("--headless", "-h")] = False,
+    tabs: Annotated[int, typer.Option("--tabs", "-t")] = 3,
+    direct: Annotated[bool, typer.Option("--direct", "-d")] = False,
+    workers: Annotated[int, typer.Option("--workers", "-w")] = 4,
+    policy: Annotated[str, typer.Option("--policy", "-p")] = "aimd",
 ):
-    scraper = Scraper(debug, driver(headless))
-    scraper.scrape_ed_desc_images()
+    if policy not in CONTROLLERS:
+        raise typer.BadParameter(
+            f"Choose one of {', '.join(CONTROLLERS)}", param_hint="--policy"
+        )
+
+    scraper = Scraper(debug, driver(headless), tabs, policy)
+
+    if direct:
+        scraper.download_ed_desc_images(workers)
+    else:
+        scraper.scrape_ed_desc_images()
     # scraper.write(Path("../gannett-data/fs_eds.parquet"))
 
 
+@app.command()
+def plan():
+    """Print what's left to download, per year and metro, and when it should finish."""
+    images = buildImageList()
+    manifest = openManifest(OUT_PATH, images)
+    totals = {}
+
+    print(f"{'':23} {'done':>9} {'failed':>7} {'pending':>9}")
+
+    for year, utp_code, done, failed, pending in manifest.summary():
+        print(f"  {year} {utp_code:<16} {done:9} {failed:7} {pending:9}")
+        year_totals = totals.setdefault(year, [0, 0, 0])
+        for i, count in enumerate((done, failed, pending)):
+            year_totals[i] += count
+
+    print()
+    for year, (done, failed, pending) in totals.items():
+        print(f"{year:<23} {done:9} {failed:7} {pending:9}")
+
+    remaining = sum(failed + pending for _, failed, pending in totals.values())
+
+    if (rate := manifest.throughput()) is not None:
+        pace = f"{rate * 3600:.0f}/hour observed"
+    else:
+        rate = 1 / MIN_LOAD_INTERVAL
+        pace = f"{rate * 3600:.0f}/hour assumed"
+
+    eta = dt.timedelta(seconds=round(remaining / rate))
+    finish = dt.datetime.now() + eta
+    print(f"\n{remaining} remaining at {pace}: {eta}, around {finish:%Y-%m-%d %H:%M}")
+
+
+def openManifest(out_path, images=None):
+    out_path.mkdir(parents=True, exist_ok=True)
+    manifest = Manifest(out_path / MANIFEST_NAME)
+
+    if images is not None:
+        manifest.sync(images, lambda img: writtenSize(imagePath(out_path, img)))
+
+    return manifest
+
+
+def imagePath(out_path, img):
+    short_ark = img.ark[4:]
+    return out_path / str(img.year) / img.utp_code / f"{short_ark}.png"
+
+
+def writtenSize(path):
+    """Size of an image already on disk, or None if it's missing or too small to be real."""
+    try:
+        size = path.stat().st_size
+    except OSError:
+        return None
+
+    return size if size >= MIN_IMAGE_SIZE else None
+
+
 class Scraper:
-    def __init__(self, debug, driver):
+    def __init__(self, debug, driver, tab_count=1, policy="aimd"):
         self.debug = debug
         self.driver = driver
-        self.image_response_ids = set()
-        self.written_arks = set()
-        self.out_path = Path("../ed-desc-img/")  # TODO: make this dynamic
+        self.tab_count = tab_count
+        self.tabs = None
+        self.out_path = OUT_PATH
 
         self.driver.add_cdp_listener("Network.responseReceived", self.response_received)
         self.driver.add_cdp_listener("Network.loadingFinished", self.loading_finished)
 
-        db_path = "annotated.db"
-        self.connection = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
-        self.cursor = self.connection.cursor()
-        self.store = Store(self.cursor, buildImageList())
+        # Images are streamed from the catalogue as they're needed, see pending_images
+        self.manifest = openManifest(self.out_path)
+
+        # Shared by all tabs, so more tabs never means more load on FamilySearch
+        self.throttle = Throttle(CONTROLLERS[policy](), self.out_path / THROTTLE_NAME)
 
     def response_received(self, event):
         params = event["params"]
         res = params["response"]
         req_id = params["requestId"]
 
-        if params["type"] == "Image" and "/dist.jpg?" in res["url"]:
-            self.image_response_ids.add(req_id)
+        if (
+            self.tabs is not None
+            and params["type"] == "Image"
+            and "/dist.jpg?" in res["url"]
+        ):
+            tab = self.tabs.responseReceived(req_id, res["url"], params.get("frameId"))
+
+            if tab is not None and res.get("status") in THROTTLE_STATUSES:
+                self.throttle.observe(Observation(False, status=res["status"]))
 
     def loading_finished(self, event):
-        req_id = event["params"]["requestId"]
+        # Runs on the CDP listener thread: only hand off to the driver thread
+        if self.tabs is not None:
+            self.tabs.loadingFinished(event["params"]["requestId"])
+
+    def write_response(self, tab, img, req_id, latency):
+        if latency is not None:
+            self.latencies[img.ark] = latency
+
+        try:
+            # Response bodies live in the tab's own target
+            self.driver.switch_to.window(tab.handle)
+        except Exception as e:
+            print("Failed:", e)
+            self.manifest.recordFailed(img.ark, e)
+            return
 
-        if req_id in self.image_response_ids:
-            try:
-                body = self.driver.execute_cdp_cmd(
-                    "Network.getResponseBody", {"requestId": req_id}
-                )
-
-                img = self.store.curr()
-                image_path = self.image_path(img)
-                image_data = base64.b64decode(body["body"])
-                # print(image_data)
-
-                if len(image_data) > 20_000:
-                    with open(image_path, "wb") as file:
-                        file.write(image_data)
-                        self.written_arks.add(img.ark)
-                        print(" Written.")
-            except Exception as e:
-                print("Failed:", e)
+        self.writer.write(img, self.image_path(img), self.bodies.chunks(req_id))
 
-    def scrape_ed_desc_images(self):
+    def record_writes(self):
+        for result in self.writer.completed():
+            img = result.image
+            # None when the body came in after its tab had moved on, which
+            # says nothing about the current pace
+            latency = self.latencies.pop(img.ark, None)
+
+            if result.error is None:
+                self.manifest.recordWritten(img.ark, result.size, result.sha256)
+                obs = Observation(True, latency, size=result.size)
+                print(f"        Written  {self.short_path(img)}")
+            else:
+                self.manifest.recordFailed(img.ark, result.error)
+                obs = Observation(False, latency, size=result.size, local=True)
+
+            if latency is not None:
+                self.throttle.observe(obs)
+
+    def sign_in(self):
         # Let the user sign in
         self.driver.get(
             "https://www.familysearch.org/auth/familysearch/login?returnUrl=https%3A%2F%2Fwww.familysearch.org%2Fen%2Fhome%2Fportal%2F"
@@ -100,41 +204,119 @@ class Scraper:
 
         val = input("Waiting… [q to quit] ")
 
-        if val == "q":
+        return val != "q"
+
+    def download_ed_desc_images(self, workers):
+        """Fetch images over plain HTTP with the browser's session, then close the browser."""
+        if not self.sign_in():
             return
 
-        last = self.store.curr()
-        load_count = 0
+        # The throttle sets the pace; the session's limiter is only a backstop
+        session = sessionFromDriver(self.driver, 60 * MAX_RATE, workers)
+        self.driver.quit()
 
-        for img in self.store:
-            ark_path = self.image_path(img)
-            ark_path.parent.mkdir(parents=True, exist_ok=True)
-            last_3 = "/".join(ark_path.parts[-3:])
+        downloader = Downloader(session, workers=workers, throttle=self.throttle)
+        jobs = ((img, self.image_path(img)) for img in self.pending_images())
 
-            if not ark_path.is_file() or ark_path.stat().st_size < 20_000:
-                print(f"[{load_count:5}] Loading  {last_3}…", end="", flush=True)
+        for load_count, result in enumerate(downloader.downloadAll(jobs)):
+            if result.error is None:
+                self.manifest.recordWritten(result.image.ark, result.size, result.sha256)
+                print(f"[{load_count:5}] Written  {self.short_path(result.image)}")
+            else:
+                self.manifest.recordFailed(result.image.ark, result.error)
+                print(f"[{load_count:5}] Failed   {self.short_path(result.image)}: {result.error}")
 
-                self.load_next(last, img)
+    def scrape_ed_desc_images(self):
+        if not self.sign_in():
+            return
+
+        self.tabs = TabPool(self.open_tabs())
+        self.writer = ImageWriter()
+        self.bodies = BodyReader(self.driver)
+        self.latencies = {}
+        pending = self.pending_images()
+        load_count = 0
+        exhausted = False
+
+        while not exhausted or self.tabs.busyTabs():
+            for tab in self.tabs.freeTabs():
+                if exhausted or (img := next(pending, None)) is None:
+                    exhausted = True
+                    break
+
+                self.throttle.wait()
+                time.sleep(random.uniform(0, LOAD_JITTER))
+                print(f"[{load_count:5}] Loading  {self.short_path(img)}…")
+                self.tabs.assign(tab, img)
+                self.load_next(tab, img)
                 load_count += 1
-                last = img
 
-                # Let the image fully load
-                time.sleep(random.randint(15, 30))
+            # Every body that's arrived is handled before anything can time out
+            for tab, img, req_id, latency in self.finished_bodies():
+                self.write_response(tab, img, req_id, latency)
 
-                if load_count % LOAD_LIMIT == 0 or img.ark not in self.written_arks:
-                    target = dt.datetime.now() + dt.timedelta(minutes=61)
-                    print(f"Taking a break to avoid throttling. Resuming at {target}…")
-                    time.sleep(61 * 60)
+                if tab.image is not None and tab.image.ark == img.ark:
+                    self.tabs.release(tab)
 
-            else:
-                print(f"        Skipping {last_3}")
+            self.record_writes()
+
+            for tab in self.tabs.expired(IMAGE_TIMEOUT):
+                print(f"        Missed   {self.short_path(tab.image)}")
+                self.manifest.recordFailed(tab.image.ark, "Timed out")
+                self.throttle.observe(Observation(False))
+                self.tabs.release(tab)
+
+        self.writer.close()
+        self.record_writes()
+
+    def finished_bodies(self):
+        """Wait up to a second for a finished body, then take all that are queued."""
+        try:
+            yield self.tabs.finished.get(timeout=1)
+        except queue.Empty:
+            return
+
+        while True:
+            try:
+                yield self.tabs.finished.get_nowait()
+            except queue.Empty:
+                return
+
+    def pending_images(self):
+        """Images left to fetch, in catalogue order, parsed a film at a time.
+
+        Films of metros the manifest already has finished are never read.
+        """
+        images = iterImages(finished=self.manifest.metroFinished())
+        return self.manifest.pending(images, self.written_size)
+
+    def written_size(self, img):
+        return writtenSize(self.image_path(img))
+
+    def open_tabs(self):
+        handles = [self.driver.current_window_handle]
+
+        for _ in range(self.tab_count - 1):
+            self.driver.switch_to.new_window("tab")
+            handles.append(self.driver.current_window_handle)
+
+        return handles
 
     def image_path(self, img):
-        short_ark = img.ark[4:]
-        return self.out_path / str(img.year) / img.utp_code / f"{short_ark}.png"
+        return imagePath(self.out_path, img)
+
+    def short_path(self, img):
+        return "/".join(self.image_path(img).parts[-3:])
+
+    def load_next(self, tab, new):
+        self.driver.switch_to.window(tab.handle)
+        old = tab.last_image
 
-    def load_next(self, old, new):
-        if old.utp_code == new.utp_code and new.image_index == old.image_index + 1:
+        if (
+            old is not None
+            and old.utp_code == new.utp_code
+            and new.image_index == old.image_index + 1
+        ):
             self.clickSpanWithClass("next")
         else:
             self.driver.get(new.url)
@@ -1,67 +1,66 @@
-import csv
-import json
-import re
-from pathlib import Path
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import NamedTuple
 
 from ordered_set import StableSet
 
+from src.catalogue import Image, ImageCatalogue
 from src.ed import Ed
 from src.log import get_logger
+from src.migrations import migrate
+from src.writer import SyncWriter
 
 prev = lambda obj: obj.prev()
 
-FS_IMG_URL = "https://www.familysearch.org/ark:/61903/{ark}?i={i}&cat={cat}"
+ADD = "add"
+REMOVE = "remove"
 
 
-class Image:
-    def __init__(self, year, utp_code, ark, i, metro_index, metro_image_count, cat):
-        self.year = year
-        self.utp_code = utp_code
-        self.ark = ark
-        self.image_index = i
-        self.metro_image_index = metro_index
-        self.metro_image_count = metro_image_count
-        self.cat = cat
-        self.eds = StableSet([])
-        self.db_id = None
+class Operation(NamedTuple):
+    """One ED added to or removed from the image at `index`."""
 
-    def __eq__(self, other):
-        return self.ark == other.ark
+    kind: str
+    index: int
+    name: str
 
-    def __repr__(self):
-        return f"{self.year} {self.utp_code:15} {self.image_index:4} {self.ark} [{self.metro_image_index:4}/{self.metro_image_count}]"
+    @property
+    def ed(self):
+        return Ed.from_str(self.name)
 
-    def addED(self, ed):
-        self.eds.add(str(ed).upper())
+    def inverse(self):
+        return self._replace(kind=REMOVE if self.kind == ADD else ADD)
 
-    def removeED(self, ed):
-        self.eds.remove(str(ed).upper())
 
-    def lastED(self):
-        if len(self.eds) > 0:
-            return self.eds[len(self.eds) - 1]
+def insertSorted(indices, index):
+    pos = bisect_left(indices, index)
 
-        return None
+    if pos == len(indices) or indices[pos] != index:
+        indices.insert(pos, index)
 
-    @property
-    def url(self):
-        return FS_IMG_URL.format_map(
-            {"ark": self.ark, "i": self.image_index, "cat": self.cat}
-        )
 
-    @property
-    def local_url(self):
-        short_ark = self.ark[4:]
-        path = Path("../ed-desc-img") / self.year / self.utp_code / f"{short_ark}.png"
-        return path.resolve().as_uri()
+def removeSorted(indices, index):
+    pos = bisect_left(indices, index)
+
+    if pos < len(indices) and indices[pos] == index:
+        del indices[pos]
 
 
 class Store:
-    def __init__(self, db, images):
+    def __init__(self, db, images, writer=None, leases=None):
+        if not isinstance(images, ImageCatalogue):
+            images = ImageCatalogue.fromImages(images)
+
         self.images = images
         self.index = None
+        self.undo_log = []
+        self.redo_log = []
+        self.on_changed = None  # called with the index of each image whose EDs change
+        self.buildMetroIndex()
+        self.buildAnnotatedIndex()
 
         self.db = db
+        self.writer = writer or SyncWriter(db)
+        self.leases = leases  # src.leases.Leases, when sharing the DB with others
         self.init_db()
         self.log = get_logger()
 
@@ -89,30 +88,52 @@ class Store:
         if self.index is None:
             self.index = 0
 
-        for index, img in enumerate(self.images):
-            if (
-                index < len(self.images) - 1
-                and index >= self.index
-                and img.utp_code != self.images[index + 1].utp_code
-            ):
-                self.index = index + 1
-                return self.images[self.index]
+        pos = bisect_right(self.metro_starts, self.index)
+
+        while pos < len(self.metro_starts) and self.leasedByOthers(self.metro_starts[pos]):
+            pos += 1
+
+        if pos < len(self.metro_starts):
+            self.index = self.metro_starts[pos]
+            return self.images[self.index]
 
         return None
 
     def prevMetro(self):
         if self.index is not None:
-            for index, img in reversed(list(enumerate(self.images[: self.index + 1]))):
-                if (
-                    index >= 1
-                    and index <= self.index
-                    and img.utp_code != self.images[index - 1].utp_code
-                ):
-                    self.index = index - 1
-                    return self.images[self.index]
+            pos = bisect_right(self.metro_starts, self.index) - 1
+
+            # The first metro has nowhere to go back to
+            if pos >= 1:
+                self.index = self.metro_starts[pos] - 1
+                return self.images[self.index]
 
         return None
 
+    def metroBounds(self, index=None):
+        """First and last index of the metro containing `index` (default: current)."""
+        if index is None:
+            index = self.index or 0
+
+        pos = bisect_right(self.metro_starts, index) - 1
+        first = self.metro_starts[pos]
+
+        if pos + 1 < len(self.metro_starts):
+            last = self.metro_starts[pos + 1] - 1
+        else:
+            last = len(self.images) - 1
+
+        return (first, last)
+
+    def buildMetroIndex(self):
+        """Sorted offsets of every image which starts a new metro."""
+        codes = self.images.utp_code_codes
+        self.metro_starts = [
+            index
+            for index in range(len(codes))
+            if index == 0 or codes[index] != codes[index - 1]
+        ]
+
     def curr(self):
         if self.index is None:
             index = 0
@@ -122,170 +143,258 @@ class Store:
         return self.images[index]
 
     def addEDToCurrentImage(self, ed: Ed):
-        image = self.curr()
+        index = self.index or 0
+        name = str(ed).upper()
+
         try:
-            self.db.execute(
-                """
-                INSERT INTO eds (image_id, name) VALUES (?, ?)
-                ON CONFLICT DO NOTHING
-                """,
-                (image.db_id, str(ed)),
-            )
-            image.addED(ed)
-            self.db.connection.commit()
+            if name not in self.images[index].eds:
+                self.insertED(index, name)
+                self.record(Operation(ADD, index, name))
         except Exception as e:
-            self.log.warning(f"Failed to insert '{ed}' for '{image}': {e}")
+            self.log.warning(f"Failed to insert '{ed}' for '{self.curr()}': {e}")
 
     def removeLastED(self):
         removedED = None
-        image = self.curr()
+        index = self.index or 0
 
         try:
-            res = self.db.execute(
-                """
-                SELECT id, name
-                FROM eds
-                WHERE image_id = ?
-                ORDER BY id DESC -- get most recent
-                LIMIT 1;
-                """,
-                (image.db_id,),
-            ).fetchone()
-
-            # Make sure there's an ED to remove!
-            if res is not None:
-                (ed_id, name) = res
-                self.db.execute(
-                    """
-                    DELETE FROM eds WHERE id = ?
-                    """,
-                    (ed_id,),
-                )
-                image.removeED(name)
-                self.db.connection.commit()
-
+            # In-memory EDs are in insertion order, so the last is the most recent
+            if (name := self.images[index].lastED()) is not None:
+                self.deleteED(index, name)
+                self.record(Operation(REMOVE, index, name))
                 removedED = name
         except Exception as e:
-            self.log.warning(f"Failed to remove last ED for '{image}': {e}")
+            self.log.warning(f"Failed to remove last ED for '{self.curr()}': {e}")
 
         return removedED
 
     def removeED(self, ed_name):
-        image = self.curr()
+        index = self.index or 0
 
         try:
-            res = self.db.execute(
-                """
-                SELECT id, name
-                FROM eds
-                WHERE image_id = ?
-                ORDER BY id DESC;
-                """,
-                (image.db_id,),
-            ).fetchall()
-
-            # Make sure there's an ED to remove!
-            if res is not None:
-                for ed_id, name in res:
-                    if name == ed_name:
-                        self.db.execute(
-                            """
-                            DELETE FROM eds WHERE id = ?
-                            """,
-                            (ed_id,),
-                        )
-
-                        image.removeED(name)
-                        self.db.connection.commit()
-                        break
+            if ed_name in self.images[index].eds:
+                self.deleteED(index, ed_name)
+                self.record(Operation(REMOVE, index, ed_name))
         except Exception as e:
-            self.log.warning(f"Failed to remove ED '{ed_name}' for '{image}': {e}")
+            self.log.warning(f"Failed to remove ED '{ed_name}' for '{self.curr()}': {e}")
+
+    def undo(self):
+        """Revert the most recent add or remove, wherever it was, and move to its image."""
+        if not self.undo_log:
+            return None
+
+        op = self.undo_log.pop()
+        self.apply(op.inverse())
+        self.redo_log.append(op)
+        self.index = op.index
+
+        return op
+
+    def redo(self):
+        if not self.redo_log:
+            return None
+
+        op = self.redo_log.pop()
+        self.apply(op)
+        self.undo_log.append(op)
+        self.index = op.index
+
+        return op
+
+    def record(self, op):
+        self.undo_log.append(op)
+        self.redo_log.clear()
+
+    def apply(self, op):
+        if op.kind == ADD:
+            self.insertED(op.index, op.name)
+        else:
+            self.deleteED(op.index, op.name)
+
+    def insertED(self, index, name):
+        image = self.images[index]
+        parsed = Ed.from_str(name)
+
+        # Memory first: the SQL is only queued once the change has been made
+        image.addED(name)
+        self.writer.submit(
+            """
+            INSERT INTO eds (image_id, name, ed_num, ed_suffix, year, utp_code)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT DO NOTHING
+            """,
+            (
+                image.db_id,
+                name,
+                parsed.num if parsed else None,
+                parsed.suff if parsed else "",
+                int(image.year),
+                image.utp_code,
+            ),
+        )
+        self.markAnnotated(index, image)
+        self.changed(index)
+
+    def deleteED(self, index, name):
+        image = self.images[index]
+        image.removeED(name)
+
+        # Keyed on image_id. upper() also matches names stored before they
+        # were upper-cased, which populate_db loads upper-cased
+        self.writer.submit(
+            """
+            DELETE FROM eds WHERE image_id = ? AND upper(name) = ?
+            """,
+            (image.db_id, name),
+        )
+
+        if len(image.eds) == 0:
+            self.markUnannotated(index, image)
+
+        self.changed(index)
+
+    def changed(self, index):
+        if self.on_changed is not None:
+            self.on_changed(index)
 
     def largestEDForCurrentMetro(self):
         image = self.curr()
+        self.writer.flush()
 
         res = self.db.execute(
             """
             SELECT name
-            FROM eds AS e
-                JOIN images AS i ON i.id = e.image_id
-            WHERE i.utp_code = ?
-            ORDER BY e.name DESC
+            FROM eds
+            WHERE year = ? AND utp_code = ?
+            ORDER BY ed_num DESC, ed_suffix DESC
             LIMIT 1
             """,
-            (image.utp_code,),
+            (int(image.year), image.utp_code),
         ).fetchone()
 
         return res[0] if res is not None else "1"
 
+    def edNumbers(self):
+        """(image_id, ed_num) of every ED, with -1 for names which don't start with a number."""
+        self.writer.flush()
+
+        return self.db.execute(
+            "SELECT image_id, COALESCE(ed_num, -1) FROM eds"
+        ).fetchall()
+
+    def leasedByOthers(self, index):
+        return self.leases is not None and self.leases.heldByOthers(
+            self.images.year(index), self.images.utpCode(index)
+        )
+
     def skipToLastEntered(self):
-        for index, img in reversed(list(enumerate(self.images))):
-            if img.year != "1880" and len(img.eds):
+        annotated = self.annotated_global
+        end = len(annotated)
+
+        # The last annotated image outside other sessions' metros, skipping a metro at a time
+        while end:
+            index = annotated[end - 1]
+
+            if not self.leasedByOthers(index):
                 self.index = index
-                break
+                return
+
+            first, _ = self.metroBounds(index)
+            end = bisect_left(annotated, first, 0, end)
 
     def skipToLastEnteredWithinMetro(self):
-        for index, img in reversed(list(enumerate(self.images))):
-            if (
-                self.curr().utp_code == img.utp_code
-                and self.curr().year == img.year
-                and len(img.eds)
-            ):
-                self.index = index
-                break
+        if self.leasedByOthers(self.index or 0) and self.nextMetro() is None:
+            return
+
+        img = self.curr()
+
+        if annotated := self.annotated.get((img.year, img.utp_code)):
+            self.index = annotated[-1]
+        else:
+            # Nothing entered yet: start the metro from its first image
+            self.index, _ = self.metroBounds()
+
+    def buildAnnotatedIndex(self):
+        """Sorted indices of images with EDs, per (year, utp_code) and globally."""
+        self.annotated = {}
+        self.annotated_global = []
+
+        for index in sorted(self.images.eds):
+            if self.images.edCount(index):
+                self.markAnnotated(index, self.images[index])
+
+    def markAnnotated(self, index, img):
+        metro = self.annotated.setdefault((img.year, img.utp_code), [])
+        insertSorted(metro, index)
+
+        if img.year != "1880":
+            insertSorted(self.annotated_global, index)
+
+    def markUnannotated(self, index, img):
+        removeSorted(self.annotated.get((img.year, img.utp_code), []), index)
+        removeSorted(self.annotated_global, index)
+
+    def close(self):
+        """Flush any pending writes."""
+        self.writer.close()
 
     def init_db(self):
         self.db.connection.execute("PRAGMA foreign_keys = 1")
-
-        self.db.execute(
-            """
-            CREATE TABLE IF NOT EXISTS images (
-                id INTEGER PRIMARY KEY,
-                year INTEGER NOT NULL,
-                utp_code VARCHAR NOT NULL,
-                ark VARCHAR NOT NULL,
-                image_index INTEGER NOT NULL,
-                cat INTEGER NOT NULL,
-                UNIQUE(ark));
-            """
-        )
-        self.db.execute(
-            """
-            CREATE TABLE IF NOT EXISTS eds (
-                id INTEGER PRIMARY KEY,
-                image_id INTEGER NOT NULL,
-                name VARCHAR,
-                created_at INTEGER DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (image_id) REFERENCES images (id),
-                UNIQUE(image_id, name));
-            """
-        )
-        self.db.connection.commit()
+        migrate(self.db)
 
     def populate_db(self):
-        for image in self.images:
-            data = (
-                int(image.year),
-                image.utp_code,
-                image.ark,
-                image.image_index,
-                image.cat,
-            )
-            self.db.execute(
+        fingerprint = self.fingerprint()
+        db_ids = None
+
+        if self.metadata("images_fingerprint") == fingerprint:
+            # Unchanged corpus: the ids are cached in catalogue order
+            if (blob := self.metadata("images_db_ids")) is not None:
+                db_ids = array("q")
+                db_ids.frombytes(blob)
+        else:
+            self.db.executemany(
                 """
                 INSERT INTO images (year, utp_code, ark, image_index, cat)
                     VALUES (?, ?, ?, ?, ?) ON CONFLICT DO NOTHING""",
-                data,
+                (
+                    (int(year), utp_code, ark, image_index, cat)
+                    for year, utp_code, ark, image_index, cat in self.images.rows()
+                ),
             )
-            res = self.db.execute(
-                "SELECT id FROM images WHERE ark = ?", (image.ark,)
-            ).fetchone()
-            image.db_id = res[0]
-
-            res = self.db.execute(
-                "SELECT name FROM eds WHERE image_id = ? ORDER BY eds.id",
-                (image.db_id,),
-            ).fetchall()
-            image.eds.update([e[0] for e in res])
-
-        self.db.connection.commit()
+
+        if db_ids is None or len(db_ids) != len(self.images):
+            ids = {ark: db_id for db_id, ark in self.db.execute("SELECT id, ark FROM images")}
+            db_ids = array("q", (ids[ark] for ark in self.images.arkList()))
+            self.setMetadata("images_fingerprint", fingerprint)
+            self.setMetadata("images_db_ids", db_ids.tobytes())
+            self.db.connection.commit()
+
+        self.images.db_ids = db_ids
+        by_id = {db_id: index for index, db_id in enumerate(db_ids)}
+
+        eds = self.images.eds
+        for image_id, name in self.db.execute(
+            "SELECT image_id, name FROM eds ORDER BY id"
+        ):
+            if (index := by_id.get(image_id)) is not None:
+                eds.setdefault(index, StableSet([])).add(name.upper())
+
+        self.buildAnnotatedIndex()
+
+    def fingerprint(self):
+        """Hash of the image list, so an unchanged corpus can skip the upsert."""
+        return self.images.fingerprint()
+
+    def metadata(self, key):
+        res = self.db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+
+        return res[0] if res is not None else None
+
+    def setMetadata(self, key, value):
+        self.db.execute(
+            """
+            INSERT INTO meta (key, value) VALUES (?, ?)
+                ON CONFLICT (key) DO UPDATE SET value = excluded.value
+            """,
+            (key, value),
+        )
@@ -0,0 +1,114 @@
+import queue
+import threading
+import time
+from urllib.parse import unquote
+
+
+class Tab:
+    def __init__(self, handle):
+        self.handle = handle
+        self.image = None
+        self.last_image = None
+        self.started = None
+        self.finished_at = None  # when its image's body finished loading
+
+    @property
+    def busy(self):
+        return self.image is not None
+
+
+class TabPool:
+    """Browser tabs, the Image each is loading, and which CDP request belongs to which tab.
+
+    CDP events arrive on the listener thread, possibly out of order across
+    tabs. They are attributed here and queued, so the thread which owns the
+    driver can fetch bodies and reuse tabs without racing the listener.
+    """
+
+    def __init__(self, handles):
+        self.tabs = {handle: Tab(handle) for handle in handles}
+        self.request_tabs = {}
+        self.finished = queue.Queue()
+        self.lock = threading.Lock()
+
+    def freeTabs(self):
+        with self.lock:
+            return [tab for tab in self.tabs.values() if not tab.busy]
+
+    def busyTabs(self):
+        with self.lock:
+            return [tab for tab in self.tabs.values() if tab.busy]
+
+    def assign(self, tab, image):
+        with self.lock:
+            tab.image = image
+            tab.started = time.monotonic()
+            tab.finished_at = None
+
+    def release(self, tab):
+        # Requests already attributed keep their image, so a late body still
+        # lands in the right file after the tab has moved on
+        with self.lock:
+            tab.last_image = tab.image
+            tab.image = None
+            tab.started = None
+            tab.finished_at = None
+
+    def tabForResponse(self, url, frame_id):
+        """The tab a response belongs to: by ark in the URL, else by its frame.
+
+        Chrome's top-level frame id is the tab's target id, which is also the
+        Selenium window handle.
+        """
+        decoded = unquote(url)
+
+        for tab in self.tabs.values():
+            if tab.image is not None and tab.image.ark in decoded:
+                return tab
+
+        tab = self.tabs.get(frame_id)
+        return tab if tab is not None and tab.busy else None
+
+    def responseReceived(self, req_id, url, frame_id):
+        with self.lock:
+            if (tab := self.tabForResponse(url, frame_id)) is not None:
+                self.request_tabs[req_id] = (tab, tab.image)
+
+            return tab
+
+    def loadingFinished(self, req_id):
+        """Queue (tab, image, req_id, latency) for the driver thread, if the
+        request is one of ours.
+
+        Latency is timed here, as the body arrives, so however long the driver
+        thread takes to get to it doesn't count. It's None for a body which
+        arrives after its tab has moved on.
+        """
+        now = time.monotonic()
+
+        with self.lock:
+            entry = self.request_tabs.pop(req_id, None)
+
+            if entry is not None:
+                tab, image = entry
+                latency = None
+
+                if tab.image is image:
+                    tab.finished_at = now
+                    latency = now - tab.started
+
+                self.finished.put((tab, image, req_id, latency))
+
+        return entry is not None
+
+    def expired(self, timeout):
+        """Busy tabs which have waited longer than `timeout` seconds, not
+        counting those whose body has arrived and is waiting to be written."""
+        now = time.monotonic()
+
+        with self.lock:
+            return [
+                tab
+                for tab in self.tabs.values()
+                if tab.busy and tab.finished_at is None and now - tab.started > timeout
+            ]
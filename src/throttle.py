@@ -0,0 +1,381 @@
+"""Pacing for the scraper, driven by how FamilySearch responds.
+
+Controllers never read a clock: they're told the time along with each
+outcome, and say when the next load may start. `Throttle` runs one on the
+wall clock across threads and saves its state, and `simulate` runs one
+against a model server on a fake clock, so policies can be compared offline.
+"""
+
+import json
+import os
+import random
+import threading
+import time
+from typing import NamedTuple
+
+from src.log import get_logger
+
+THROTTLE_STATUSES = frozenset({403, 429, 503})
+MAX_RATE = 0.5  # loads per second, a hard ceiling whatever a controller decides
+SLOW_FACTOR = 3  # a load this many times slower than usual signals congestion
+
+OK = "ok"
+SLOW = "slow"
+THROTTLED = "throttled"
+ERROR = "error"
+
+
+class Observation(NamedTuple):
+    """The outcome of one load. A failure with no latency or status is a timeout.
+
+    A `local` failure, like an image we couldn't write, says nothing about
+    how FamilySearch is treating us.
+    """
+
+    ok: bool
+    latency: float = None
+    status: int = None
+    size: int = None
+    local: bool = False
+
+
+class Controller:
+    STATE = ("strikes", "backoff_until", "next_at", "latency")
+
+    name = None
+
+    def __init__(self, base_backoff=60, max_backoff=2 * 3600):
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.strikes = 0  # throttle signals since the last success
+        self.backoff_until = 0.0
+        self.next_at = 0.0
+        self.latency = None  # moving average over successful loads
+
+    def classify(self, obs):
+        if obs.status in THROTTLE_STATUSES:
+            return THROTTLED
+        if not obs.ok:
+            if obs.local:
+                return ERROR
+            # The viewer just never delivers an image when we're throttled
+            return THROTTLED if obs.latency is None and obs.status is None else ERROR
+        if (
+            self.latency is not None
+            and obs.latency is not None
+            and obs.latency > SLOW_FACTOR * self.latency
+        ):
+            return SLOW
+        return OK
+
+    def observe(self, obs, now):
+        signal = self.classify(obs)
+
+        if obs.ok and obs.latency is not None:
+            if self.latency is None:
+                self.latency = obs.latency
+            else:
+                self.latency = 0.9 * self.latency + 0.1 * obs.latency
+
+        if signal == THROTTLED:
+            self.strikes += 1
+            backoff = min(self.max_backoff, self.base_backoff * 2 ** (self.strikes - 1))
+            self.backoff_until = max(self.backoff_until, now + backoff)
+        elif signal != ERROR:
+            self.strikes = 0
+
+        self.adjust(signal, now)
+        return signal
+
+    def reserve(self, now):
+        """Claim the next load slot, returning when it starts."""
+        start = max(now, self.next_at, self.backoff_until)
+        self.next_at = start + self.spacing()
+        return start
+
+    def spacing(self):
+        """Seconds between load slots. By default the hard ceiling, MAX_RATE."""
+        return 1 / MAX_RATE
+
+    def adjust(self, signal, now):
+        pass
+
+    def state(self):
+        return {key: getattr(self, key) for key in self.STATE}
+
+    def restore(self, state):
+        for key in self.STATE:
+            if key in state:
+                setattr(self, key, state[key])
+
+
+class AIMDController(Controller):
+    """Raises the rate by `increase` loads/s per hour of success, and cuts it
+    by `decrease` once per throttling episode.
+
+    The rate which got us throttled becomes a ceiling that's approached ten
+    times more slowly, since the penalty for crossing it again is an hour.
+    """
+
+    STATE = Controller.STATE + ("rate", "ceiling")
+
+    name = "aimd"
+
+    def __init__(
+        self,
+        rate=1 / 15,
+        min_rate=1 / 120,
+        max_rate=MAX_RATE,
+        increase=0.01,
+        decrease=0.5,
+        slow_decrease=0.9,
+        **kwargs,
+    ):
+        super().__init__(**kwargs)
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.slow_decrease = slow_decrease
+        self.ceiling = None
+
+    def spacing(self):
+        return 1 / self.rate
+
+    def adjust(self, signal, now):
+        if signal == OK:
+            increase = self.increase * self.spacing() / 3600
+            if self.ceiling is not None and self.rate > 0.8 * self.ceiling:
+                increase /= 10
+            self.rate = min(self.max_rate, self.rate + increase)
+        elif signal == SLOW:
+            self.rate = max(self.min_rate, self.rate * self.slow_decrease)
+        elif signal == THROTTLED and self.strikes == 1:
+            # Later strikes are the same episode, already paid for by the backoff
+            self.ceiling = self.rate
+            self.rate = max(self.min_rate, self.rate * self.decrease)
+
+
+class TokenBucketController(Controller):
+    """A steady rate with bursts of up to `capacity`, backing off only when throttled."""
+
+    STATE = Controller.STATE + ("tokens", "updated")
+
+    name = "bucket"
+
+    def __init__(self, rate=1 / 15, capacity=5, **kwargs):
+        super().__init__(**kwargs)
+        self.rate = min(rate, MAX_RATE)
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = None
+
+    def reserve(self, now):
+        now = max(now, self.backoff_until)
+
+        if self.updated is not None:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+
+        # Tokens go negative as later slots are claimed ahead of time
+        self.updated = now
+        self.tokens -= 1
+        return now if self.tokens >= 0 else now - self.tokens / self.rate
+
+    def spacing(self):
+        # Only the average: reserve lets bursts through closer together
+        return 1 / self.rate
+
+    def adjust(self, signal, now):
+        if signal == THROTTLED:
+            self.tokens = min(self.tokens, 0)
+
+
+class FixedController(Controller):
+    """The original pacing: one load every `interval`, and `pause` off after
+    every `limit` loads or any miss."""
+
+    STATE = Controller.STATE + ("loads",)
+
+    name = "fixed"
+
+    def __init__(self, interval=15, limit=650, pause=61 * 60):
+        super().__init__(base_backoff=pause, max_backoff=pause)
+        self.interval = interval
+        self.limit = limit
+        self.pause = pause
+        self.loads = 0
+
+    def spacing(self):
+        return self.interval
+
+    def reserve(self, now):
+        start = super().reserve(now)
+        self.loads += 1
+
+        if self.loads % self.limit == 0:
+            self.backoff_until = self.next_at + self.pause
+
+        return start
+
+
+CONTROLLERS = {
+    controller.name: controller
+    for controller in (AIMDController, TokenBucketController, FixedController)
+}
+
+
+class Throttle:
+    """A controller on the wall clock, shared by threads, its state saved as it changes.
+
+    The clock is wall time rather than monotonic, so a backoff survives a restart.
+    """
+
+    def __init__(self, controller, state_path=None, clock=time.time, sleep=time.sleep):
+        self.controller = controller
+        self.state_path = state_path
+        self.clock = clock
+        self.sleep = sleep
+        self.lock = threading.Lock()
+        self.log = get_logger()
+
+        if state_path is not None:
+            self.load()
+
+    def wait(self):
+        """Block until this caller's load may start. Returns the seconds waited."""
+        with self.lock:
+            start = self.controller.reserve(self.clock())
+            self.save()
+
+        delay = start - self.clock()
+
+        if delay > 0:
+            if delay >= 60:
+                resume = time.strftime("%H:%M:%S", time.localtime(self.clock() + delay))
+                self.log.info(f"Backing off for {delay / 60:.0f} min, until {resume}")
+            self.sleep(delay)
+
+        return max(delay, 0)
+
+    def observe(self, obs):
+        with self.lock:
+            signal = self.controller.observe(obs, self.clock())
+            self.save()
+
+        return signal
+
+    def load(self):
+        try:
+            with open(self.state_path) as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return
+
+        # A different policy's state means nothing to this one
+        if saved.get("policy") == self.controller.name:
+            self.controller.restore(saved["state"])
+
+    def save(self):
+        if self.state_path is None:
+            return
+
+        tmp_path = self.state_path.with_suffix(".tmp")
+
+        with open(tmp_path, "w") as f:
+            json.dump({"policy": self.controller.name, "state": self.controller.state()}, f)
+
+        os.replace(tmp_path, self.state_path)
+
+
+class FakeClock:
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class SimulatedServer:
+    """FamilySearch as we see it: at most `limit` loads in any `window` seconds.
+
+    Loads slow down by up to `warning` times as the window fills. Past the
+    limit, every load fails for `penalty` seconds, either with `status` or,
+    if it's None, by timing out.
+    """
+
+    def __init__(
+        self,
+        limit=650,
+        window=3600,
+        penalty=3600,
+        latency=4.0,
+        warning=4,
+        timeout=90,
+        status=None,
+        size=1_500_000,
+        seed=0,
+    ):
+        self.limit = limit
+        self.window = window
+        self.penalty = penalty
+        self.latency = latency
+        self.warning = warning
+        self.timeout = timeout
+        self.status = status
+        self.size = size
+        self.random = random.Random(seed)
+        self.loads = []
+        self.blocked_until = 0.0
+
+    def load(self, now):
+        """(Observation, seconds the load took)"""
+        self.loads = [t for t in self.loads if t > now - self.window]
+        self.loads.append(now)
+
+        if now < self.blocked_until or len(self.loads) > self.limit:
+            self.blocked_until = max(self.blocked_until, now + self.penalty)
+
+            if self.status is None:
+                return Observation(False), self.timeout
+            return Observation(False, 0.5, self.status), 0.5
+
+        load = len(self.loads) / self.limit
+        latency = self.latency * (1 + self.warning * load**4) * self.random.uniform(0.8, 1.2)
+        return Observation(True, latency, 200, self.size), latency
+
+
+class SimulationResult(NamedTuple):
+    policy: str
+    loads: int
+    written: int
+    throttled: int
+    elapsed: float
+
+    @property
+    def per_hour(self):
+        return self.written / self.elapsed * 3600
+
+
+def simulate(controller, server, duration):
+    """Run `controller` against `server` for `duration` fake seconds, one load at a time."""
+    clock = FakeClock()
+    throttle = Throttle(controller, clock=clock, sleep=clock.sleep)
+    throttle.log.disabled = True
+    loads = written = throttled = 0
+
+    while clock() < duration:
+        throttle.wait()
+        obs, took = server.load(clock())
+        clock.sleep(took)
+        loads += 1
+
+        if obs.ok:
+            written += 1
+        if throttle.observe(obs) == THROTTLED:
+            throttled += 1
+
+    return SimulationResult(controller.name, loads, written, throttled, clock())
@@ -1,45 +1,191 @@
 import csv
 import json
+import os
+import pickle
 import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from itertools import islice
 from pathlib import Path
-from src.store import Image
 
+from src.log import get_logger
+from src.catalogue import Image, ImageCatalogue
 
-def buildImageList():
-    images = []
-    film_info = {}
-    data_dir = Path("../gannett-data/scrape_fs")
-    ark_re = re.compile("(3:1:[^/]+)")
+DATA_DIR = Path("../gannett-data/scrape_fs")
+SNAPSHOT_PATH = Path(".cache/image_list.snapshot")
+SNAPSHOT_VERSION = 2
+ARK_RE = re.compile("(3:1:[^/]+)")
 
-    for film_path in (data_dir / "films").glob("*.json"):
-        with open(film_path) as jsonf:
-            arks = []
-            film_json = json.load(jsonf)
-            for image in film_json["images"]:
-                m = ark_re.search(image)
-                if m:
-                    arks.append(m.group(1))
-            film_info[film_path.stem] = arks
+# Below this many films, process pool startup costs more than it saves
+PARALLEL_FILM_THRESHOLD = 32
+# Films iterImages keeps parsed, for rows which come back to a recent film
+FILM_CACHE_SIZE = 4
 
-    with open(data_dir / "ed_descr_nums.csv") as csvf:
-        for row in csv.DictReader(csvf):
-            if row["digital_film_no"]:
-                start = int(row["start_index"])
-                stop = int(row["stop_index"])
-                metro_index = 0
-                for index, ark in enumerate(film_info[row["digital_film_no"]]):
-                    if index >= start and index <= stop:
-                        images.append(
-                            Image(
-                                row["year"],
-                                row["utp_code"],
-                                ark,
-                                index,
-                                metro_index,
-                                stop - start,
-                                row["collection"],
-                            )
-                        )
-                        metro_index += 1
+
+def buildImageList(data_dir=DATA_DIR, snapshot_path=SNAPSHOT_PATH, workers=None):
+    """Build the image list, reusing the on-disk snapshot if no input has changed."""
+    log = get_logger()
+    start = time.perf_counter()
+    key = snapshotKey(data_dir)
+
+    if (images := loadSnapshot(snapshot_path, key)) is not None:
+        log.info(f"Loaded {len(images)} images from snapshot in {elapsedMS(start)}")
+        return images
+
+    images = parseCatalogue(data_dir, workers)
+    saveSnapshot(snapshot_path, key, images)
+    log.info(f"Built {len(images)} images from {data_dir} in {elapsedMS(start)}")
+
+    return images
+
+
+def iterImages(data_dir=DATA_DIR, finished=None):
+    """Every image in catalogue order, without building the catalogue.
+
+    Each film is parsed when its first row comes up, so the first image is
+    ready as soon as one film is read, and only the last few films are held.
+    If `finished(year, utp_code, size)` says a metro of `size` images needs
+    nothing more, its rows are skipped without reading their films.
+    """
+    csv_rows = readCSVRows(data_dir)
+    film_stops = filmStops(csv_rows)
+    metro_sizes = {}
+
+    for row in csv_rows:
+        metro = (row["year"], row["utp_code"])
+        size = int(row["stop_index"]) - int(row["start_index"]) + 1
+        metro_sizes[metro] = metro_sizes.get(metro, 0) + size
+
+    @lru_cache(maxsize=FILM_CACHE_SIZE)
+    def filmArks(film_no):
+        return parseFilmArks(filmPath(data_dir, film_no), film_stops[film_no])
+
+    for row in csv_rows:
+        metro = (row["year"], row["utp_code"])
+        if finished is not None and finished(*metro, metro_sizes[metro]):
+            continue
+
+        start = int(row["start_index"])
+        stop = int(row["stop_index"])
+        arks = filmArks(row["digital_film_no"])[start : stop + 1]
+
+        for metro_index, ark in enumerate(arks):
+            yield Image(
+                row["year"],
+                row["utp_code"],
+                ark,
+                start + metro_index,
+                metro_index,
+                stop - start,
+                row["collection"],
+            )
+
+
+def parseCatalogue(data_dir, workers=None):
+    csv_rows = readCSVRows(data_dir)
+    film_stops = filmStops(csv_rows)
+    film_nos = list(film_stops)
+    jobs = [(filmPath(data_dir, film_no), film_stops[film_no]) for film_no in film_nos]
+
+    if len(jobs) < PARALLEL_FILM_THRESHOLD or workers == 1:
+        film_arks = [parseFilmArks(*job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            film_arks = list(
+                executor.map(
+                    parseFilmArks,
+                    *zip(*jobs),
+                    chunksize=max(1, len(jobs) // (4 * (workers or os.cpu_count()))),
+                )
+            )
+
+    film_info = dict(zip(film_nos, film_arks))
+    images = ImageCatalogue()
+
+    for row in csv_rows:
+        start = int(row["start_index"])
+        stop = int(row["stop_index"])
+        arks = film_info[row["digital_film_no"]][start : stop + 1]
+
+        for metro_index, ark in enumerate(arks):
+            images.append(
+                row["year"],
+                row["utp_code"],
+                ark,
+                start + metro_index,
+                metro_index,
+                stop - start,
+                row["collection"],
+            )
 
     return images
+
+
+def readCSVRows(data_dir):
+    """Rows of ed_descr_nums.csv which reference a film."""
+    with open(data_dir / "ed_descr_nums.csv") as csvf:
+        return [row for row in csv.DictReader(csvf) if row["digital_film_no"]]
+
+
+def filmStops(csv_rows):
+    """The furthest index any row needs from each film, so it's only parsed that far."""
+    film_stops = {}
+    for row in csv_rows:
+        film_no = row["digital_film_no"]
+        film_stops[film_no] = max(film_stops.get(film_no, -1), int(row["stop_index"]))
+
+    return film_stops
+
+
+def filmPath(data_dir, film_no):
+    return data_dir / "films" / f"{film_no}.json"
+
+
+def parseFilmArks(film_path, stop):
+    """Arks of the film's images, up to and including index `stop`."""
+    with open(film_path) as jsonf:
+        film_json = json.load(jsonf)
+
+    matches = (ARK_RE.search(image) for image in film_json["images"])
+    return list(islice((m.group(1) for m in matches if m), stop + 1))
+
+
+def snapshotKey(data_dir):
+    """Paths, sizes and mtimes of the CSV and every film it references."""
+    film_nos = {row["digital_film_no"] for row in readCSVRows(data_dir)}
+    inputs = [
+        data_dir / "ed_descr_nums.csv",
+        *(filmPath(data_dir, film_no) for film_no in film_nos),
+    ]
+    key = [SNAPSHOT_VERSION]
+
+    for path in sorted(inputs):
+        stat = path.stat()
+        key.append((str(path.resolve()), stat.st_size, stat.st_mtime_ns))
+
+    return key
+
+
+def loadSnapshot(snapshot_path, key):
+    try:
+        with open(snapshot_path, "rb") as f:
+            snapshot_key, images = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError, ValueError, AttributeError):
+        return None
+
+    return images if snapshot_key == key else None
+
+
+def saveSnapshot(snapshot_path, key, images):
+    snapshot_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = snapshot_path.with_suffix(".tmp")
+
+    with open(tmp_path, "wb") as f:
+        pickle.dump((key, images), f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    os.replace(tmp_path, snapshot_path)
+
+
+def elapsedMS(start):
+    return f"{(time.perf_counter() - start) * 1000:.1f} ms"
@@ -0,0 +1,83 @@
+import math
+import time
+from pathlib import Path
+
+from selenium.common.exceptions import WebDriverException
+
+VIEWER_PAGE = Path(__file__).parent / "static" / "viewer.html"
+
+SHOW_SCRIPT = """
+    var done = arguments[arguments.length - 1];
+    if (!window.viewer) { done(false); return; }
+    window.viewer.show(arguments[0], arguments[1], done);
+"""
+
+
+class LocalViewer:
+    """Shows local images through one persistent page which keeps neighbours decoded.
+
+    The prefetch window grows with navigation speed: skimming at several
+    images a second keeps up to `max_window` images ready ahead of the
+    direction of travel, while a slow pace keeps just `min_window`.
+    """
+
+    def __init__(self, driver, images, min_window=1, max_window=8, on_shown=None):
+        self.driver = driver
+        self.images = images
+        self.min_window = min_window
+        self.max_window = max_window
+        self.on_shown = on_shown
+
+        self.last_index = None
+        self.last_time = None
+        self.direction = 1
+        self.rate = 0.0  # navigations per second, smoothed
+
+    def open(self):
+        self.driver.get(VIEWER_PAGE.resolve().as_uri())
+
+    def show(self, index, started=None):
+        """Display image `index`. `started` is when the triggering key was pressed."""
+        started = started or time.perf_counter()
+        self.track(index, started)
+
+        url = self.images[index].local_url
+        keep = [self.images[i].local_url for i in self.window(index)]
+
+        try:
+            shown = self.driver.execute_async_script(SHOW_SCRIPT, url, keep)
+        except WebDriverException:
+            shown = False
+
+        if shown is False:
+            # The viewer page was navigated away from (e.g. by opening a FamilySearch URL)
+            self.open()
+            self.driver.execute_async_script(SHOW_SCRIPT, url, keep)
+
+        if self.on_shown is not None:
+            self.on_shown(index, time.perf_counter() - started)
+
+    def track(self, index, now):
+        if self.last_index is not None and index != self.last_index:
+            self.direction = 1 if index > self.last_index else -1
+            interval = max(now - self.last_time, 1e-3)
+            self.rate = 0.7 * self.rate + 0.3 * min(1 / interval, 50)
+
+        self.last_index = index
+        self.last_time = now
+
+    def windowSize(self):
+        return max(self.min_window, min(self.max_window, math.ceil(self.rate)))
+
+    def window(self, index):
+        """Indices to keep decoded: mostly ahead in the direction of travel."""
+        ahead = self.windowSize()
+        behind = max(1, ahead // 4)
+        indices = []
+
+        for offset in range(1, ahead + 1):
+            indices.append(index + self.direction * offset)
+        for offset in range(1, behind + 1):
+            indices.append(index - self.direction * offset)
+
+        return [i for i in indices if 0 <= i < len(self.images)]
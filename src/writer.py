@@ -0,0 +1,133 @@
+import atexit
+import queue
+import signal
+import sqlite3
+import threading
+import time
+
+from src.db import connect, isBusy, retryBusy
+from src.log import get_logger
+
+FLUSH = object()
+STOP = object()
+
+
+class SyncWriter:
+    """Executes and commits each write immediately, on the caller's connection."""
+
+    def __init__(self, db):
+        self.db = db
+
+    def submit(self, sql, params):
+        def write():
+            self.db.execute(sql, params)
+            self.db.connection.commit()
+
+        retryBusy(write)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class WriteBehindWriter:
+    """Applies writes on a background thread, grouping them into transactions.
+
+    Callers update their in-memory state first and submit the SQL here, so
+    keystrokes never wait on fsync. Writes are committed at most `max_delay`
+    seconds after submission, or as soon as `max_batch` are pending.
+    """
+
+    def __init__(self, db_path, max_delay=0.25, max_batch=500):
+        self.db_path = db_path
+        self.max_delay = max_delay
+        self.max_batch = max_batch
+        self.queue = queue.Queue()
+        self.log = get_logger()
+        self.closed = False
+
+        self.thread = threading.Thread(
+            target=self.run, name="write-behind", daemon=True
+        )
+        self.thread.start()
+
+    def submit(self, sql, params):
+        self.queue.put((sql, params))
+
+    def flush(self):
+        """Block until everything submitted so far is committed."""
+        if self.closed:
+            return
+
+        done = threading.Event()
+        self.queue.put((FLUSH, done))
+
+        while not done.wait(0.1):
+            if not self.thread.is_alive():
+                break
+
+    def close(self):
+        if not self.closed:
+            self.queue.put((STOP, None))
+            self.thread.join()
+            self.closed = True
+
+    def run(self):
+        # Take the write lock up front, so a busy DB is waited on rather than
+        # failing part way through the transaction
+        connection = connect(self.db_path, isolation_level="IMMEDIATE")
+        stopping = False
+
+        while not stopping:
+            batch = [self.queue.get()]
+            deadline = time.monotonic() + self.max_delay
+
+            # Gather until the deadline passes, the batch fills, or someone is waiting
+            while batch[-1][0] not in (FLUSH, STOP) and len(batch) < self.max_batch:
+                try:
+                    batch.append(self.queue.get(timeout=deadline - time.monotonic()))
+                except (queue.Empty, ValueError):
+                    break
+
+            waiting = [params for sql, params in batch if sql is FLUSH]
+            stopping = any(sql is STOP for sql, _ in batch)
+            writes = [(sql, params) for sql, params in batch if isinstance(sql, str)]
+
+            try:
+                retryBusy(lambda: self.commit(connection, writes))
+            except sqlite3.Error as e:
+                self.log.warning(f"Failed to commit {len(writes)} writes: {e}")
+            finally:
+                for done in waiting:
+                    done.set()
+
+        connection.close()
+
+    def commit(self, connection, writes):
+        if not writes:
+            return
+
+        with connection:
+            for sql, params in writes:
+                try:
+                    connection.execute(sql, params)
+                except sqlite3.Error as e:
+                    # Lock errors abandon the transaction, to be retried whole
+                    if isBusy(e):
+                        raise
+                    self.log.warning(f"Failed to write {params}: {e}")
+
+
+def flushOnExit(writer):
+    """Make sure pending writes reach the DB on normal exit and on SIGTERM/SIGHUP."""
+    atexit.register(writer.close)
+
+    def handler(signum, frame):
+        writer.close()
+        signal.signal(signum, signal.SIG_DFL)
+        signal.raise_signal(signum)
+
+    for signum in (signal.SIGTERM, signal.SIGHUP):
+        signal.signal(signum, handler)
@@ -0,0 +1,73 @@
+import sqlite3
+
+import pytest
+from src.annotator import Annotator, CachedText
+from src.ed import Ed
+from src.store import Image, Store
+
+
+def test_cached_text_rebuilds_only_when_invalidated():
+    builds = []
+
+    def build():
+        builds.append(None)
+        return f"<{len(builds)}>"
+
+    text = CachedText(build)
+    first = text()
+
+    assert text() is first
+    assert first == [("", "<1>")]
+
+    text.invalidate()
+
+    assert text() == [("", "<2>")]
+    assert len(builds) == 2
+
+
+def test_skip_past_leased_metro_into_unannotated_one(store):
+    annotator = Annotator.__new__(Annotator)
+    annotator.store = store
+    annotator.showCurrent = lambda: None
+
+    # Working in BirminghamAL, which another session then takes
+    store.index = 1
+    store.addEDToCurrentImage(Ed(7))
+    annotator.curr_ed = Ed(7)
+    store.leases.metros.add(("1930", "BirminghamAL"))
+
+    annotator.skipToLastEnteredWithinMetro()
+
+    # OaklandCA has nothing entered: stay on its first image, starting from 1
+    assert store.index == 3
+    assert annotator.curr_ed == Ed(1)
+
+    annotator.addNextED()
+
+    assert list(store.images[3].eds) == ["1"]
+
+
+class Taken:
+    def __init__(self):
+        self.metros = set()
+
+    def heldByOthers(self, year, utp_code):
+        return (year, utp_code) in self.metros
+
+
+@pytest.fixture
+def store():
+    connection = sqlite3.connect(":memory:")
+    images = [
+        Image("1930", "BirminghamAL", "3:1:3Q9M-CSVR-VSRX-L", 229, 0, 3, "1037259"),
+        Image("1930", "BirminghamAL", "3:1:3Q9M-CSVR-VSR4-H", 230, 1, 3, "1037259"),
+        Image("1930", "BirminghamAL", "3:1:3Q9M-CSVR-VSTT-L", 231, 2, 3, "1037259"),
+        Image("1930", "OaklandCA", "3:1:3QHV-R32D-G1N2", 15, 0, 2, "1037259"),
+        Image("1930", "OaklandCA", "3:1:3QHV-532D-GTWB", 16, 1, 2, "1037259"),
+    ]
+    store = Store(connection.cursor(), images, leases=Taken())
+    store.populate_db()
+
+    yield store
+
+    connection.close()
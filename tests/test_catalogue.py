@@ -0,0 +1,107 @@
+import pickle
+from pathlib import Path
+
+import pytest
+import src.catalogue
+from src.catalogue import Image, ImageCatalogue, derivedPath, localFileURL
+
+
+def test_catalogue_views(catalogue):
+    assert len(catalogue) == 3
+
+    img = catalogue[1]
+
+    assert img.year == "1930"
+    assert img.utp_code == "BirminghamAL"
+    assert img.ark == "3:1:3Q9M-CSVR-VSR4-H"
+    assert img.image_index == 230
+    assert (img.metro_image_index, img.metro_image_count) == (1, 2)
+    assert catalogue[-1].utp_code == "OaklandCA"
+    assert [i.ark for i in catalogue[1:]] == [img.ark, "3:1:3QHV-R32D-G1N2"]
+
+    with pytest.raises(IndexError):
+        catalogue[3]
+
+
+def test_catalogue_interns_codes(catalogue):
+    assert catalogue.utp_codes.values == ["BirminghamAL", "OaklandCA"]
+    assert list(catalogue.utp_code_codes) == [0, 0, 1]
+
+
+def test_catalogue_eds_sparse(catalogue):
+    assert catalogue.eds == {}
+
+    catalogue[1].addED("2a")
+
+    assert list(catalogue[1].eds) == ["2A"]
+    assert catalogue.edCount(0) == 0
+    assert catalogue.edCount(1) == 1
+
+    list(catalogue)
+
+    assert list(catalogue.eds) == [1]
+
+
+def test_stale_view_removes_from_catalogue(catalogue):
+    stale, current = catalogue[1], catalogue[1]
+    current.addED("2")
+    current.addED("3")
+
+    stale.removeED("2")
+    stale.eds.discard("3")
+
+    assert list(catalogue.eds[1]) == []
+    assert catalogue.edCount(1) == 0
+
+    with pytest.raises(KeyError):
+        stale.removeED("4")
+
+
+def test_catalogue_from_images_shares_eds():
+    img = Image("1930", "BostonMA", "3:1:3QHV-532D-G98P-V", 757, 0, 1, "1037259")
+    catalogue = ImageCatalogue.fromImages([img])
+    catalogue[0].addED(7)
+
+    assert list(img.eds) == ["7"]
+
+
+def test_local_url_checked_once(catalogue, tmp_path, monkeypatch):
+    monkeypatch.setattr(src.catalogue, "imageRoot", lambda: tmp_path)
+    localFileURL.cache_clear()
+    img = catalogue[0]
+    rel_path = Path("1930/BirminghamAL/3Q9M-CSVR-VSRX-L.png")
+    derived = derivedPath(tmp_path, "screen", rel_path)
+    derived.parent.mkdir(parents=True)
+    derived.touch()
+
+    assert img.local_url == derived.as_uri()
+
+    derived.unlink()
+
+    assert img.local_url == derived.as_uri()
+    assert img.localURL() == (tmp_path / rel_path).as_uri()
+
+    localFileURL.cache_clear()
+
+
+def test_catalogue_pickle_drops_annotations(catalogue):
+    catalogue[0].addED(1)
+    catalogue.db_ids[0] = 5
+
+    loaded = pickle.loads(pickle.dumps(catalogue))
+
+    assert [img.ark for img in loaded] == [img.ark for img in catalogue]
+    assert loaded.eds == {}
+    assert loaded[0].db_id is None
+    assert loaded.fingerprint() == catalogue.fingerprint()
+
+
+@pytest.fixture
+def catalogue():
+    return ImageCatalogue.fromRows(
+        [
+            ("1930", "BirminghamAL", "3:1:3Q9M-CSVR-VSRX-L", 229, 0, 2, "1037259"),
+            ("1930", "BirminghamAL", "3:1:3Q9M-CSVR-VSR4-H", 230, 1, 2, "1037259"),
+            ("1930", "OaklandCA", "3:1:3QHV-R32D-G1N2", 15, 0, 1, "1037259"),
+        ]
+    )
@@ -0,0 +1,45 @@
+import os
+from pathlib import Path
+
+import pytest
+
+PILImage = pytest.importorskip("PIL.Image")
+
+from src.derive import LEVELS, deriveTree
+from src.catalogue import derivedPath
+
+
+@pytest.fixture
+def imageDir(tmp_path):
+    src_dir = tmp_path / "1930" / "BostonMA"
+    src_dir.mkdir(parents=True)
+    PILImage.new("RGB", (4000, 5000), "white").save(src_dir / "3QHV-532D-G98P-V.png", "JPEG")
+
+    return tmp_path
+
+
+def test_derive_levels(imageDir):
+    assert deriveTree(imageDir, workers=1) == 1
+
+    rel_path = Path("1930/BostonMA/3QHV-532D-G98P-V.png")
+
+    for level, (width, height) in LEVELS.items():
+        with PILImage.open(derivedPath(imageDir, level, rel_path)) as derived:
+            assert derived.width <= width and derived.height <= height
+            assert max(derived.width / width, derived.height / height) > 0.99
+
+
+def test_derive_only_changed(imageDir):
+    deriveTree(imageDir, workers=1)
+
+    assert deriveTree(imageDir, workers=1) == 0
+
+    # Touched but identical content is re-hashed, not re-derived
+    src_path = imageDir / "1930/BostonMA/3QHV-532D-G98P-V.png"
+    os.utime(src_path, ns=(0, 1_000_000_000))
+
+    assert deriveTree(imageDir, workers=1) == 0
+
+    PILImage.new("RGB", (3000, 3000), "black").save(src_path, "JPEG")
+
+    assert deriveTree(imageDir, workers=1) == 1
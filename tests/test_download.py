@@ -0,0 +1,171 @@
+import base64
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from src.be_nice import CachedLimiterSession
+from src.catalogue import Image
+from src.download import DO_NOT_CACHE, Downloader, mountPool
+from src.throttle import Observation
+
+BODY = b"\xff\xd8" + bytes(range(256)) * 200 + b"\xff\xd9"
+ARK = "3:1:3Q9M-CSVR-VSRX-L"
+
+
+def test_download(server, downloader, image, tmp_path):
+    path = tmp_path / "1930/BirminghamAL/3Q9M-CSVR-VSRX-L.png"
+    result = downloader.download(image, path)
+
+    assert result.error is None
+    assert path.read_bytes() == BODY
+    assert result.size == len(BODY)
+    assert result.sha256 == hashlib.sha256(BODY).hexdigest()
+    assert server.paths == ["/img/3%3A1%3A3Q9M-CSVR-VSRX-L%2Fdist.jpg"]
+
+
+def test_resume_partial(server, downloader, image, tmp_path):
+    path = tmp_path / "img.png"
+    (tmp_path / "img.png.part").write_bytes(BODY[:1000])
+
+    result = downloader.download(image, path)
+
+    assert result.error is None
+    assert path.read_bytes() == BODY
+    assert server.ranges == ["bytes=1000-"]
+    assert not (tmp_path / "img.png.part").exists()
+
+
+def test_truncated_keeps_part(server, downloader, image, tmp_path):
+    path = tmp_path / "img.png"
+    server.truncate_at = 30_000
+
+    assert downloader.download(image, path).error is not None
+    assert not path.exists()
+    assert (tmp_path / "img.png.part").stat().st_size == 30_000
+
+    server.truncate_at = None
+
+    assert downloader.download(image, path).error is None
+    assert path.read_bytes() == BODY
+
+
+def test_checksum_mismatch(server, downloader, image, tmp_path):
+    path = tmp_path / "img.png"
+    server.md5 = hashlib.md5(b"something else").digest()
+
+    assert "Content-MD5" in downloader.download(image, path).error
+    assert not path.exists()
+    assert not (tmp_path / "img.png.part").exists()
+
+
+def test_download_all_bounded(server, downloader, tmp_path):
+    images = [
+        Image("1930", "BirminghamAL", f"3:1:3Q9M-{i:04}", i, i, 10, "1037259")
+        for i in range(10)
+    ]
+    submitted = []
+
+    def jobs():
+        for img in images:
+            submitted.append(img)
+            yield img, tmp_path / f"{img.ark[4:]}.png"
+
+    results = []
+    for result in downloader.downloadAll(jobs()):
+        # Never more than 2 * workers ahead of what's been yielded
+        assert len(submitted) - len(results) <= 2 * downloader.workers
+        results.append(result)
+
+    assert sorted(r.image.ark for r in results) == sorted(i.ark for i in images)
+    assert all(r.error is None for r in results)
+
+
+def test_download_feeds_throttle(server, downloader, image, tmp_path):
+    observed = []
+
+    class RecordingThrottle:
+        def wait(self):
+            return 0
+
+        def observe(self, obs):
+            observed.append(obs)
+
+    downloader.throttle = RecordingThrottle()
+    downloader.download(image, tmp_path / "a.png")
+    server.fail_status = 429
+    result = downloader.download(image, tmp_path / "b.png")
+
+    assert result.status == 429
+    assert observed[0].ok and observed[0].size == len(BODY)
+    assert observed[1] == Observation(False, observed[1].latency, 429, 0)
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        server = self.server
+        server.paths.append(self.path)
+        start = 0
+
+        if server.fail_status:
+            self.send_response(server.fail_status)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        if (header := self.headers.get("Range")) is not None:
+            server.ranges.append(header)
+            start = int(header.removeprefix("bytes=").removesuffix("-"))
+
+        if start:
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{len(BODY) - 1}/{len(BODY)}")
+        else:
+            self.send_response(200)
+            md5 = server.md5 or hashlib.md5(BODY).digest()
+            self.send_header("Content-MD5", base64.b64encode(md5).decode())
+
+        self.send_header("Content-Length", str(len(BODY) - start))
+        self.end_headers()
+
+        end = server.truncate_at or len(BODY)
+        self.wfile.write(BODY[start:end])
+
+        if server.truncate_at:
+            self.close_connection = True
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    server.paths = []
+    server.ranges = []
+    server.md5 = None
+    server.truncate_at = None
+    server.fail_status = None
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    yield server
+
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def downloader(server):
+    session = CachedLimiterSession(
+        backend="memory", expire_after=DO_NOT_CACHE, per_second=1000
+    )
+    mountPool(session, 2)
+    url = f"http://127.0.0.1:{server.server_address[1]}/img/{{}}"
+
+    return Downloader(session, url_template=url, workers=2, timeout=5, min_size=1000)
+
+
+@pytest.fixture
+def image():
+    return Image("1930", "BirminghamAL", ARK, 229, 0, 3, "1037259")
@@ -0,0 +1,108 @@
+import sqlite3
+
+import pyarrow.dataset as ds
+import pytest
+from src.ed import Ed
+from src.export import STATE_NAME, Exporter
+from src.store import Image, Store
+
+
+def test_full_export(store, exporter, tmp_path):
+    annotate(store, 0, "1", "2")
+    annotate(store, 3, "7A")
+
+    assert exporter.export() == [(1930, "BirminghamAL"), (1930, "OaklandCA")]
+    assert (tmp_path / "out" / STATE_NAME).exists()
+
+    table = read(tmp_path).sort_by([("image_id", "ascending"), ("ed_id", "ascending")])
+    rows = table.select(["utp_code", "ark", "name", "ed_num", "ed_suffix"]).to_pylist()
+
+    assert len(rows) == 6  # images without EDs are kept, with null EDs
+    assert rows[0] == {
+        "utp_code": "BirminghamAL",
+        "ark": "3:1:3Q9M-CSVR-VSRX-L",
+        "name": "1",
+        "ed_num": 1,
+        "ed_suffix": "",
+    }
+    assert rows[2]["name"] is None
+    assert rows[4]["name"] == "7A" and rows[4]["ed_suffix"] == "A"
+    assert table.column("year").to_pylist() == [1930] * 6
+    assert table.column("created_at").null_count == 3
+
+
+def test_only_changed_metros_rewritten(store, exporter, tmp_path):
+    annotate(store, 0, "1")
+    exporter.export()
+
+    assert exporter.export() == []
+
+    annotate(store, 4, "3")
+
+    assert exporter.export() == [(1930, "OaklandCA")]
+    assert read(tmp_path).filter(ds.field("name") == "3").num_rows == 1
+
+
+def test_deletions_rewrite_metro(store, exporter, tmp_path):
+    annotate(store, 0, "1", "2")
+    exporter.export()
+
+    store.index = 0
+    store.removeLastED()
+
+    assert exporter.export() == [(1930, "BirminghamAL")]
+    assert read(tmp_path).filter(ds.field("name") == "2").num_rows == 0
+
+
+def test_reused_id(store, exporter, tmp_path):
+    annotate(store, 0, "1", "2")
+    exporter.export()
+
+    # The newest ED's id is free again once it's deleted
+    store.index = 0
+    store.removeLastED()
+    annotate(store, 4, "5")
+
+    assert exporter.export() == [(1930, "BirminghamAL"), (1930, "OaklandCA")]
+    assert read(tmp_path).filter(ds.field("name") == "5").num_rows == 1
+
+
+def test_batches(store, tmp_path):
+    annotate(store, 0, *[str(n) for n in range(1, 12)])
+    exporter = Exporter(store.db, tmp_path / "out", batch_size=4)
+    exporter.export()
+
+    assert read(tmp_path).num_rows == 11 + 4
+
+
+def annotate(store, index, *names):
+    store.index = index
+    for name in names:
+        store.addEDToCurrentImage(Ed.from_str(name))
+
+
+def read(tmp_path):
+    return ds.dataset(tmp_path / "out", format="parquet", partitioning="hive").to_table()
+
+
+@pytest.fixture
+def store():
+    connection = sqlite3.connect(":memory:")
+    images = [
+        Image("1930", "BirminghamAL", "3:1:3Q9M-CSVR-VSRX-L", 229, 0, 3, "1037259"),
+        Image("1930", "BirminghamAL", "3:1:3Q9M-CSVR-VSR4-H", 230, 1, 3, "1037259"),
+        Image("1930", "BirminghamAL", "3:1:3Q9M-CSVR-VSTT-L", 231, 2, 3, "1037259"),
+        Image("1930", "OaklandCA", "3:1:3QHV-R32D-G1N2", 15, 0, 2, "1037259"),
+        Image("1930", "OaklandCA", "3:1:3QHV-532D-GTWB", 16, 1, 2, "1037259"),
+    ]
+    store = Store(connection.cursor(), images)
+    store.populate_db()
+
+    yield store
+
+    connection.close()
+
+
+@pytest.fixture
+def exporter(store, tmp_path):
+    return Exporter(store.db, tmp_path / "out")
@@ -0,0 +1,32 @@
+import sqlite3
+
+from bench.generate import DATA_DIR, corpus_metros, generate_corpus
+from src.store import Store
+from src.utils import buildImageList
+
+
+def test_corpus_metros_total():
+    metros = corpus_metros(5_000)
+
+    assert sum(size for _, _, size in metros) == 5_000
+    assert len({utp_code for _, utp_code, _ in metros}) == len(metros)
+
+
+def test_generated_corpus_loads(tmp_path):
+    work_dir = generate_corpus(tmp_path, 2_000, fraction=0.5)
+    images = buildImageList(tmp_path / DATA_DIR, tmp_path / "snapshot")
+
+    assert len(images) == 2_000
+    assert len(set(images.arkList())) == 2_000
+
+    connection = sqlite3.connect(work_dir / "annotated.db")
+    store = Store(connection.cursor(), images)
+    store.populate_db()
+
+    annotated = [i for i in range(len(images)) if images.edCount(i)]
+    assert annotated == list(range(1_000))
+
+    # EDs climb through each metro, numerically
+    store.index = 999
+    largest = store.largestEDForCurrentMetro()
+    assert int(largest.rstrip("A")) >= int(images[999].lastED().rstrip("A"))
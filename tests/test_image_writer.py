@@ -0,0 +1,100 @@
+import base64
+import hashlib
+
+import pytest
+from src.catalogue import Image
+from src.image_writer import BodyReader, ImageWriter
+
+DATA = bytes(range(256)) * 400
+
+
+def test_write_replaces_atomically(writer, image, tmp_path):
+    path = tmp_path / "1930/BirminghamAL/3Q9M-CSVR-VSRX-L.png"
+    writer.write(image, path, iter([DATA[:50_000], DATA[50_000:]]))
+    writer.close()
+
+    (result,) = writer.completed()
+
+    assert result.error is None
+    assert result.size == len(DATA)
+    assert result.sha256 == hashlib.sha256(DATA).hexdigest()
+    assert path.read_bytes() == DATA
+    assert list(path.parent.iterdir()) == [path]
+
+
+def test_failed_read_keeps_previous_file(writer, image, tmp_path):
+    path = tmp_path / "img.png"
+    path.write_bytes(b"previous")
+
+    def chunks():
+        yield DATA[:50_000]
+        raise RuntimeError("No resource with given identifier found")
+
+    writer.write(image, path, chunks())
+    writer.write(image, tmp_path / "small.png", iter([b"tiny"]))
+    writer.close()
+
+    results = sorted(writer.completed(), key=lambda r: r.path.name)
+
+    assert "No resource" in results[0].error
+    assert results[1].error == "Only 4 bytes"
+    assert path.read_bytes() == b"previous"
+    assert list(tmp_path.iterdir()) == [path]
+
+
+def test_many_images_across_threads(writer, tmp_path):
+    images = [
+        Image("1930", "BirminghamAL", f"3:1:3Q9M-{i:04}", i, i, 10, "1037259")
+        for i in range(10)
+    ]
+
+    for i, img in enumerate(images):
+        body = bytes([i]) * 30_000
+        writer.write(img, tmp_path / f"{i}.png", iter([body[:7], body[7:]]))
+    writer.close()
+
+    assert len(list(writer.completed())) == 10
+    for i in range(10):
+        assert (tmp_path / f"{i}.png").read_bytes() == bytes([i]) * 30_000
+
+
+def test_body_reader_decodes_in_chunks():
+    driver = FakeDriver()
+    reader = BodyReader(driver, chunk_size=3000)
+
+    chunks = list(reader.chunks("7"))
+
+    assert b"".join(chunks) == DATA
+    assert max(len(chunk) for chunk in chunks) <= 3000
+    assert driver.commands == [("Network.getResponseBody", {"requestId": "7"})]
+
+
+def test_body_reader_plain_text_body():
+    driver = FakeDriver(body="x" * 7000, encoded=False)
+    reader = BodyReader(driver, chunk_size=3000)
+
+    assert [len(chunk) for chunk in reader.chunks("7")] == [3000, 3000, 1000]
+
+
+class FakeDriver:
+    def __init__(self, body=None, encoded=True):
+        self.body = base64.b64encode(DATA).decode() if body is None else body
+        self.encoded = encoded
+        self.commands = []
+
+    def execute_cdp_cmd(self, cmd, params):
+        self.commands.append((cmd, params))
+
+        if cmd == "Network.getResponseBody":
+            return {"body": self.body, "base64Encoded": self.encoded}
+        return {}
+
+
+@pytest.fixture
+def writer():
+    return ImageWriter(threads=2, max_chunks=2, min_size=1000)
+
+
+@pytest.fixture
+def image():
+    return Image("1930", "BirminghamAL", "3:1:3Q9M-CSVR-VSRX-L", 229, 0, 3, "1037259")
@@ -0,0 +1,118 @@
+import json
+
+import pytest
+from prompt_toolkit.key_binding import KeyBindings
+from src.latency import Histogram, LatencyRecorder, Timed
+
+
+def test_histogram_percentiles():
+    h = Histogram()
+    for _ in range(98):
+        h.add(0.0001)
+    h.add(0.01)
+    h.add(0.5)
+
+    assert h.count == 100
+    assert h.max == 0.5
+    assert h.mean == pytest.approx((98 * 0.0001 + 0.51) / 100)
+    # Bucket upper bounds: 100 µs lands in the 128 µs bucket
+    assert h.percentile(50) == pytest.approx(128e-6)
+    assert h.percentile(99) == pytest.approx(2**14 / 1e6)
+    assert h.percentile(100) == 0.5
+
+
+def test_phases_split_handler_time(clock, recorder):
+    cursor = Timed(Cursor(clock), recorder, "db", ("execute",))
+
+    def handler(event):
+        clock.now += 0.002  # Store work
+        cursor.execute("UPDATE")
+        with recorder.phase("browser"):
+            clock.now += 0.010
+
+    recorder.wrap("n", handler)(None)
+    clock.now += 0.005
+    recorder.rendered()
+
+    sample = recorder.last
+    assert sample.action == "n"
+    assert sample.phases["store"] == pytest.approx(0.002)
+    assert sample.phases["db"] == pytest.approx(0.001)
+    assert sample.phases["browser"] == pytest.approx(0.010)
+    assert sample.phases["redraw"] == pytest.approx(0.005)
+    assert sample.phases["total"] == pytest.approx(0.018)
+    assert recorder.histograms["n"]["total"].count == 1
+
+
+def test_outside_handlers_not_recorded(clock, recorder):
+    cursor = Timed(Cursor(clock), recorder, "db", ("execute",))
+
+    assert cursor.execute("SELECT") == "SELECT"
+    assert cursor.connection == "connection"
+    recorder.rendered()
+
+    assert recorder.histograms == {}
+
+
+def test_keys_faster_than_renders(clock, recorder):
+    recorder.wrap("n", lambda event: None)(None)
+    clock.now += 0.001
+    recorder.wrap(">", lambda event: None)(None)
+    recorder.rendered()
+
+    assert recorder.histograms["n"]["total"].count == 1
+    assert recorder.histograms[">"]["total"].count == 1
+
+
+def test_instrument_and_dump(clock, recorder, tmp_path):
+    kb = KeyBindings()
+    pressed = []
+
+    @kb.add("n")
+    @kb.add("c-y")
+    def _(event):
+        pressed.append(event)
+
+    recorder.instrument(kb)
+    for binding in kb.bindings:
+        binding.handler("event")
+        recorder.rendered()
+
+    path = tmp_path / "latency.json"
+    recorder.dump(path)
+    report = json.loads(path.read_text())
+
+    assert pressed == ["event", "event"]
+    assert sorted(report) == ["c-y", "n"]
+    assert report["n"]["total"]["count"] == 1
+    assert "p99_ms" in report["n"]["db"]
+    assert recorder.toolbarText().startswith(f"{recorder.last.action}: 0.0 ms")
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class Cursor:
+    connection = "connection"
+
+    def __init__(self, clock):
+        self.clock = clock
+
+    def execute(self, sql):
+        self.clock.now += 0.001
+        return sql
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+@pytest.fixture
+def recorder(clock):
+    return LatencyRecorder(clock)
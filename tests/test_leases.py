@@ -0,0 +1,138 @@
+import sqlite3
+import time
+
+import pytest
+from src.leases import LEASE_TTL, REFRESH_INTERVAL, Leases
+from src.migrations import migrate
+
+
+def test_claim_excludes_others(db_path, clock):
+    alice = Leases(db_path, "alice", clock=clock)
+    bob = Leases(db_path, "bob", clock=clock)
+
+    assert alice.claim("1930", "BostonMA")
+    assert not bob.claim("1930", "BostonMA")
+    assert bob.holderOf("1930", "BostonMA") == "alice"
+    assert bob.claim("1930", "OaklandCA")
+
+    clock.now += REFRESH_INTERVAL
+    assert alice.heldByOthers(1930, "OaklandCA")
+    assert not alice.heldByOthers(1930, "BostonMA")
+
+
+def test_moving_on_releases(db_path, clock):
+    alice = Leases(db_path, "alice", clock=clock)
+    bob = Leases(db_path, "bob", clock=clock)
+
+    alice.claim("1930", "BostonMA")
+    alice.claim("1930", "OaklandCA")
+
+    assert bob.claim("1930", "BostonMA")
+
+    alice.close()
+
+    # Still taken as far as Bob knows, until his next refresh
+    assert not bob.claim("1930", "OaklandCA")
+
+    clock.now += REFRESH_INTERVAL
+
+    assert bob.claim("1930", "OaklandCA")
+
+
+def test_leases_expire_unless_renewed(db_path, clock):
+    alice = Leases(db_path, "alice", clock=clock)
+    bob = Leases(db_path, "bob", clock=clock)
+
+    alice.claim("1930", "BostonMA")
+    clock.now += LEASE_TTL / 2
+    alice.claim("1930", "BostonMA")  # renews
+    clock.now += LEASE_TTL * 0.9
+
+    assert not bob.claim("1930", "BostonMA")
+
+    # Alice's session died
+    clock.now += LEASE_TTL
+
+    assert bob.claim("1930", "BostonMA")
+    assert not alice.claim("1930", "BostonMA")
+
+
+def test_taken_metro_not_asked_for_again(db_path, clock):
+    alice = Leases(db_path, "alice", clock=clock)
+    bob = Leases(db_path, "bob", clock=clock)
+
+    alice.claim("1930", "BostonMA")
+    assert not bob.claim("1930", "BostonMA")
+
+    connection, bob.connection = bob.connection, Unusable()
+
+    assert not bob.claim("1930", "BostonMA")
+
+    bob.connection = connection
+    clock.now += REFRESH_INTERVAL
+    alice.release()
+
+    assert bob.claim("1930", "BostonMA")
+
+
+def test_lease_renewed_while_held(db_path, clock):
+    alice = Leases(db_path, "alice", clock=clock)
+    bob = Leases(db_path, "bob", clock=clock)
+
+    alice.claim("1930", "BostonMA")
+    clock.now += LEASE_TTL / 2
+    alice.renew(alice.connection)
+    clock.now += LEASE_TTL * 0.9
+
+    assert not bob.claim("1930", "BostonMA")
+
+    # Lost while stalled: the renewer notices
+    clock.now += LEASE_TTL
+    assert bob.claim("1930", "BostonMA")
+    alice.renew(alice.connection)
+
+    assert alice.held is None
+
+
+def test_renewer_runs_in_background(db_path, clock):
+    alice = Leases(db_path, "alice", clock=clock, renew_every=0.01)
+    alice.claim("1930", "BostonMA")
+    clock.now += LEASE_TTL / 2
+
+    deadline = time.monotonic() + 5
+    while alice.expires_at < clock.now + LEASE_TTL and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert alice.expires_at == clock.now + LEASE_TTL
+
+    alice.close()
+
+    assert not alice.renewer.is_alive()
+
+
+class Unusable:
+    def execute(self, *args):
+        raise AssertionError("Queried the DB")
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = tmp_path / "annotated.db"
+    connection = sqlite3.connect(path)
+    migrate(connection.cursor())
+    connection.close()
+
+    return path
@@ -0,0 +1,121 @@
+import sqlite3
+
+import pytest
+from src.lookup import Lookup, readQueries
+from src.store import Image, Store
+
+
+def test_find(store, lookup):
+    store.insertED(1, "12A")
+    store.insertED(1, "13")
+    store.insertED(2, "12A")
+    store.insertED(3, "12A")
+
+    matches = lookup.find(1930, "BirminghamAL", "12a")
+
+    assert [(m.ark, m.name) for m in matches] == [
+        ("3:1:3Q9M-CSVR-VSR4-H", "12A"),
+        ("3:1:3Q9M-CSVR-VSTT-L", "12A"),
+    ]
+    assert matches[0].url == store.images[1].url
+    assert matches[0].local_url == store.images[1].local_url
+    assert lookup.find("1930", "OaklandCA", "012A")[0].image_index == 15
+
+
+def test_find_nothing(store, lookup):
+    store.insertED(0, "7")
+
+    assert lookup.find(1930, "BirminghamAL", "8") == []
+    assert lookup.find(1930, "BirminghamAL", "7B") == []
+    assert lookup.find(1930, "OaklandCA", "7") == []
+    assert lookup.find(1930, "BirminghamAL", "Blank") == []
+
+
+def test_find_all(store, lookup):
+    store.insertED(0, "1")
+    store.insertED(1, "1")
+    store.insertED(4, "5")
+
+    queries = [
+        ("1930", "OaklandCA", "5"),
+        ("1930", "BirminghamAL", "2"),
+        ("1930", "BirminghamAL", "1"),
+        ("1930", "BirminghamAL", ""),
+    ]
+    results = list(lookup.findAll(queries))
+
+    assert [(query, m and m.ark) for query, m in results] == [
+        (queries[0], "3:1:3QHV-532D-GTWB"),
+        (queries[1], None),
+        (queries[2], "3:1:3Q9M-CSVR-VSRX-L"),
+        (queries[2], "3:1:3Q9M-CSVR-VSR4-H"),
+        (queries[3], None),
+    ]
+
+    # The temporary table is emptied for the next batch
+    assert [m.name for _, m in lookup.findAll([queries[0]])] == ["5"]
+
+
+def test_read_queries_skips_malformed_rows(tmp_path):
+    csv_path = tmp_path / "eds.csv"
+    csv_path.write_text(
+        "year,utp_code,ed\n"
+        "1930,OaklandCA,5\n"
+        ",OaklandCA,5\n"
+        "19x0,OaklandCA,5\n"
+        "1930,BirminghamAL\n"
+        "1940,RenoNV,12A\n"
+    )
+    warnings = []
+
+    class Log:
+        def warning(self, message):
+            warnings.append(message)
+
+    assert readQueries(csv_path, Log()) == [
+        ("1930", "OaklandCA", "5"),
+        ("1940", "RenoNV", "12A"),
+    ]
+    assert [w.split(" of ")[0] for w in warnings] == [
+        "Skipping line 3",
+        "Skipping line 4",
+        "Skipping line 5",
+    ]
+
+
+def test_lookup_uses_index(store, lookup):
+    plan = " ".join(
+        row[-1]
+        for row in store.db.execute(
+            """
+            EXPLAIN QUERY PLAN
+            SELECT image_id FROM eds
+            WHERE year = 1930 AND utp_code = 'OaklandCA' AND ed_num = 5 AND ed_suffix = ''
+            """
+        )
+    )
+
+    assert "eds_metro_ed" in plan
+
+
+@pytest.fixture
+def store():
+    connection = sqlite3.connect(":memory:")
+    images = [
+        Image("1930", "BirminghamAL", "3:1:3Q9M-CSVR-VSRX-L", 229, 0, 3, "1037259"),
+        Image("1930", "BirminghamAL", "3:1:3Q9M-CSVR-VSR4-H", 230, 1, 3, "1037259"),
+        Image("1930", "BirminghamAL", "3:1:3Q9M-CSVR-VSTT-L", 231, 2, 3, "1037259"),
+        Image("1930", "OaklandCA", "3:1:3QHV-R32D-G1N2", 15, 0, 2, "1037259"),
+        Image("1930", "OaklandCA", "3:1:3QHV-532D-GTWB", 16, 1, 2, "1037259"),
+    ]
+    store = Store(connection.cursor(), images)
+    store.populate_db()
+
+    yield store
+
+    connection.close()
+
+
+@pytest.fixture
+def lookup(store):
+    return Lookup(store.db)
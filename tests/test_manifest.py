@@ -0,0 +1,178 @@
+import pytest
+from src.catalogue import Image, ImageCatalogue
+from src.manifest import Manifest
+
+ROWS = [
+    ("1930", "BirminghamAL", "3:1:3Q9M-CSVR-VSRX-L", 229, 0, 2, "1037259"),
+    ("1930", "BirminghamAL", "3:1:3Q9M-CSVR-VSR4-H", 230, 1, 2, "1037259"),
+    ("1940", "OaklandCA", "3:1:3QHV-R32D-G1N2", 15, 0, 1, "1037260"),
+]
+
+
+def test_remaining_after_outcomes(manifest, catalogue):
+    manifest.sync(catalogue)
+
+    assert remaining(manifest) == [0, 1, 2]
+
+    manifest.recordWritten(catalogue[1].ark, 30_000, "abc")
+    manifest.recordFailed(catalogue[2].ark, "Timed out")
+
+    assert remaining(manifest) == [0, 2]
+    assert manifest.status(catalogue[1].ark) == ("done", 30_000, "abc", 1, None)
+    assert manifest.status(catalogue[2].ark) == ("failed", None, None, 1, "Timed out")
+
+
+def test_failure_never_demotes_done(manifest, catalogue):
+    manifest.sync(catalogue)
+    manifest.recordWritten(catalogue[0].ark, 30_000, "abc")
+    manifest.recordFailed(catalogue[0].ark, "Only 900 bytes")
+
+    assert manifest.status(catalogue[0].ark)[0] == "done"
+
+
+def test_sync_bootstraps_from_disk_once(manifest, catalogue):
+    asked = []
+
+    def existing_size(img):
+        asked.append(img.ark)
+        return 25_000 if img.image_index == 230 else None
+
+    manifest.sync(catalogue, existing_size)
+
+    assert len(asked) == 3
+    assert remaining(manifest) == [0, 2]
+
+    # A grown catalogue only asks about the new ark
+    grown = ImageCatalogue.fromRows(
+        [("1930", "AkronOH", "3:1:3QHV-NEW1", 1, 0, 1, "1037261")] + ROWS
+    )
+    asked.clear()
+    manifest.sync(grown, existing_size)
+
+    assert asked == ["3:1:3QHV-NEW1"]
+    assert remaining(manifest) == [0, 1, 3]
+
+
+def test_sync_drops_removed_images(manifest, catalogue):
+    manifest.sync(catalogue)
+    manifest.sync(ImageCatalogue.fromRows(ROWS[1:]))
+
+    assert remaining(manifest) == [0, 1]
+    assert [row[:2] for row in manifest.summary()] == [
+        (1930, "BirminghamAL"),
+        (1940, "OaklandCA"),
+    ]
+
+
+def test_pending_streams_and_records(manifest, catalogue):
+    manifest.sync(catalogue)
+    manifest.recordWritten(catalogue[0].ark, 30_000)
+    asked = []
+
+    def existing_size(img):
+        asked.append(img.ark)
+        return 25_000
+
+    new = Image("1940", "OaklandCA", "3:1:3QHV-NEW1", 16, 1, 1, "1037260")
+    stream = manifest.pending(iter(list(catalogue) + [new]), existing_size)
+
+    assert next(stream).ark == catalogue[1].ark
+    assert [img.ark for img in stream] == [catalogue[2].ark]
+
+    # Only the unseen ark is looked for on disk, and it's recorded as done
+    assert asked == ["3:1:3QHV-NEW1"]
+    assert manifest.status(new.ark)[:2] == ("done", 25_000)
+    assert remaining(manifest) == [1, 2]
+
+
+def test_pending_without_sync(tmp_path, catalogue):
+    manifest = Manifest(tmp_path / "manifest.db")
+
+    assert [img.ark for img in manifest.pending(catalogue)] == [
+        img.ark for img in catalogue
+    ]
+
+    manifest.recordWritten(catalogue[1].ark, 30_000)
+    manifest.close()
+
+    manifest = Manifest(tmp_path / "manifest.db")
+
+    # Streamed arks get their positions at the next sync
+    assert remaining(manifest) == []
+    assert manifest.status(catalogue[0].ark)[0] == "pending"
+    assert [img.ark for img in manifest.pending(catalogue)] == [
+        catalogue[0].ark,
+        catalogue[2].ark,
+    ]
+
+
+def test_pending_follows_moved_ark(manifest, catalogue):
+    manifest.sync(catalogue)
+    manifest.recordWritten(catalogue[2].ark, 30_000)
+    moved = Image("1930", "AkronOH", catalogue[2].ark, 1, 0, 1, "1037260")
+
+    assert list(manifest.pending([moved])) == []
+    assert manifest.summary()[-1][:2] == (1930, "AkronOH")
+
+
+def test_metro_finished(manifest, catalogue):
+    manifest.sync(catalogue)
+    manifest.recordWritten(catalogue[0].ark, 30_000)
+    manifest.recordWritten(catalogue[1].ark, 30_000)
+    finished = manifest.metroFinished()
+
+    assert finished("1930", "BirminghamAL", 2)
+    assert not finished("1930", "BirminghamAL", 3)  # one the manifest hasn't seen
+    assert not finished("1940", "OaklandCA", 1)
+    assert not finished("1930", "AkronOH", 1)
+
+
+def test_summary_and_throughput(manifest, catalogue):
+    manifest.sync(catalogue)
+
+    assert manifest.throughput() is None
+
+    manifest.recordWritten(catalogue[0].ark, 30_000)
+    manifest.recordFailed(catalogue[2].ark, "Timed out")
+    manifest.db.execute("UPDATE downloads SET updated_at = 100 WHERE position = 0")
+    manifest.recordWritten(catalogue[1].ark, 30_000)
+    manifest.db.execute("UPDATE downloads SET updated_at = 110 WHERE position = 1")
+
+    assert manifest.summary() == [
+        (1930, "BirminghamAL", 2, 0, 0),
+        (1940, "OaklandCA", 0, 1, 0),
+    ]
+    assert manifest.throughput() == pytest.approx(0.1)
+
+
+def test_manifest_persists(tmp_path, catalogue):
+    manifest = Manifest(tmp_path / "manifest.db")
+    manifest.sync(catalogue)
+    manifest.recordWritten(catalogue[0].ark, 30_000)
+    manifest.close()
+
+    assert remaining(Manifest(tmp_path / "manifest.db")) == [1, 2]
+
+
+def remaining(manifest):
+    """Catalogue positions of every image not yet downloaded."""
+    return [
+        position
+        for position, in manifest.db.execute(
+            """
+            SELECT position FROM downloads
+            WHERE status != 'done' AND position IS NOT NULL
+            ORDER BY position
+            """
+        )
+    ]
+
+
+@pytest.fixture
+def manifest():
+    return Manifest(":memory:")
+
+
+@pytest.fixture
+def catalogue():
+    return ImageCatalogue.fromRows(ROWS)
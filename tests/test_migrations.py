@@ -0,0 +1,86 @@
+import sqlite3
+
+import pytest
+from src.migrations import MIGRATIONS, migrate, schemaVersion
+
+
+@pytest.fixture
+def test_db():
+    connection = sqlite3.connect(":memory:")
+    cursor = connection.cursor()
+
+    yield cursor
+
+    connection.close()
+
+
+def test_migrate_fresh(test_db):
+    assert schemaVersion(test_db) == 0
+    assert migrate(test_db) == len(MIGRATIONS)
+    assert migrate(test_db) == len(MIGRATIONS)
+
+
+def test_migrate_unversioned_db(test_db):
+    # Schema as created before migrations existed
+    test_db.executescript(
+        """
+        CREATE TABLE images (
+            id INTEGER PRIMARY KEY, year INTEGER NOT NULL, utp_code VARCHAR NOT NULL,
+            ark VARCHAR NOT NULL, image_index INTEGER NOT NULL, cat INTEGER NOT NULL,
+            UNIQUE(ark));
+        CREATE TABLE eds (
+            id INTEGER PRIMARY KEY, image_id INTEGER NOT NULL, name VARCHAR,
+            created_at INTEGER DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (image_id) REFERENCES images (id), UNIQUE(image_id, name));
+        INSERT INTO images VALUES (1, 1930, 'OaklandCA', '3:1:3QHV-R32D-G1N2', 15, 1037259);
+        INSERT INTO eds (image_id, name) VALUES (1, '9'), (1, '10'), (1, '10A'), (1, 'X');
+        """
+    )
+
+    migrate(test_db)
+
+    rows = test_db.execute(
+        "SELECT name, ed_num, ed_suffix, year, utp_code FROM eds ORDER BY id"
+    ).fetchall()
+
+    assert rows == [
+        ("9", 9, "", 1930, "OaklandCA"),
+        ("10", 10, "", 1930, "OaklandCA"),
+        ("10A", 10, "A", 1930, "OaklandCA"),
+        ("X", None, "", 1930, "OaklandCA"),
+    ]
+
+
+def test_unparsed_names_stored_like_new_eds(test_db):
+    migrate(test_db, MIGRATIONS[:4])
+    test_db.executescript(
+        """
+        INSERT INTO images VALUES (1, 1930, 'OaklandCA', '3:1:3QHV-R32D-G1N2', 15, 1037259);
+        INSERT INTO eds (image_id, name, ed_num, ed_suffix) VALUES (1, 'Blank', 0, 'Blank');
+        INSERT INTO eds (image_id, name, ed_num, ed_suffix) VALUES (1, '12A', 12, 'A');
+        """
+    )
+
+    # Rows backfilled before the backfill skipped names without a number
+    migrate(test_db)
+
+    rows = test_db.execute("SELECT name, ed_num, ed_suffix FROM eds ORDER BY id")
+
+    assert rows.fetchall() == [("Blank", None, ""), ("12A", 12, "A")]
+
+
+def test_largest_ed_uses_index(test_db):
+    migrate(test_db)
+
+    plan = test_db.execute(
+        """
+        EXPLAIN QUERY PLAN
+        SELECT name FROM eds WHERE year = ? AND utp_code = ?
+        ORDER BY ed_num DESC, ed_suffix DESC LIMIT 1
+        """,
+        (1930, "OaklandCA"),
+    ).fetchall()
+    details = " ".join(row[-1] for row in plan)
+
+    assert "COVERING INDEX eds_metro_ed" in details
+    assert "TEMP B-TREE" not in details
@@ -0,0 +1,72 @@
+import threading
+
+import pytest
+
+from src.navigator import Navigator
+
+
+def test_commands_run_in_order(navigator):
+    ran = []
+
+    for i in range(5):
+        navigator.submit(lambda i=i: ran.append(i))
+    navigator.wait()
+
+    assert ran == [0, 1, 2, 3, 4]
+
+
+def test_keyed_commands_coalesce(navigator):
+    ran = []
+    started = threading.Event()
+    release = threading.Event()
+
+    def slow():
+        started.set()
+        release.wait()
+        ran.append("slow")
+
+    navigator.submit(slow, key="show")
+    started.wait()
+
+    for i in range(50):
+        navigator.submit(lambda i=i: ran.append(i), key="show")
+    navigator.submit(lambda: ran.append("open"))
+    navigator.submit(lambda: ran.append(50), key="show")
+    navigator.submit(lambda: ran.append(51), key="show")
+
+    release.set()
+    navigator.wait()
+
+    assert ran == ["slow", 49, "open", 51]
+
+
+def test_failures_dont_stop_the_thread(navigator):
+    ran = []
+
+    navigator.submit(lambda: 1 / 0)
+    navigator.submit(lambda: ran.append(True))
+    navigator.wait()
+
+    assert ran == [True]
+
+
+def test_close_drops_pending():
+    navigator = Navigator()
+    ran = []
+    release = threading.Event()
+
+    navigator.submit(release.wait)
+    navigator.submit(lambda: ran.append(True))
+    threading.Timer(0.05, release.set).start()
+    navigator.close()
+    navigator.submit(lambda: ran.append(True))
+
+    assert ran == []
+    assert not navigator.thread.is_alive()
+
+
+@pytest.fixture
+def navigator():
+    navigator = Navigator()
+    yield navigator
+    navigator.close()
@@ -0,0 +1,100 @@
+import sqlite3
+
+import pytest
+from src.catalogue import ImageCatalogue
+from src.ed import Ed
+from src.predict import EDPredictor, Prediction, edRange
+from src.store import Store
+
+
+def test_ed_range():
+    assert edRange(["12", "13A", "14"]) == (3, 12, 14)
+    assert edRange(["X"]) == (1, -1, -1)
+    assert edRange([]) == (0, -1, -1)
+
+
+def test_predicts_from_metro(store):
+    # Two EDs per image, each image starting where the last ended
+    annotate(store, range(0, 8), lambda i: [i + 1, i + 2])
+    predictor = EDPredictor(store)
+
+    assert predictor.predict(8) == Prediction(2, True, "metro")
+    assert predictor.predict(0) == Prediction(2, False, "metro")
+
+
+def test_falls_back_to_year_then_default(store):
+    annotate(store, range(0, 8), lambda i: [i + 1])
+    predictor = EDPredictor(store)
+
+    assert predictor.predict(25) == Prediction(1, False, "year")
+    assert predictor.predict(45) == Prediction(1, False, "default")
+
+
+def test_incremental_matches_bulk(store):
+    annotate(store, range(0, 6), lambda i: [2 * i + 1, 2 * i + 2])
+    predictor = EDPredictor(store)
+    store.on_changed = predictor.update
+
+    store.index = 6
+    for ed in range(13, 40, 3):
+        store.addEDToCurrentImage(Ed(ed))
+        next(store)
+    store.undo()
+    store.index = 2
+    store.removeLastED()
+    store.index = 20
+    store.addEDToCurrentImage("X")
+
+    bulk = EDPredictor(store)
+
+    assert (predictor.metro_counts == bulk.metro_counts).all()
+    assert (predictor.metro_gaps == bulk.metro_gaps).all()
+    assert (predictor.year_counts == bulk.year_counts).all()
+    assert (predictor.year_gaps == bulk.year_gaps).all()
+    assert (predictor.counts == bulk.counts).all()
+    assert (predictor.lows == bulk.lows).all()
+    assert (predictor.highs == bulk.highs).all()
+
+
+def test_ignores_eds_of_dropped_images(store):
+    annotate(store, range(0, 60), lambda i: [i + 1])
+
+    # The CSV shrinks: a middle image and the last one are gone, but their
+    # rows and EDs stay in the DB
+    images = ImageCatalogue.fromRows(
+        (year, utp, ark, image_index, image_index, 20, cat)
+        for i, (year, utp, ark, image_index, cat) in enumerate(store.images.rows())
+        if i not in (10, 59)
+    )
+    shrunk = Store(store.db, images)
+    shrunk.populate_db()
+
+    predictor = EDPredictor(shrunk)
+
+    assert predictor.counts.sum() == 58
+    assert predictor.lows[9:11].tolist() == [10, 12]
+    assert predictor.highs[-1] == 59
+
+
+def annotate(store, indices, eds):
+    for index in indices:
+        store.index = index
+        for ed in eds(index):
+            store.addEDToCurrentImage(Ed(ed))
+
+
+@pytest.fixture
+def store():
+    # Two 1930 metros of 20 images, then a 1940 one
+    images = ImageCatalogue.fromRows(
+        (year, utp, f"3:1:3QHV-{utp}-{i:04}", i, i, 20, "1037259")
+        for year, utp in (("1930", "BostonMA"), ("1930", "OaklandCA"), ("1940", "RenoNV"))
+        for i in range(20)
+    )
+    connection = sqlite3.connect(":memory:")
+    store = Store(connection.cursor(), images)
+    store.populate_db()
+
+    yield store
+
+    connection.close()
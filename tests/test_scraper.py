@@ -0,0 +1,66 @@
+import pytest
+from src.catalogue import ImageCatalogue
+from src.image_writer import WriteResult
+from src.manifest import Manifest
+from src.scraper import Scraper
+
+ROWS = [
+    ("1930", "BirminghamAL", "3:1:3Q9M-CSVR-VSRX-L", 229, 0, 3, "1037259"),
+    ("1930", "BirminghamAL", "3:1:3Q9M-CSVR-VSR4-H", 230, 1, 3, "1037259"),
+    ("1930", "BirminghamAL", "3:1:3Q9M-CSVR-VSTT-L", 231, 2, 3, "1037259"),
+]
+
+
+def test_late_bodies_not_observed(scraper, catalogue):
+    on_time, late, failed = catalogue
+    scraper.latencies = {on_time.ark: 4.0, failed.ark: 5.0}
+    scraper.writer.results = [
+        WriteResult(on_time, None, 30_000, "abc"),
+        WriteResult(late, None, 30_000, "def"),
+        WriteResult(failed, None, error="Only 900 bytes"),
+    ]
+
+    scraper.record_writes()
+
+    assert [(obs.ok, obs.latency, obs.local) for obs in scraper.throttle.observed] == [
+        (True, 4.0, False),
+        (False, 5.0, True),
+    ]
+    assert scraper.latencies == {}
+
+    # Written all the same
+    assert scraper.manifest.status(late.ark)[0] == "done"
+    assert scraper.manifest.status(failed.ark)[0] == "failed"
+
+
+class Writer:
+    results = []
+
+    def completed(self):
+        yield from self.results
+
+
+class Throttle:
+    def __init__(self):
+        self.observed = []
+
+    def observe(self, obs):
+        self.observed.append(obs)
+
+
+@pytest.fixture
+def catalogue():
+    return ImageCatalogue.fromRows(ROWS)
+
+
+@pytest.fixture
+def scraper(tmp_path, catalogue):
+    scraper = Scraper.__new__(Scraper)  # without a browser
+    scraper.out_path = tmp_path
+    scraper.manifest = Manifest(":memory:")
+    scraper.manifest.sync(catalogue)
+    scraper.writer = Writer()
+    scraper.throttle = Throttle()
+    scraper.latencies = {}
+
+    return scraper
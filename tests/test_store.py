@@ -85,6 +85,19 @@ def test_prev_metro_from_init(test_db, manyUtps):
     s.prevMetro() == None
 
 
+def test_metro_bounds(test_db, manyUtps):
+    s = Store(test_db, manyUtps)
+
+    assert s.metroBounds() == (0, 2)
+    assert s.metroBounds(4) == (3, 4)
+    assert s.metroBounds(6) == (5, 7)
+    assert s.metroBounds(8) == (8, 8)
+
+    s.index = 3
+
+    assert s.metroBounds() == (3, 4)
+
+
 def test_image_add_ed(oneImage):
     oneImage.addED(1)
     oneImage.addED(2)
@@ -113,7 +126,10 @@ def test_image_url(oneImage):
 def test_skip_to_last_entered(test_db, manyUtps):
     s = Store(test_db, manyUtps)
     s.populate_db()
-    s.images[2].eds.update(["4A", "4B"])
+    s.index = 2
+    s.addEDToCurrentImage(Ed(4, "A"))
+    s.addEDToCurrentImage(Ed(4, "B"))
+    s.index = 0
     s.skipToLastEntered()
 
     cur = s.curr()
@@ -121,6 +137,83 @@ def test_skip_to_last_entered(test_db, manyUtps):
     assert cur.ark == manyUtps[2].ark
 
 
+def test_skip_to_last_entered_within_metro(test_db, manyUtps):
+    s = Store(test_db, manyUtps)
+    s.populate_db()
+
+    for index in (1, 6, 3):
+        s.index = index
+        s.addEDToCurrentImage(Ed(index))
+
+    s.index = 5
+    s.skipToLastEnteredWithinMetro()
+
+    assert s.index == 6
+
+    s.skipToLastEntered()
+
+    assert s.index == 6
+
+    s.removeLastED()
+    s.skipToLastEntered()
+
+    assert s.index == 3
+
+    s.index = 5
+    s.skipToLastEnteredWithinMetro()
+
+    assert s.index == 5
+
+
+def test_skips_metros_leased_by_others(test_db, manyUtps):
+    class Taken:
+        metros = {("1930", "OaklandCA"), ("1930", "SpringfieldMA")}
+
+        def heldByOthers(self, year, utp_code):
+            return (year, utp_code) in self.metros
+
+    s = Store(test_db, manyUtps, leases=Taken())
+    s.populate_db()
+
+    for index in (1, 3, 6, 7):
+        s.index = index
+        s.addEDToCurrentImage(Ed(index))
+
+    s.skipToLastEntered()
+
+    assert s.index == 1
+
+    s.index = 0
+    s.nextMetro()
+
+    assert s.index == 8
+
+    # Within a taken metro, moves on to the next free one
+    s.index = 3
+    s.skipToLastEnteredWithinMetro()
+
+    assert s.index == 8
+
+
+def test_skip_ignores_1880(test_db, manyUtps):
+    manyUtps[8].year = "1880"
+    s = Store(test_db, manyUtps)
+    s.populate_db()
+
+    s.index = 8
+    s.addEDToCurrentImage(Ed(1))
+    s.index = 0
+    s.addEDToCurrentImage(Ed(1))
+    s.skipToLastEntered()
+
+    assert s.index == 0
+
+    s.index = 8
+    s.skipToLastEnteredWithinMetro()
+
+    assert s.index == 8
+
+
 def test_largest_ed(test_db, oneImage):
     s = Store(test_db, [oneImage])
     s.populate_db()
@@ -136,6 +229,76 @@ def test_largest_ed(test_db, oneImage):
     assert ed_name == "10"
 
 
+def test_largest_ed_is_numeric(test_db, manyUtps):
+    s = Store(test_db, manyUtps)
+    s.populate_db()
+
+    for ed in (Ed(9), Ed(10), Ed(10, "A"), Ed(2)):
+        s.addEDToCurrentImage(ed)
+
+    assert s.largestEDForCurrentMetro() == "10A"
+
+    s.index = 3
+
+    assert s.largestEDForCurrentMetro() == "1"
+
+
+def test_undo_redo_across_images(test_db, manyUtps):
+    s = Store(test_db, manyUtps)
+    s.populate_db()
+    s.index = 0
+    s.addEDToCurrentImage(Ed(1))
+    s.addEDToCurrentImage(Ed(2))
+    s.index = 1
+    s.addEDToCurrentImage(Ed(3))
+    s.index = 4
+
+    op = s.undo()
+
+    assert (op.kind, op.index, op.name) == ("add", 1, "3")
+    assert s.index == 1
+    assert len(s.curr().eds) == 0
+
+    op = s.undo()
+
+    assert s.index == 0
+    assert list(s.curr().eds) == ["1"]
+
+    s.redo()
+    s.redo()
+
+    assert s.redo() is None
+    assert list(s.images[0].eds) == ["1", "2"]
+    assert list(s.images[1].eds) == ["3"]
+    assert s.index == 1
+
+    names = test_db.execute("SELECT name FROM eds ORDER BY name").fetchall()
+
+    assert names == [("1",), ("2",), ("3",)]
+
+
+def test_undo_remove(test_db, manyUtps):
+    s = Store(test_db, manyUtps)
+    s.populate_db()
+    s.addEDToCurrentImage(Ed(1))
+    s.addEDToCurrentImage(Ed(2))
+    s.removeED("1")
+
+    op = s.undo()
+
+    assert op.kind == "remove"
+    assert set(s.curr().eds) == {"1", "2"}
+
+    s.addEDToCurrentImage(Ed(2))
+
+    assert s.redo() is not None
+    assert list(s.curr().eds) == ["2"]
+
+    s.addEDToCurrentImage(Ed(5))
+
+    assert s.redo() is None
+
+
 def test_image_last_ed(oneImage):
     oneImage
 
@@ -147,6 +310,91 @@ def test_image_last_ed(oneImage):
     assert oneImage.lastED() == "2"
 
 
+def test_populate_loads_eds(test_db, manyUtps):
+    s = Store(test_db, manyUtps)
+    s.populate_db()
+    s.index = 3
+    s.addEDToCurrentImage(Ed(2))
+    s.addEDToCurrentImage(Ed(1))
+
+    db_ids = [img.db_id for img in s.images]
+    reloaded = Store(test_db, [Image(*img_args(img)) for img in manyUtps])
+    reloaded.populate_db()
+
+    assert None not in db_ids
+    assert [img.db_id for img in reloaded.images] == db_ids
+    assert list(reloaded.images[3].eds) == ["2", "1"]
+    assert len(reloaded.images[2].eds) == 0
+
+
+def test_populate_upper_cases_legacy_names(test_db, manyUtps):
+    s = Store(test_db, manyUtps)
+    s.populate_db()
+    test_db.execute(
+        "INSERT INTO eds (image_id, name, year, utp_code) VALUES (?, '12a', 1930, ?)",
+        (s.images[0].db_id, "BirminghamAL"),
+    )
+
+    s = Store(test_db, [Image(*img_args(img)) for img in manyUtps])
+    s.populate_db()
+
+    assert list(s.curr().eds) == ["12A"]
+
+    s.removeED("12A")
+
+    assert test_db.execute("SELECT COUNT(*) FROM eds").fetchone()[0] == 0
+
+
+def test_failed_remove_writes_nothing(test_db, manyUtps):
+    submitted = []
+
+    class Writer:
+        def submit(self, sql, params):
+            submitted.append(params)
+
+    s = Store(test_db, manyUtps, Writer())
+    s.populate_db()
+
+    with pytest.raises(KeyError):
+        s.deleteED(0, "7")
+
+    assert submitted == []
+
+
+def test_populate_skips_unchanged_corpus(test_db, manyUtps):
+    s = Store(test_db, manyUtps)
+    s.populate_db()
+    fingerprint = s.metadata("images_fingerprint")
+
+    assert fingerprint == s.fingerprint()
+
+    # Unchanged: the upsert is skipped, so a deleted row stays deleted
+    test_db.execute("DELETE FROM images WHERE ark = ?", (manyUtps[8].ark,))
+    s = Store(test_db, manyUtps)
+    s.populate_db()
+
+    assert test_db.execute("SELECT COUNT(*) FROM images").fetchone()[0] == 8
+    assert list(s.images.db_ids) == list(range(1, 10))
+
+    s = Store(test_db, manyUtps[:4])
+    s.populate_db()
+
+    assert s.metadata("images_fingerprint") != fingerprint
+    assert test_db.execute("SELECT COUNT(*) FROM images").fetchone()[0] == 8
+
+
+def img_args(img):
+    return (
+        img.year,
+        img.utp_code,
+        img.ark,
+        img.image_index,
+        img.metro_image_index,
+        img.metro_image_count,
+        img.cat,
+    )
+
+
 @pytest.fixture
 def manyUtps():
     return [
@@ -0,0 +1,86 @@
+import pytest
+from src.catalogue import Image
+from src.tabs import TabPool
+
+DIST_URL = "https://sg30p0.familysearch.org/service/records/storage/deepzoomcloud/dz/v1/{}/dist.jpg?proxy=true"
+
+
+@pytest.fixture
+def images():
+    return [
+        Image("1930", "BirminghamAL", "3:1:3Q9M-CSVR-VSRX-L", 229, 0, 3, "1037259"),
+        Image("1930", "BirminghamAL", "3:1:3Q9M-CSVR-VSR4-H", 230, 1, 3, "1037259"),
+    ]
+
+
+def test_out_of_order_responses(images):
+    pool = TabPool(["A", "B"])
+    tab_a, tab_b = pool.tabs["A"], pool.tabs["B"]
+    pool.assign(tab_a, images[0])
+    pool.assign(tab_b, images[1])
+
+    # Correlated by frame, since these URLs carry no ark
+    assert pool.responseReceived("1", "https://x/dist.jpg?a", "A") is tab_a
+    assert pool.responseReceived("2", "https://x/dist.jpg?b", "B") is tab_b
+
+    assert pool.loadingFinished("2")
+    assert pool.loadingFinished("1")
+    assert not pool.loadingFinished("3")
+
+    assert pool.finished.get_nowait()[:3] == (tab_b, images[1], "2")
+    assert pool.finished.get_nowait()[:3] == (tab_a, images[0], "1")
+
+
+def test_response_matched_by_ark(images):
+    pool = TabPool(["A", "B"])
+    pool.assign(pool.tabs["A"], images[0])
+    pool.assign(pool.tabs["B"], images[1])
+
+    url = DIST_URL.format("3%3A1%3A3Q9M-CSVR-VSR4-H")
+
+    assert pool.responseReceived("7", url, "A") is pool.tabs["B"]
+
+
+def test_late_response_keeps_its_image(images):
+    pool = TabPool(["A"])
+    tab = pool.tabs["A"]
+    pool.assign(tab, images[0])
+    pool.responseReceived("1", "https://x/dist.jpg", "A")
+
+    # The tab moves on before the first body finishes
+    pool.release(tab)
+    pool.assign(tab, images[1])
+
+    assert pool.responseReceived("2", "https://x/dist.jpg", "A") is tab
+
+    pool.loadingFinished("2")
+    pool.loadingFinished("1")
+
+    assert pool.finished.get_nowait()[:3] == (tab, images[1], "2")
+
+    # Timed only while its tab is still on it
+    *_, latency = pool.finished.get_nowait()
+    assert latency is None
+
+
+def test_expired(images):
+    pool = TabPool(["A", "B"])
+    pool.assign(pool.tabs["A"], images[0])
+
+    assert pool.expired(0) == [pool.tabs["A"]]
+    assert pool.expired(60) == []
+    assert pool.freeTabs() == [pool.tabs["B"]]
+
+
+def test_finished_body_never_expires(images, monkeypatch):
+    clock = iter([100.0, 103.0, 500.0])
+    monkeypatch.setattr("src.tabs.time.monotonic", lambda: next(clock))
+    pool = TabPool(["A"])
+    tab = pool.tabs["A"]
+    pool.assign(tab, images[0])
+    pool.responseReceived("1", "https://x/dist.jpg", "A")
+    pool.loadingFinished("1")
+
+    # Long after, the driver thread hasn't written the body yet
+    assert pool.expired(60) == []
+    assert pool.finished.get_nowait() == (tab, images[0], "1", 3.0)
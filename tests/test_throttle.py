@@ -0,0 +1,121 @@
+import json
+
+import pytest
+from src.throttle import (
+    ERROR,
+    OK,
+    SLOW,
+    THROTTLED,
+    MAX_RATE,
+    AIMDController,
+    Controller,
+    FakeClock,
+    FixedController,
+    Observation,
+    SimulatedServer,
+    Throttle,
+    TokenBucketController,
+    simulate,
+)
+
+
+def test_classify():
+    controller = AIMDController()
+    controller.observe(Observation(True, 4.0), 0)
+
+    assert controller.classify(Observation(True, 5.0)) == OK
+    assert controller.classify(Observation(True, 13.0)) == SLOW
+    assert controller.classify(Observation(False, 0.5, 429)) == THROTTLED
+    assert controller.classify(Observation(False)) == THROTTLED
+    assert controller.classify(Observation(False, 0.5, 404)) == ERROR
+    assert controller.classify(Observation(False, local=True)) == ERROR
+
+
+def test_aimd_backs_off_exponentially():
+    controller = AIMDController(rate=0.1, base_backoff=60)
+
+    controller.observe(Observation(False), 1000)
+    assert controller.reserve(1000) == 1060
+    assert controller.rate == pytest.approx(0.05)
+
+    # The same episode: a longer wait, but no further cut
+    controller.observe(Observation(False), 1060)
+    assert controller.reserve(1060) == 1180
+    assert controller.rate == pytest.approx(0.05)
+    assert controller.ceiling == pytest.approx(0.1)
+
+    controller.observe(Observation(True, 4.0), 1200)
+    assert controller.strikes == 0
+    assert controller.rate > 0.05
+
+
+def test_aimd_increase_slows_near_ceiling():
+    controller = AIMDController(rate=0.1)
+    controller.observe(Observation(True, 4.0), 0)
+    fast = controller.rate - 0.1
+
+    controller = AIMDController(rate=0.1)
+    controller.ceiling = 0.11
+    controller.observe(Observation(True, 4.0), 0)
+
+    assert controller.rate - 0.1 == pytest.approx(fast / 10)
+
+
+def test_token_bucket_bursts():
+    controller = TokenBucketController(rate=0.1, capacity=2)
+
+    assert [controller.reserve(0) for _ in range(4)] == [0, 0, 10, 20]
+
+    controller.observe(Observation(False, 0.5, 429), 30)
+    assert controller.reserve(30) == 90
+
+
+def test_default_spacing():
+    controller = TokenBucketController(rate=0.1)
+
+    assert controller.spacing() == pytest.approx(10)
+
+    # Any controller which doesn't pace by spacing still has one to fall back on
+    controller = Controller()
+
+    assert controller.reserve(0) == 0
+    assert controller.reserve(0) == 1 / MAX_RATE
+
+
+def test_fixed_pauses_after_limit():
+    controller = FixedController(interval=15, limit=3, pause=100)
+
+    assert [controller.reserve(0) for _ in range(4)] == [0, 15, 30, 145]
+
+
+def test_throttle_waits_on_clock():
+    clock = FakeClock(50)
+    throttle = Throttle(AIMDController(rate=0.1), clock=clock, sleep=clock.sleep)
+
+    assert throttle.wait() == 0
+    assert throttle.wait() == 10
+    assert clock() == 60
+
+
+def test_throttle_state_persists(tmp_path):
+    path = tmp_path / "throttle.json"
+    clock = FakeClock(1000)
+    throttle = Throttle(AIMDController(), path, clock=clock)
+    throttle.observe(Observation(False))
+
+    restored = Throttle(AIMDController(), path)
+
+    assert restored.controller.backoff_until == 1060
+    assert restored.controller.strikes == 1
+    assert json.loads(path.read_text())["policy"] == "aimd"
+
+    # Another policy starts afresh
+    assert Throttle(FixedController(), path).controller.backoff_until == 0
+
+
+def test_simulated_aimd_beats_fixed():
+    aimd = simulate(AIMDController(), SimulatedServer(limit=650, warning=0), 24 * 3600)
+    fixed = simulate(FixedController(), SimulatedServer(limit=650, warning=0), 24 * 3600)
+
+    assert aimd.per_hour > 1.5 * fixed.per_hour
+    assert aimd.per_hour < 650
@@ -0,0 +1,137 @@
+import json
+import os
+
+import pytest
+from src.utils import (
+    buildImageList,
+    iterImages,
+    loadSnapshot,
+    parseCatalogue,
+    snapshotKey,
+)
+
+
+def test_build_image_list(scrapeTree, tmp_path):
+    images = buildImageList(scrapeTree, tmp_path / "snapshot")
+
+    assert [img.ark for img in images] == ["3:1:AAAA-0001", "3:1:AAAA-0002"]
+    assert images[0].utp_code == "BirminghamAL"
+    assert images[0].image_index == 1
+    assert images[1].metro_image_index == 1
+
+
+def test_snapshot_reused(scrapeTree, tmp_path):
+    snapshot_path = tmp_path / "snapshot"
+    buildImageList(scrapeTree, snapshot_path)
+
+    assert loadSnapshot(snapshot_path, snapshotKey(scrapeTree)) is not None
+
+    images = buildImageList(scrapeTree, snapshot_path)
+
+    assert [img.ark for img in images] == ["3:1:AAAA-0001", "3:1:AAAA-0002"]
+
+
+def test_snapshot_invalidated(scrapeTree, tmp_path):
+    snapshot_path = tmp_path / "snapshot"
+    buildImageList(scrapeTree, snapshot_path)
+
+    film_path = scrapeTree / "films" / "004950001.json"
+    writeFilm(film_path, ["0000", "0009", "0002", "0003"])
+    stat = film_path.stat()
+    os.utime(film_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+
+    assert loadSnapshot(snapshot_path, snapshotKey(scrapeTree)) is None
+
+    images = buildImageList(scrapeTree, snapshot_path)
+
+    assert [img.ark for img in images] == ["3:1:AAAA-0009", "3:1:AAAA-0002"]
+
+
+def test_unreferenced_films_ignored(scrapeTree, tmp_path):
+    (scrapeTree / "films" / "999999999.json").write_text("not json")
+
+    images = buildImageList(scrapeTree, tmp_path / "snapshot")
+
+    assert len(images) == 2
+
+
+def test_rows_share_film(scrapeTree):
+    with open(scrapeTree / "ed_descr_nums.csv", "a") as csvf:
+        csvf.write("1940,OaklandCA,004950001,3,3,2000219\n")
+
+    images = parseCatalogue(scrapeTree, workers=1)
+    img = images[-1]
+
+    assert (img.year, img.utp_code, img.ark, img.image_index) == (
+        "1940",
+        "OaklandCA",
+        "3:1:AAAA-0003",
+        3,
+    )
+    assert (img.metro_image_index, img.metro_image_count, img.cat) == (0, 0, "2000219")
+    assert len(images) == 3
+
+
+def test_iter_images_matches_catalogue(scrapeTree):
+    with open(scrapeTree / "ed_descr_nums.csv", "a") as csvf:
+        csvf.write("1940,OaklandCA,004950001,0,3,2000219\n")
+
+    streamed = list(iterImages(scrapeTree))
+    images = parseCatalogue(scrapeTree, workers=1)
+
+    assert [
+        (img.year, img.utp_code, img.ark, img.image_index, img.metro_image_index, img.cat)
+        for img in streamed
+    ] == [
+        (img.year, img.utp_code, img.ark, img.image_index, img.metro_image_index, img.cat)
+        for img in images
+    ]
+    assert len(streamed) == 6
+
+
+def test_iter_images_is_lazy(scrapeTree):
+    images = iterImages(scrapeTree)
+
+    assert next(images).ark == "3:1:AAAA-0001"
+
+    # A film is only read when a row needs it
+    (scrapeTree / "films" / "004950001.json").unlink()
+
+    assert next(images).ark == "3:1:AAAA-0002"
+
+
+def test_iter_images_skips_finished_metros(scrapeTree):
+    with open(scrapeTree / "ed_descr_nums.csv", "a") as csvf:
+        csvf.write("1940,OaklandCA,004950002,0,0,2000219\n")
+    writeFilm(scrapeTree / "films" / "004950002.json", ["0100"])
+    asked = []
+
+    def finished(year, utp_code, size):
+        asked.append((year, utp_code, size))
+        return utp_code == "BirminghamAL"
+
+    # The finished metro's film is never read
+    (scrapeTree / "films" / "004950001.json").unlink()
+    images = list(iterImages(scrapeTree, finished))
+
+    assert [img.ark for img in images] == ["3:1:AAAA-0100"]
+    assert asked == [("1930", "BirminghamAL", 2), ("1940", "OaklandCA", 1)]
+
+
+def writeFilm(path, suffixes):
+    urls = [f"https://www.familysearch.org/ark:/61903/3:1:AAAA-{s}" for s in suffixes]
+    path.write_text(json.dumps({"images": urls}))
+
+
+@pytest.fixture
+def scrapeTree(tmp_path):
+    data_dir = tmp_path / "scrape_fs"
+    (data_dir / "films").mkdir(parents=True)
+    writeFilm(data_dir / "films" / "004950001.json", ["0000", "0001", "0002", "0003"])
+    (data_dir / "ed_descr_nums.csv").write_text(
+        "year,utp_code,digital_film_no,start_index,stop_index,collection\n"
+        "1930,BirminghamAL,004950001,1,2,1037259\n"
+        "1930,OaklandCA,,,,1037259\n"
+    )
+
+    return data_dir
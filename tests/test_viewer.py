@@ -0,0 +1,55 @@
+import pytest
+from src.catalogue import ImageCatalogue
+from src.viewer import LocalViewer
+
+
+class RecordingDriver:
+    def __init__(self):
+        self.scripts = []
+        self.pages = []
+
+    def get(self, url):
+        self.pages.append(url)
+
+    def execute_async_script(self, script, url, keep):
+        self.scripts.append((url, keep))
+        return True
+
+
+@pytest.fixture
+def images():
+    return ImageCatalogue.fromRows(
+        ("1930", "BostonMA", f"3:1:3QHV-532D-G98P-{i}", i, i, 20, "1037259")
+        for i in range(20)
+    )
+
+
+def test_viewer_prefetches_neighbours(images):
+    driver = RecordingDriver()
+    shown = []
+    viewer = LocalViewer(driver, images, on_shown=lambda i, t: shown.append(i))
+
+    viewer.show(5, started=0.0)
+
+    url, keep = driver.scripts[-1]
+
+    assert url == images[5].local_url
+    assert keep == [images[6].local_url, images[4].local_url]
+    assert shown == [5]
+
+
+def test_viewer_window_grows_with_speed(images):
+    viewer = LocalViewer(RecordingDriver(), images, max_window=6)
+
+    for step in range(10):
+        viewer.track(10 - step, step * 0.05)
+
+    assert viewer.direction == -1
+    assert viewer.windowSize() == 6
+    assert viewer.window(3) == [2, 1, 0, 4]
+
+    for step in range(10):
+        viewer.track(step, 10.0 + step * 2)
+
+    assert viewer.direction == 1
+    assert viewer.windowSize() <= 2
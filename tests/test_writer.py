@@ -0,0 +1,83 @@
+import sqlite3
+import threading
+
+import pytest
+from src.writer import WriteBehindWriter
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = tmp_path / "annotated.db"
+    connection = sqlite3.connect(path)
+    connection.execute("CREATE TABLE eds (id INTEGER PRIMARY KEY, name VARCHAR UNIQUE)")
+    connection.close()
+
+    return path
+
+
+def names(db_path):
+    connection = sqlite3.connect(db_path)
+    rows = connection.execute("SELECT name FROM eds ORDER BY id").fetchall()
+    connection.close()
+
+    return [row[0] for row in rows]
+
+
+def test_write_behind_flush(db_path):
+    writer = WriteBehindWriter(db_path, max_delay=10)
+
+    for name in ("1", "2", "3"):
+        writer.submit("INSERT INTO eds (name) VALUES (?)", (name,))
+    writer.submit("DELETE FROM eds WHERE name = ?", ("2",))
+    writer.flush()
+
+    assert names(db_path) == ["1", "3"]
+
+    writer.close()
+
+
+def test_write_behind_close_flushes(db_path):
+    writer = WriteBehindWriter(db_path, max_delay=10)
+    writer.submit("INSERT INTO eds (name) VALUES (?)", ("1",))
+    writer.close()
+    writer.flush()
+
+    assert names(db_path) == ["1"]
+
+
+def test_write_behind_survives_bad_write(db_path):
+    writer = WriteBehindWriter(db_path)
+    writer.submit("INSERT INTO eds (name) VALUES (?)", ("1",))
+    writer.submit("INSERT INTO eds (name) VALUES (?)", ("1",))
+    writer.submit("INSERT INTO eds (name) VALUES (?)", ("2",))
+    writer.close()
+
+    assert names(db_path) == ["1", "2"]
+
+
+def test_write_behind_waits_for_lock(db_path):
+    # Another session mid-transaction holds the write lock for a while
+    other = sqlite3.connect(db_path, check_same_thread=False)
+    other.execute("BEGIN IMMEDIATE")
+    other.execute("INSERT INTO eds (name) VALUES (?)", ("other",))
+    threading.Timer(0.3, other.commit).start()
+
+    writer = WriteBehindWriter(db_path, max_delay=0)
+    writer.submit("INSERT INTO eds (name) VALUES (?)", ("1",))
+    writer.close()
+    other.close()
+
+    assert names(db_path) == ["other", "1"]
+
+
+def test_concurrent_writers(db_path):
+    writers = [WriteBehindWriter(db_path, max_delay=0, max_batch=5) for _ in range(3)]
+
+    for n in range(100):
+        for i, writer in enumerate(writers):
+            writer.submit("INSERT INTO eds (name) VALUES (?)", (f"{i}-{n}",))
+
+    for writer in writers:
+        writer.close()
+
+    assert len(names(db_path)) == 300